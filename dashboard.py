@@ -84,6 +84,12 @@ if __name__ == "__main__":
                 filepath = "./data/2019-12-04T11-15-39_Telemetry.log"
             dummy_sensors = Sigmundr()
             serial_telemetry = SerialWrapper(115200, "Telemetry", filepath=filepath, sensors=dummy_sensors)
+            # The third argument is the speed of the replay, "fast" to replay as fast as possible
+            if len(sys.argv) >= 4:
+                if sys.argv[3] == "fast":
+                    serial_telemetry.clock.set_fast(True)
+                else:
+                    serial_telemetry.clock.set_speed(float(sys.argv[3]))
 
         else:
             serial_telemetry = SerialWrapper(115200, "Telemetry", rfd900=True)
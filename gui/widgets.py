@@ -4,9 +4,12 @@ import tkinter as tk
 from tkinter import E, N, S, W
 
 import matplotlib.animation as animation
+import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
+from utils.commandqueue import HIGH, LOW
+
 
 # ########################### #
 #   General purpose widgets   #
@@ -15,6 +18,26 @@ from matplotlib.figure import Figure
 
 BD=0
 
+
+def window_start(time, tmin):
+    """ Return the index of the last sample before a time
+
+    Parameters
+    ----------
+    time : array-like
+        sorted time stamps of the samples
+    tmin : float
+        start of the window
+
+    Returns
+    -------
+    index : int
+        index of the last sample before tmin, 0 if there is none
+
+    """
+    return max(int(np.searchsorted(time[:], tmin)) - 1, 0)
+
+
 class GatewayStatus(tk.Frame):
     """ TKinter frame to monitor the status of the Serial link
 
@@ -53,9 +76,15 @@ class GatewayStatus(tk.Frame):
         self.error_var.set("")
         tk.Label(self, textvariable=self.error_var).grid(
             row=1, column=1, sticky=W)
+        # Label to display the time the received frames wait to be saved on disk
+        self.lag_var = tk.StringVar()
+        self.lag_var.set("")
+        tk.Label(self, textvariable=self.lag_var).grid(
+            row=2, column=1, sticky=W)
 
         self.__update_port()
         self.__update_error()
+        self.__update_lag()
         self.__update_button()
 
     def destroy(self):
@@ -78,23 +107,42 @@ class GatewayStatus(tk.Frame):
         self.parent.after(100, self.__update_port)
 
     def __update_error(self):
-        """ Update the error displayed
+        """ Update the state of the link displayed
 
         """
-        failed = self.gateway.serial.failed
-        if failed:
+        state, ports = self.gateway.get_state()
+        if state == "FAILED":
             message = self.gateway.serial.error
             self.error_var.set("Status : {}".format(message))
+        elif state == "SEARCHING":
+            self.error_var.set("Status : Searching...")
+        elif state == "TESTING":
+            self.error_var.set("Status : Testing {}...".format(", ".join(ports)))
+        elif state == "RECONNECTING":
+            self.error_var.set("Status : Link lost, reconnecting...")
         else:
             self.error_var.set("Status : Ok")
         # Call this function again after 100 ms
         self.parent.after(100, self.__update_error)
 
+    def __update_lag(self):
+        """ Update the write lag of the log file displayed
+
+        """
+        self.lag_var.set("Write lag : {:.0f} ms".format(1000 * self.gateway.get_write_lag()))
+        # Call this function again after 500 ms
+        self.parent.after(500, self.__update_lag)
+
     def __update_button(self):
         """ Set the behaviour of the button to open or close the Serial link
 
         """
-        if self.gateway.serial.get_status():
+        state, _ = self.gateway.get_state()
+        if state in ["SEARCHING", "TESTING", "RECONNECTING"]:
+            # The link is being opened in the background, it can still be stopped
+            self.read_button.config(command=self.gateway.stop_read)
+            self.button_var.set("Cancel")
+        elif self.gateway.serial.get_status():
             self.read_button.config(command=self.gateway.stop_read)
             self.button_var.set("Close link")
         else:
@@ -120,15 +168,18 @@ class BoolFieldIndicator(tk.Frame):
         dictionary key of the field to check
     text : str
         text to display next to the indicator
+    mask : int
+        (optional) bit mask to test in the value of the field, for bitfields
 
     """
 
-    def __init__(self, parent, sensor, field, text, *args, **kwargs):
+    def __init__(self, parent, sensor, field, text, mask=None, *args, **kwargs):
         tk.Frame.__init__(self, parent, *args, **kwargs)
         self.parent = parent
         self.sensor = sensor
         self.field = field
         self.text = text
+        self.mask = mask
 
         # Button to make a colored "box" for sensor
         # Style will be reflected on this button
@@ -144,10 +195,13 @@ class BoolFieldIndicator(tk.Frame):
         """ Set the style of the button depending on the status of sensor.
 
         """
-        if self.sensor.data[self.field] is None:
+        value = self.sensor.data[self.field]
+        if value is None:
             self.btn.config(bg='grey')
         else:
-            if self.sensor.data[self.field]:
+            if self.mask is not None:
+                value &= self.mask
+            if value:
                 self.btn.config(bg='red')
             else:
                 self.btn.config(bg='green')
@@ -292,15 +346,20 @@ class ErrorState(tk.Frame):
         self.title.grid(row=0, column=0, columnspan=2, sticky=W+E)
 
         self.loop = BoolFieldIndicator(
-            self, self.sensors.errmsg, "ERR_LOOP_TIME", "loop time")
+            self, self.sensors.errmsg, "ERR_MSG", "loop time",
+            mask=self.sensors.errmsg.mask("ERR_LOOP_TIME"))
         self.sd_write = BoolFieldIndicator(
-            self, self.sensors.errmsg, "ERR_WRITE_SD", "write SD")
+            self, self.sensors.errmsg, "ERR_MSG", "write SD",
+            mask=self.sensors.errmsg.mask("ERR_WRITE_SD"))
         self.sd_sync = BoolFieldIndicator(
-            self, self.sensors.errmsg, "ERR_SYNC_SD", "sync SD")
+            self, self.sensors.errmsg, "ERR_MSG", "sync SD",
+            mask=self.sensors.errmsg.mask("ERR_SYNC_SD"))
         self.tm_send = BoolFieldIndicator(
-            self, self.sensors.errmsg, "ERR_SEND_TM", "send TM")
+            self, self.sensors.errmsg, "ERR_MSG", "send TM",
+            mask=self.sensors.errmsg.mask("ERR_SEND_TM"))
         self.imu_read = BoolFieldIndicator(
-            self, self.sensors.errmsg, "ERR_READ_IMU", "read imu")
+            self, self.sensors.errmsg, "ERR_MSG", "read imu",
+            mask=self.sensors.errmsg.mask("ERR_READ_IMU"))
 
         self.loop.grid(
             row=1, column=0, sticky=W+E)
@@ -402,28 +461,28 @@ class ParachuteIndicator(tk.Frame):
         self._update_parachute()
     
     def _update_parachute(self):
-        if self.status.data['STATUS_1'] & 1 << 3:
+        if self.status.data['PARACHUTE_IGNITING']:
             self.parachute_ign_txt.set('Igniting : yes')
             self.parachute_ign.config(bg='green')
         else:
             self.parachute_ign_txt.set('Igniting : no')
             self.parachute_ign.config(bg='grey')
 
-        if self.status.data['STATUS_1'] & 1 << 4:
+        if self.status.data['PARACHUTE_ARDUINO_ARMING']:
             self.parachute_arduino_arm_txt.set('Arduino arming : yes')
             self.parachute_arduino_arm.config(bg='green')
         else:
             self.parachute_arduino_arm_txt.set('Arduino arming : no')
             self.parachute_arduino_arm.config(bg='grey')
 
-        if self.status.data['STATUS_2'] & 1 << 2:
+        if self.status.data['PARACHUTE_ARMING']:
             self.parachute_arm_txt.set('Arming : yes')
             self.parachute_arm.config(bg='green')
         else:
             self.parachute_arm_txt.set('Arming : no')
             self.parachute_arm.config(bg='grey')
 
-        if self.status.data['STATUS_2'] & 1 << 7:
+        if self.status.data['PARACHUTE_TRIGGER']:
             self.parachute_trig_txt.set('Trigger : yes')
             self.parachute_trig.config(bg='green')
         else:
@@ -454,14 +513,14 @@ class FlightStatus(tk.Frame):
         self._update_flight()
     
     def _update_flight(self):
-        if self.status.data['STATUS_1'] & 1 << 1:
+        if self.status.data['LIFTOFF']:
             self.liftoff_txt.set('Liftoff : yes')
             self.liftoff.config(bg='green')
         else:
             self.liftoff_txt.set('Liftoff : no')
             self.liftoff.config(bg='grey')
 
-        if self.status.data['STATUS_1'] & 1 << 2:
+        if self.status.data['APOGEE']:
             self.apogee_txt.set('Apogee : yes')
             self.apogee.config(bg='green')
         else:
@@ -548,8 +607,8 @@ class LiveTimeGraphAirSpeed(tk.Frame):
         self.ax.set_title("Pitot pressure (hPa)", y=1.1)
         self.canvas.draw()
         self.last_update = 0
-        del self.time[:]
-        del self.data[:]
+        self.time = []
+        self.data = []
         self.line.set_data(self.time, self.data)
         return self.line,
 
@@ -574,28 +633,27 @@ class LiveTimeGraphAirSpeed(tk.Frame):
             self._init_figure()
             self.pitot.is_pressure_graph_init = True
 
-        self.time = self.pitot.raw_data['Seconds_since_start'][:]
-        self.data = self.pitot.data['Air speed'][:]
-        len_t = len(self.time)
-        len_data = len(self.data)
+        time = self.pitot.raw_data['Seconds_since_start']
+        data = self.pitot.data['Air speed']
+        len_t = len(time)
+        len_data = len(data)
 
         if len_t == len_data:
             if len_t > 0:
-                max_time = self.time[-1]
-                min_time = self.time[0]
-
-                if max_time - min_time > self.sensors.time_interval:
-                    index = [i for i, e in enumerate(self.time) if max_time - e > self.sensors.time_interval][-1]
-                else:
-                    index = 0
+                max_time = time[-1]
+                index = window_start(time, max_time - self.sensors.time_interval)
 
-                new_tmax = self.time[-1]
+                new_tmax = max_time
                 if new_tmax - self.last_update > 0.5:
                     self.last_update = new_tmax
-                    new_tmin = self.time[index]
+                    new_tmin = time[index]
                     self.ax.set_xlim(new_tmin, new_tmax + (new_tmax-new_tmin)*0.1)
                     self.canvas.draw()
 
+            # Only the visible samples are read
+            start = window_start(time, self.ax.get_xlim()[0])
+            self.time = time[start:]
+            self.data = data[start:]
             self.line.set_data(self.time, self.data)
 
         return self.line,
@@ -659,10 +717,10 @@ class LiveTimeGraphAcc(tk.Frame):
         self.ax.set_title("Accelerometer (g)", y=1.1)
         self.canvas.draw()
         self.last_update = 0
-        del self.time[:]
-        del self.x_data[:]
-        del self.y_data[:]
-        del self.z_data[:]
+        self.time = []
+        self.x_data = []
+        self.y_data = []
+        self.z_data = []
         self.x_value.set_data(self.time, self.x_data)
         self.y_value.set_data(self.time, self.y_data)
         self.z_value.set_data(self.time, self.z_data)
@@ -689,33 +747,33 @@ class LiveTimeGraphAcc(tk.Frame):
             self._init_figure()
             self.imu.is_acc_graph_init = True
 
-        self.time = self.imu.raw_data['Seconds_since_start'][:]
-        self.x_data = self.imu.raw_data['Acc_X'][:]
-        self.y_data = self.imu.raw_data['Acc_Y'][:]
-        self.z_data = self.imu.raw_data['Acc_Z'][:]
-        len_t = len(self.time)
-        len_acc_x = len(self.x_data)
-        len_acc_y = len(self.y_data)
-        len_acc_z = len(self.z_data)
+        time = self.imu.raw_data['Seconds_since_start']
+        x_data = self.imu.raw_data['Acc_X']
+        y_data = self.imu.raw_data['Acc_Y']
+        z_data = self.imu.raw_data['Acc_Z']
+        len_t = len(time)
+        len_acc_x = len(x_data)
+        len_acc_y = len(y_data)
+        len_acc_z = len(z_data)
 
         if len_t == len_acc_x and len_t == len_acc_y and len_t == len_acc_z:
             if len_t > 0:
-                max_time = self.time[-1]
-                min_time = self.time[0]
-
-                if max_time - min_time > self.sensors.time_interval:
-                    index = [i for i, e in enumerate(self.time) if max_time - e > self.sensors.time_interval][-1]
-                    
-                else:
-                    index = 0
+                max_time = time[-1]
+                index = window_start(time, max_time - self.sensors.time_interval)
 
-                new_tmax = self.time[-1]
+                new_tmax = max_time
                 if new_tmax - self.last_update > 0.5:
                     self.last_update = new_tmax
-                    new_tmin = self.time[index]
+                    new_tmin = time[index]
                     self.ax.set_xlim(new_tmin, new_tmax + (new_tmax-new_tmin)*0.1)
                     self.canvas.draw()
 
+            # Only the visible samples are read
+            start = window_start(time, self.ax.get_xlim()[0])
+            self.time = time[start:]
+            self.x_data = x_data[start:]
+            self.y_data = y_data[start:]
+            self.z_data = z_data[start:]
             self.x_value.set_data(self.time, self.x_data)
             self.y_value.set_data(self.time, self.y_data)
             self.z_value.set_data(self.time, self.z_data)
@@ -781,10 +839,10 @@ class LiveTimeGraphGyro(tk.Frame):
         self.ax.set_title("Gyrometer (dps)", y=1.1)
         self.canvas.draw()
         self.last_update = 0
-        del self.time[:]
-        del self.x_data[:]
-        del self.y_data[:]
-        del self.z_data[:]
+        self.time = []
+        self.x_data = []
+        self.y_data = []
+        self.z_data = []
         self.x_value.set_data(self.time, self.x_data)
         self.y_value.set_data(self.time, self.y_data)
         self.z_value.set_data(self.time, self.z_data)
@@ -811,33 +869,33 @@ class LiveTimeGraphGyro(tk.Frame):
             self._init_figure()
             self.imu.is_gyro_graph_init = True
 
-        self.time = self.imu.raw_data['Seconds_since_start'][:]
-        self.x_data = self.imu.raw_data['Gyro_X'][:]
-        self.y_data = self.imu.raw_data['Gyro_Y'][:]
-        self.z_data = self.imu.raw_data['Gyro_Z'][:]
-        len_t = len(self.time)
-        len_gyro_x = len(self.x_data)
-        len_gyro_y = len(self.y_data)
-        len_gyro_z = len(self.z_data)
+        time = self.imu.raw_data['Seconds_since_start']
+        x_data = self.imu.raw_data['Gyro_X']
+        y_data = self.imu.raw_data['Gyro_Y']
+        z_data = self.imu.raw_data['Gyro_Z']
+        len_t = len(time)
+        len_gyro_x = len(x_data)
+        len_gyro_y = len(y_data)
+        len_gyro_z = len(z_data)
 
         if len_t == len_gyro_x and len_t == len_gyro_y and len_t == len_gyro_z:
             if len_t > 0:
-                max_time = self.time[-1]
-                min_time = self.time[0]
+                max_time = time[-1]
+                index = window_start(time, max_time - self.sensors.time_interval)
 
-                if max_time - min_time > self.sensors.time_interval:
-                    index = [i for i, e in enumerate(self.time) if max_time - e > self.sensors.time_interval][-1]
-                    
-                else:
-                    index = 0
-
-                new_tmax = self.time[-1]
+                new_tmax = max_time
                 if new_tmax - self.last_update > 0.5:
                     self.last_update = new_tmax
-                    new_tmin = self.time[index]
+                    new_tmin = time[index]
                     self.ax.set_xlim(new_tmin, new_tmax + (new_tmax-new_tmin)*0.1)
                     self.canvas.draw()
 
+            # Only the visible samples are read
+            start = window_start(time, self.ax.get_xlim()[0])
+            self.time = time[start:]
+            self.x_data = x_data[start:]
+            self.y_data = y_data[start:]
+            self.z_data = z_data[start:]
             self.x_value.set_data(self.time, self.x_data)
             self.y_value.set_data(self.time, self.y_data)
             self.z_value.set_data(self.time, self.z_data)
@@ -897,9 +955,9 @@ class LiveTimeGraphAltitude(tk.Frame):
         self.ax.set_title("Static pressure (hPa)", y=1.1)
         self.canvas.draw()
         self.last_update = 0
-        del self.time[:]
-        del self.bmp1_data[:]
-        del self.bmp2_data[:]
+        self.time = []
+        self.bmp1_data = []
+        self.bmp2_data = []
         self.altitude1.set_data(self.time, self.bmp1_data)
         self.altitude2.set_data(self.time, self.bmp2_data)
         return self.altitude1, self.altitude2,
@@ -925,31 +983,30 @@ class LiveTimeGraphAltitude(tk.Frame):
             self._init_figure()
             self.bmp2.is_pressure_graph_init = True
 
-        self.time = self.bmp2.raw_data['Seconds_since_start'][:]
-        self.x_data = self.bmp2.data['Pressure hPa'][:]
-        self.y_data = self.bmp3.data['Pressure hPa'][:]
-        len_t = len(self.time)
-        len_bmp2 = len(self.x_data)
-        len_bmp3 = len(self.y_data)
+        time = self.bmp2.raw_data['Seconds_since_start']
+        x_data = self.bmp2.data['Pressure hPa']
+        y_data = self.bmp3.data['Pressure hPa']
+        len_t = len(time)
+        len_bmp2 = len(x_data)
+        len_bmp3 = len(y_data)
 
         if len_t == len_bmp2 and len_t == len_bmp3:
             if len_t > 0:
-                max_time = self.time[-1]
-                min_time = self.time[0]
-
-                if max_time - min_time > self.sensors.time_interval:
-                    index = [i for i, e in enumerate(self.time) if max_time - e > self.sensors.time_interval][-1]
-                    
-                else:
-                    index = 0
+                max_time = time[-1]
+                index = window_start(time, max_time - self.sensors.time_interval)
 
-                new_tmax = self.time[-1]
+                new_tmax = max_time
                 if new_tmax - self.last_update > 0.5:
                     self.last_update = new_tmax
-                    new_tmin = self.time[index]
+                    new_tmin = time[index]
                     self.ax.set_xlim(new_tmin, new_tmax + (new_tmax-new_tmin)*0.1)
                     self.canvas.draw()
 
+            # Only the visible samples are read
+            start = window_start(time, self.ax.get_xlim()[0])
+            self.time = time[start:]
+            self.x_data = x_data[start:]
+            self.y_data = y_data[start:]
             self.altitude1.set_data(self.time, self.x_data)
             self.altitude2.set_data(self.time, self.y_data)
 
@@ -1011,6 +1068,11 @@ class GPSValues(tk.Frame):
         self._update_values()
 
     def _update_values(self):
+        if len(self.gps.raw_data['Time']) == 0:
+            # No GPS data received yet
+            self.parent.after(100, self._update_values)
+            return
+
         latitude = self.gps.data['Latitude'][-1]
         txt_lat = "{:7.5f}".format(latitude)
         self.latitude_txt.set(txt_lat)
@@ -1090,6 +1152,11 @@ class GPSStatus(tk.Frame):
         self._update_status()
     
     def _update_status(self):
+        if len(self.gps.raw_data['Time']) == 0:
+            # No GPS data received yet
+            self.parent.after(100, self._update_status)
+            return
+
         validity = self.gps.data['Fix_Validity'][-1]
         if validity:
             txt_validity = "DATA VALID"
@@ -1213,15 +1280,13 @@ class GPSGraph(tk.Frame):
         self.distance = []
 
         if len_b == len_d:
-            for i, e in enumerate(bearing_tmp):
-                bearing = bearing_tmp[i]
-                distance = distance_tmp[i]
-                if str(bearing) != 'nan' and str(distance) != 'nan' and distance < 10000.:
-                    self.bearing.append(bearing)
-                    self.distance.append(distance)
-
-            if self.distance:
-                if max(self.distance) > 0.8*rmax:
+            # NaN distances are not lower than 10 km
+            valid = ~np.isnan(bearing_tmp) & (distance_tmp < 10000.)
+            self.bearing = bearing_tmp[valid]
+            self.distance = distance_tmp[valid]
+
+            if len(self.distance):
+                if self.distance.max() > 0.8*rmax:
                     rmax = rmax + self.rmax_init
                     if rmax < 5000:
                         self.ax.set_rlim(rmin, rmax)
@@ -1324,28 +1389,28 @@ class Outputs(tk.Frame):
         # Update text and commands for buttons
         if not is_output1_en:
             self.button_output1_text.set("Enable OUT1")
-            self.button_output1.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x61, 0x01])))
+            self.button_output1.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x61, 0x01]), priority=HIGH))
         else:
             self.button_output1_text.set("Disable OUT1")
-            self.button_output1.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x61, 0x00])))
+            self.button_output1.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x61, 0x00]), priority=HIGH))
         if not is_output2_en:
             self.button_output2_text.set("Enable OUT2")
-            self.button_output2.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x62, 0x01])))
+            self.button_output2.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x62, 0x01]), priority=HIGH))
         else:
             self.button_output2_text.set("Disable OUT2")
-            self.button_output2.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x62, 0x00])))
+            self.button_output2.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x62, 0x00]), priority=HIGH))
         if not is_output3_en:
             self.button_output3_text.set("Enable OUT3")
-            self.button_output3.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x63, 0x01])))
+            self.button_output3.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x63, 0x01]), priority=HIGH))
         else:
             self.button_output3_text.set("Disable OUT3")
-            self.button_output3.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x63, 0x00])))
+            self.button_output3.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x63, 0x00]), priority=HIGH))
         if not is_output4_en:
             self.button_output4_text.set("Enable OUT4")
-            self.button_output4.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x64, 0x01])))
+            self.button_output4.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x64, 0x01]), priority=HIGH))
         else:
             self.button_output4_text.set("Disable OUT4")
-            self.button_output4.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x64, 0x00])))
+            self.button_output4.config(command=lambda: self.gateway.send_command(bytes([0x26, 0x63, 0x64, 0x00]), priority=HIGH))
         
         # Enable the relevant buttons
         if self.gateway.serial.is_ready:
@@ -1461,7 +1526,8 @@ class LaunchpadState(tk.Frame):
 
     def _ping_launchpad(self):
         # Unused command, just to get a reply from the controller
-        self.gateway.send_command(bytes([0x26, 0x63, 0xFF, 0xFF]))
+        # Pings are sent after the other commands, only the last one is kept if the link is busy
+        self.gateway.send_command(bytes([0x26, 0x63, 0xFF, 0xFF]), key=b'\x26\x63\xFF', priority=LOW)
 
         self.parent.after(5000, self._ping_launchpad)
 
@@ -1520,19 +1586,66 @@ class Servos(tk.Frame):
 
     def _update_servo1(self, env=None):
         angle = self.servo1_angle.get()
-        self.gateway.send_command(bytes([0x26, 0x63, 0x6A, angle]))
+        # Only the last angle is sent if the previous one is still waiting
+        self.gateway.send_command(bytes([0x26, 0x63, 0x6A, angle]), key=b'\x26\x63\x6A')
         self.parent.after(200, self._allow_servo_update)
 
     def _update_servo2(self, env=None):
         angle = self.servo2_angle.get()
-        self.gateway.send_command(bytes([0x26, 0x63, 0x6B, angle]))
+        # Only the last angle is sent if the previous one is still waiting
+        self.gateway.send_command(bytes([0x26, 0x63, 0x6B, angle]), key=b'\x26\x63\x6B')
         self.parent.after(200, self._allow_servo_update)
 
     def _update_servo3(self, env=None):
         angle = self.servo3_angle.get()
-        self.gateway.send_command(bytes([0x26, 0x63, 0x6C, angle]))
+        # Only the last angle is sent if the previous one is still waiting
+        self.gateway.send_command(bytes([0x26, 0x63, 0x6C, angle]), key=b'\x26\x63\x6C')
         self.parent.after(200, self._allow_servo_update)
 
+class CommandLatency(tk.Frame):
+    """ TKinter frame that displays the round-trip latency of the commands
+
+    The latency of a command is the time between its writing and the reception of the first
+    frame that reflects it. The PING latency is only the wait for the next status frame, see
+    LaunchpadControl.command_effect()
+
+    Parameters
+    ----------
+    parent : TKinter Frame
+        parent frame
+    gateway : Gateway instance
+        Gateway the commands are sent through
+
+    """
+
+    def __init__(self, parent, gateway, *args, **kwargs):
+        tk.Frame.__init__(self, parent, *args, **kwargs)
+        self.parent = parent
+        self.gateway = gateway
+
+        self.latency_txt = tk.Label(self, text="LATENCY (p50 / p95 / max)")
+        self.latency_txt.grid(row=0, column=0, sticky=W)
+        self.values_txt = tk.StringVar()
+        self.values = tk.Label(self, textvar=self.values_txt, justify=tk.LEFT)
+        self.values.grid(row=1, column=0, sticky=W)
+
+        self._update_values()
+
+    def _update_values(self):
+        lines = []
+        for name, statistics in self.gateway.latency.get_statistics().items():
+            if statistics['count']:
+                lines.append("{}: {:.0f} / {:.0f} / {:.0f} ms".format(
+                    name, 1000*statistics['p50'], 1000*statistics['p95'], 1000*statistics['max']))
+            else:
+                lines.append("{}: - ms".format(name))
+            if statistics['timeouts']:
+                lines[-1] += " ({} lost)".format(statistics['timeouts'])
+        self.values_txt.set("\n".join(lines) if lines else "-")
+
+        self.parent.after(1000, self._update_values)
+
+
 class LaunchpadWidget(tk.Frame):
     def __init__(self, parent, gateway, *args, **kwargs):
         tk.Frame.__init__(self, parent, *args, **kwargs)
@@ -1543,6 +1656,7 @@ class LaunchpadWidget(tk.Frame):
         self.launchpad_status = GatewayStatus(self, self.gateway, 'Launchpad')
         self.main_outputs = Outputs(self, self.gateway, bd=2, relief="groove")
         self.servos = Servos(self, self.gateway, bd=2, relief="groove")
+        self.latency = CommandLatency(self, self.gateway, bd=2, relief="groove")
 
         self.launchpad_status.grid(
             row=0, column=0, padx=10, pady=(8, 0), sticky=W)
@@ -1552,3 +1666,5 @@ class LaunchpadWidget(tk.Frame):
             row=2, column=0, padx=10, pady=(5, 8), sticky=W+E)
         self.servos.grid(
             row=3, column=0, padx=10, pady=(5, 8), sticky=W+E)
+        self.latency.grid(
+            row=4, column=0, padx=10, pady=(5, 8), sticky=W+E)
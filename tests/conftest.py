@@ -0,0 +1,25 @@
+"""
+Fixtures shared by the tests
+
+"""
+
+from os.path import abspath, dirname, join
+
+import pytest
+
+from utils.framing import Framer
+from utils.sensors import Sigmundr
+
+# Telemetry log of a test session, 3470 frames of Sigmundr
+SAMPLE_LOG = join(dirname(dirname(abspath(__file__))), 'data', '2019-12-04T11-15-39_Telemetry.log')
+
+
+@pytest.fixture(scope='session')
+def sample_frames():
+    """ Frames of the sample log, as bytes
+
+    """
+    with open(SAMPLE_LOG, 'rb') as file:
+        data = file.read()
+    framer = Framer.from_schema(Sigmundr().schema)
+    return [bytes(frame) for frame in framer.feed(data)]
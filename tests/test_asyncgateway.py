@@ -0,0 +1,138 @@
+"""
+Tests of the asyncio Gateway, utils.asyncgateway
+
+"""
+
+import asyncio
+import os
+import time
+
+import utils.asyncgateway
+from utils.asyncgateway import AsyncGateway
+from utils.sensors import Sigmundr
+
+
+class PipeLink:
+    """ Serial link replaced by a pipe, the frames are written at the other end
+
+    """
+
+    class Port:
+        def __init__(self, fd):
+            self.fd = fd
+
+        def fileno(self):
+            return self.fd
+
+    def __init__(self):
+        self.name = "Pipe"
+        self.framer = None
+        self.failed = False
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        self.ser = self.Port(self.read_fd)
+
+    def open_link(self):
+        return True
+
+    def readlines(self):
+        try:
+            data = os.read(self.read_fd, 4096)
+        except BlockingIOError:
+            return []
+        if not data:
+            self.failed = True
+            return []
+        return self.framer.feed(data)
+
+    def close_serial(self):
+        pass
+
+
+def test_frames_are_received_and_saved(sample_frames, tmp_path):
+    link = PipeLink()
+    gateway = AsyncGateway(link, Sigmundr(), str(tmp_path))
+    frames = sample_frames[:100]
+
+    async def main():
+        assert await gateway.start_read()
+        loop = asyncio.get_running_loop()
+        loop.call_soon(os.write, link.write_fd, b''.join(f + b'\r\n' for f in frames))
+        received = []
+        async for frame in gateway.frames():
+            received.append(frame)
+            if len(received) == len(frames):
+                gateway.stop_read()
+        # The writer is closed in the default executor
+        await loop.shutdown_default_executor()
+        return received
+
+    assert asyncio.run(main()) == frames
+    assert not gateway.is_reading
+    with open(gateway.log_path, 'rb') as file:
+        assert file.read() == b''.join(f + b'\r\n' for f in frames)
+    os.close(link.read_fd)
+    os.close(link.write_fd)
+
+
+def test_restart_waits_for_the_writer(sample_frames, tmp_path):
+    link = PipeLink()
+    gateway = AsyncGateway(link, Sigmundr(), str(tmp_path))
+    writer = gateway.writer
+    close = writer.close
+
+    def slow_close():
+        time.sleep(0.2)
+        close()
+
+    writer.close = slow_close
+    frames = sample_frames[:20]
+
+    async def receive(part):
+        os.write(link.write_fd, b''.join(f + b'\r\n' for f in part))
+        received = []
+        async for frame in gateway.frames():
+            received.append(frame)
+            if len(received) == len(part):
+                gateway.stop_read()
+        return received
+
+    async def main():
+        assert await gateway.start_read()
+        received = await receive(frames[:10])
+        # Started again while the writer is being closed
+        assert await gateway.start_read()
+        assert gateway.writer.is_running
+        received += await receive(frames[10:])
+        await gateway.closing
+        return received
+
+    assert asyncio.run(main()) == frames
+    with open(gateway.log_path, 'rb') as file:
+        assert file.read() == b''.join(f + b'\r\n' for f in frames)
+    os.close(link.read_fd)
+    os.close(link.write_fd)
+
+
+def test_frames_dropped_are_counted(sample_frames, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.asyncgateway, 'QUEUE_SIZE', 2)
+    link = PipeLink()
+    gateway = AsyncGateway(link, Sigmundr(), str(tmp_path))
+    frames = sample_frames[:30]
+
+    async def main():
+        assert await gateway.start_read()
+        # Three reads of 10 frames while nothing consumes them
+        for start in range(0, len(frames), 10):
+            os.write(link.write_fd, b''.join(f + b'\r\n' for f in frames[start:start + 10]))
+            await asyncio.sleep(0.05)
+        gateway.stop_read()
+        received = [frame async for frame in gateway.frames()]
+        await gateway.closing
+        return received
+
+    received = asyncio.run(main())
+    assert received == frames[20:]
+    assert gateway.nb_dropped == 20
+    os.close(link.read_fd)
+    os.close(link.write_fd)
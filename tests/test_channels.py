@@ -0,0 +1,78 @@
+"""
+Tests of the fixed capacity channels of utils.channels
+
+"""
+
+import numpy as np
+
+from utils.channels import Channel, ChannelStore
+
+
+def test_append_keeps_last_values():
+    channel = Channel(capacity=3)
+    for i in range(10):
+        channel.append(i)
+        expected = list(range(max(0, i - 2), i + 1))
+        assert list(channel) == expected
+        assert len(channel) == len(expected)
+    assert channel[-1] == 9
+
+
+def test_compaction_keeps_views_contiguous():
+    channel = Channel(capacity=4)
+    for i in range(8):
+        channel.append(i)
+    # The cursor is at the end of the buffer, the next value moves the history back
+    assert channel.end == len(channel.buffer)
+    channel.append(8)
+    assert channel.end == 5
+    np.testing.assert_array_equal(channel.values(), [5, 6, 7, 8])
+    assert channel.values().base is channel.buffer
+
+
+def test_extend_matches_append():
+    appended = Channel(capacity=5)
+    extended = Channel(capacity=5)
+    values = np.arange(23.)
+    for start, stop in [(0, 2), (2, 9), (9, 10), (10, 23)]:
+        for value in values[start:stop]:
+            appended.append(value)
+        extended.extend(values[start:stop])
+        np.testing.assert_array_equal(extended.values(), appended.values())
+
+
+def test_extend_longer_than_capacity():
+    channel = Channel(capacity=3)
+    channel.append(-1.)
+    channel.extend(np.arange(10.))
+    np.testing.assert_array_equal(channel.values(), [7., 8., 9.])
+
+
+def test_clear():
+    channel = Channel(capacity=3)
+    channel.extend([1, 2, 3])
+    version = channel.version
+    channel.clear()
+    assert len(channel) == 0
+    assert channel.version > version
+    channel.append(4)
+    assert list(channel) == [4]
+
+
+def test_derived_channel_follows_sources():
+    store = ChannelStore(['Pressure'], capacity=4)
+    hpa = store.derive('Pressure hPa', lambda p: p/100., 'Pressure')
+    store['Pressure'].extend([100., 200.])
+    np.testing.assert_array_equal(hpa.values(), [1., 2.])
+    assert hpa[-1] == 2.
+    store['Pressure'].append(300.)
+    np.testing.assert_array_equal(hpa[1:], [2., 3.])
+    np.testing.assert_array_equal(hpa.values(), [1., 2., 3.])
+
+
+def test_flags_are_read_from_packed_channel():
+    store = ChannelStore(['Status'], capacity=4, dtypes={'Status': np.uint8},
+                         flags={'Armed': ('Status', 0b100, 2)})
+    store['Status'].extend([0b000, 0b100, 0b111])
+    assert 'Armed' in store
+    np.testing.assert_array_equal(store['Armed'], [0, 1, 1])
@@ -0,0 +1,88 @@
+"""
+Tests of the command queue, utils.commandqueue
+
+"""
+
+import threading
+import time
+
+from utils.commandqueue import HIGH, LOW, CommandQueue
+
+
+class BlockingWriter:
+    """ Write function that holds the first command until release() is called
+
+    """
+
+    def __init__(self):
+        self.written = []
+        self.times = []
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.done = threading.Event()
+        self.expected = None
+
+    def __call__(self, command):
+        self.started.set()
+        self.released.wait(5)
+        self.written.append(command)
+        self.times.append(time.monotonic())
+        if len(self.written) == self.expected:
+            self.done.set()
+
+    def release(self, expected):
+        self.expected = expected
+        self.released.set()
+        assert self.done.wait(5)
+
+
+def test_commands_with_the_same_key_are_coalesced():
+    writer = BlockingWriter()
+    commands = CommandQueue(writer, rate=1e6, burst=64)
+    commands.put(b'first')
+    assert writer.started.wait(5)
+    # The writer thread is busy with the first command, the next ones are pending
+    commands.put(b'servo 90', key='servo')
+    commands.put(b'other')
+    commands.put(b'servo 95', key='servo')
+    writer.release(3)
+    assert writer.written == [b'first', b'servo 95', b'other']
+    assert commands.nb_coalesced == 1
+    assert commands.nb_written == 3
+
+
+def test_priorities():
+    writer = BlockingWriter()
+    commands = CommandQueue(writer, rate=1e6, burst=64)
+    commands.put(b'first')
+    assert writer.started.wait(5)
+    commands.put(b'low', priority=LOW)
+    commands.put(b'normal')
+    commands.put(b'high', priority=HIGH)
+    writer.release(4)
+    assert writer.written == [b'first', b'high', b'normal', b'low']
+
+
+def test_clear():
+    writer = BlockingWriter()
+    commands = CommandQueue(writer, rate=1e6, burst=64)
+    commands.put(b'first')
+    assert writer.started.wait(5)
+    commands.put(b'dropped')
+    commands.clear()
+    commands.put(b'kept')
+    writer.release(2)
+    assert writer.written == [b'first', b'kept']
+
+
+def test_token_bucket_limits_the_rate():
+    writer = BlockingWriter()
+    writer.expected = 6
+    writer.released.set()
+    commands = CommandQueue(writer, rate=400, burst=8)
+    start = time.monotonic()
+    for i in range(6):
+        commands.put(bytes(4))
+    assert writer.done.wait(5)
+    # 8 bytes are written at once, then 4 bytes every 10 ms
+    assert writer.times[-1] - start >= 0.04 - 0.005
@@ -0,0 +1,55 @@
+"""
+Tests of the declarative conversions of utils.conversion
+
+"""
+
+import numpy as np
+import pytest
+
+from utils.conversion import Conversion
+
+
+def test_identity():
+    conversion = Conversion()
+    assert conversion.is_identity
+    assert conversion.is_integer
+    assert conversion(42) == 42
+
+
+def test_scale_and_offset():
+    conversion = Conversion(scale=0.5, offset=-1)
+    assert not conversion.is_integer
+    assert conversion(4) == 1.
+    np.testing.assert_allclose(conversion.apply([0, 2, 4]), [-1., 0., 1.])
+
+
+def test_mask_and_shift():
+    conversion = Conversion(mask=0x06, shift=1)
+    assert conversion.is_integer
+    assert [conversion(x) for x in range(8)] == [0, 0, 1, 1, 2, 2, 3, 3]
+    np.testing.assert_array_equal(conversion.apply(np.arange(8)), [0, 0, 1, 1, 2, 2, 3, 3])
+
+
+def test_polynomial_matches_polyval():
+    polynomial = (2e-3, -0.5, 3., 10.)
+    conversion = Conversion(scale=0.1, polynomial=polynomial)
+    x = np.linspace(-100, 100, 11)
+    np.testing.assert_allclose(conversion.apply(x), np.polyval(polynomial, 0.1*x))
+    assert conversion(7) == pytest.approx(np.polyval(polynomial, 0.7))
+
+
+@pytest.mark.parametrize('size, signed', [(1, False), (1, True), (2, False), (2, True)])
+def test_lookup_table_matches_function(size, signed):
+    conversion = Conversion(scale=0.25, offset=3)
+    table = conversion.lookup_table(size, signed)
+    assert len(table) == 2**(8*size)
+    low = -2**(8*size - 1) if signed else 0
+    raw = np.arange(low, low + 2**(8*size))
+    # Negative raw values index the table from its end
+    np.testing.assert_allclose(table[raw], conversion.apply(raw))
+
+
+def test_lookup_tables_are_shared():
+    table = Conversion(mask=0x0F).lookup_table(1, False)
+    assert Conversion(mask=0x0F).lookup_table(1, False) is table
+    assert table.dtype == np.int64
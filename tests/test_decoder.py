@@ -0,0 +1,85 @@
+"""
+Tests of the precompiled decoders of utils.decoder
+
+"""
+
+from os.path import abspath, dirname
+
+import pytest
+
+import utils.decoder
+from utils.decoder import CACHE_DIRECTORY, FrameDecoder
+from utils.sensors import Sigmundr
+
+
+def test_decode_matches_sensors(sample_frames, tmp_path):
+    vehicle = Sigmundr()
+    decoders = {}
+    for frame in sample_frames[:200]:
+        decoder = vehicle.get_decoder(frame)
+        if decoder is None:
+            continue
+        # The same sensors, with the generated code saved in an empty cache
+        key = tuple(decoder.sensors)
+        if key not in decoders:
+            decoders[key] = FrameDecoder(decoder.sensors, cache_directory=str(tmp_path))
+        values = decoders[key].decode(frame)
+        for name, sensor in decoder.sensors.items():
+            expected = sensor.decode(frame)
+            assert len(values[name]) == len(expected)
+            for sample, expected_sample in zip(values[name], expected):
+                assert sample == pytest.approx(expected_sample, nan_ok=True)
+
+
+def test_decode_batch_matches_decode(sample_frames):
+    vehicle = Sigmundr()
+    groups = {}
+    for frame in sample_frames:
+        decoder = vehicle.get_decoder(frame)
+        if decoder is not None:
+            groups.setdefault((decoder, len(frame)), []).append(frame)
+    assert groups
+
+    for (decoder, _), frames in groups.items():
+        batch = decoder.decode_batch(frames)
+        for name, sensor in decoder.sensors.items():
+            for j, field in enumerate(sensor.fields.keys()):
+                expected = [sample[j] for frame in frames for sample in decoder.decode(frame)[name]]
+                assert batch[name][field] == pytest.approx(expected, nan_ok=True)
+
+
+def test_decode_batch_without_frames():
+    decoder = next(iter(Sigmundr().decoders.values()))
+    values = decoder.decode_batch([])
+    for name, sensor in decoder.sensors.items():
+        assert set(values[name]) == set(sensor.fields)
+        assert all(len(v) == 0 for v in values[name].values())
+
+
+def test_corrupted_cache_is_replaced(sample_frames, tmp_path):
+    sensors = Sigmundr().get_decoder(sample_frames[0]).sensors
+    decoder = FrameDecoder(sensors, cache_directory=str(tmp_path))
+    [path] = tmp_path.glob('decoder_*.py')
+    # A module left half written by another process
+    path.write_text(decoder.source[:len(decoder.source)//2])
+
+    reloaded = FrameDecoder(sensors, cache_directory=str(tmp_path))
+    assert path.read_text() == decoder.source
+    assert reloaded.decode(sample_frames[0]) == decoder.decode(sample_frames[0])
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_cache_not_writable(sample_frames, tmp_path):
+    sensors = Sigmundr().get_decoder(sample_frames[0]).sensors
+    # The cache directory is a file: the code is compiled in memory
+    cache = tmp_path / 'file'
+    cache.write_text('')
+    decoder = FrameDecoder(sensors, cache_directory=str(cache))
+    in_memory = FrameDecoder(sensors, cache_directory=None)
+    assert decoder.decode(sample_frames[0]) == in_memory.decode(sample_frames[0])
+
+
+def test_default_cache_outside_of_the_package():
+    # The __pycache__ directories of the package are deleted by tools and git clean
+    package = dirname(dirname(abspath(utils.decoder.__file__)))
+    assert not abspath(CACHE_DIRECTORY).startswith(package)
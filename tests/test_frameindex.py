@@ -0,0 +1,80 @@
+"""
+Tests of the sidecar index of the log files, utils.frameindex
+
+"""
+
+import shutil
+
+import numpy as np
+import pytest
+
+from tests.conftest import SAMPLE_LOG
+from utils.frameindex import (MAGIC, RECORD_DTYPE, append_records, build_index, build_records,
+                              find_time, get_index_path, read_index)
+from utils.replay import LogReplay
+from utils.sensors import Sigmundr
+
+
+def test_build_index_matches_build_records(sample_frames, tmp_path):
+    log_path = str(tmp_path / 'flight.log')
+    shutil.copy(SAMPLE_LOG, log_path)
+    vehicle = Sigmundr()
+    assert build_index(log_path, vehicle, chunk_size=4096) == len(sample_frames)
+
+    records = read_index(get_index_path(log_path))
+    expected = build_records(sample_frames, 0, vehicle)
+    for field in ('length', 'frame_id', 'obc_time'):
+        np.testing.assert_array_equal(records[field], expected[field])
+    assert np.isnan(records['host_time']).all()
+
+    # The log has bytes that are not frames, the offsets are read in the file
+    with open(log_path, 'rb') as file:
+        data = file.read()
+    for record, frame in zip(records, sample_frames):
+        start = int(record['offset'])
+        assert data[start:start + int(record['length'])] == frame
+
+
+def test_append_and_read(sample_frames, tmp_path):
+    index_path = str(tmp_path / 'flight.idx')
+    vehicle = Sigmundr()
+    first = build_records(sample_frames[:10], 0, vehicle, host_time=1.)
+    offset = int(first['offset'][-1]) + int(first['length'][-1]) + 2
+    second = build_records(sample_frames[10:20], offset, vehicle, host_time=2.)
+    append_records(index_path, first)
+    append_records(index_path, second)
+    # A record being written is ignored
+    with open(index_path, 'ab') as file:
+        file.write(bytes(RECORD_DTYPE.itemsize // 2))
+
+    records = read_index(index_path)
+    assert len(records) == 20
+    assert np.array_equal(records[:10], first) and np.array_equal(records[10:], second)
+    assert find_time(records, 1.5) == 10
+    assert find_time(records, 3.) == 20
+
+
+def test_not_an_index(tmp_path):
+    path = tmp_path / 'flight.idx'
+    path.write_bytes(b'GCFIDX00' + bytes(64))
+    with pytest.raises(ValueError):
+        read_index(str(path))
+    path.write_bytes(MAGIC)
+    assert len(read_index(str(path))) == 0
+
+
+def test_replay_with_index(tmp_path):
+    log_path = str(tmp_path / 'flight.log')
+    shutil.copy(SAMPLE_LOG, log_path)
+    scanned = LogReplay(log_path, Sigmundr())
+    scanned.index_until(10**6)
+    build_index(log_path, Sigmundr())
+    indexed = LogReplay(log_path, Sigmundr())
+    # All the frames are loaded from the index, only the trailers at the end are scanned
+    assert len(indexed) == len(scanned)
+    assert indexed.index_until(10**6) == len(scanned)
+    assert list(indexed.starts) == list(scanned.starts)
+    assert list(indexed.stops) == list(scanned.stops)
+    assert list(indexed.times) == pytest.approx(list(scanned.times))
+    scanned.close()
+    indexed.close()
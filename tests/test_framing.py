@@ -0,0 +1,107 @@
+"""
+Tests of the Framer, utils.framing
+
+"""
+
+from utils.framing import Framer
+
+
+def test_docstring_example():
+    framer = Framer({0x01: [4]})
+    assert [bytes(f) for f in framer.feed(b'\x01\r\n\x00\r\n\x01ab')] == [b'\x01\r\n\x00']
+    assert [bytes(f) for f in framer.feed(b'c\r\n')] == [b'\x01abc']
+    assert framer.nb_frames == 2
+    assert framer.nb_recovered == 1
+
+
+def test_resynchronize_after_garbage():
+    framer = Framer({0x01: [3], 0x02: [5]})
+    frames = framer.feed(b'\x01ab\r\nnoise\r\n\x02abcd\r\n\x03xx\r\n\x01cd\r\n')
+    assert [bytes(f) for f in frames] == [b'\x01ab', b'\x02abcd', b'\x01cd']
+    assert [bytes(d) for d in framer.discarded] == [b'noise', b'\x03xx']
+    assert framer.nb_lost == 2
+    assert framer.nb_discarded_bytes == len(b'noise\r\n\x03xx\r\n')
+
+
+def test_garbage_over_several_reads():
+    framer = Framer({0x01: [3]})
+    assert framer.feed(b'noise\x01') == []
+    assert [bytes(d) for d in framer.discarded] == [b'noise']
+    assert framer.is_resynchronizing
+    # The \x01 is in the middle of the garbage, it is not the start of a frame
+    assert [bytes(f) for f in framer.feed(b'ab\r\n\x01cd\r\n')] == [b'\x01cd']
+    assert [bytes(d) for d in framer.discarded] == [b'\x01ab']
+    assert framer.nb_lost == 1
+    assert framer.nb_discarded_bytes == len(b'noise\x01ab\r\n')
+
+
+def test_several_lengths_for_an_id():
+    framer = Framer({0x01: [6, 3]})
+    frames = framer.feed(b'\x01ab\r\n\x01abcde\r\n')
+    assert [bytes(f) for f in frames] == [b'\x01ab', b'\x01abcde']
+
+
+def test_frames_without_id():
+    framer = Framer({None: [2]})
+    assert [bytes(f) for f in framer.feed(b'\x05\x06\r\n\x07')] == [b'\x05\x06']
+    assert [bytes(f) for f in framer.feed(b'\r\r\n')] == [b'\x07\r']
+
+
+def test_trailer_split_between_reads():
+    framer = Framer({0x01: [3]})
+    assert framer.feed(b'\x01ab\r') == []
+    assert [bytes(f) for f in framer.feed(b'\n')] == [b'\x01ab']
+
+
+def test_sample_log(sample_frames):
+    data = b''.join(frame + b'\r\n' for frame in sample_frames)
+    framer = Framer({frame_id: [96, 136] for frame_id in (0x01, 0x02)})
+    found = [bytes(f) for f in framer.feed(data)]
+    assert found == sample_frames
+
+
+def test_reserve_and_commit_in_any_chunks(sample_frames):
+    data = b''.join(frame + b'\r\n' for frame in sample_frames)
+    framer = Framer({frame_id: [96, 136] for frame_id in (0x01, 0x02)}, buffer_size=512)
+    found = []
+    position = 0
+    size = 1
+    while position < len(data):
+        # Chunks from 1 byte to more than the initial size of the buffer
+        size = size*7 % 1021 + 1
+        chunk = data[position:position + size]
+        view = framer.reserve(len(chunk))
+        view[:len(chunk)] = chunk
+        framer.commit(len(chunk))
+        # The frames are only valid until the next call to reserve()
+        found += [bytes(f) for f in framer.frames()]
+        position += size
+    assert found == sample_frames
+    assert len(framer.buffer) >= 1021
+
+
+def test_clear():
+    framer = Framer({0x01: [3]})
+    framer.feed(b'\x01a')
+    framer.clear()
+    assert [bytes(f) for f in framer.feed(b'\x01bc\r\n')] == [b'\x01bc']
+
+
+def test_clear_keeps_frames():
+    framer = Framer({0x01: [3]}, keep_frames=True)
+    frames = framer.feed(b'\x01ab\r\n\x01c')
+    framer.clear()
+    assert [bytes(f) for f in framer.feed(b'\x01de\r\n')] == [b'\x01de']
+    # The frame returned before is not overwritten
+    assert bytes(frames[0]) == b'\x01ab'
+
+
+def test_keep_frames(sample_frames):
+    data = b''.join(frame + b'\r\n' for frame in sample_frames)
+    framer = Framer({frame_id: [96, 136] for frame_id in (0x01, 0x02)}, buffer_size=1024,
+                    keep_frames=True)
+    kept = []
+    for position in range(0, len(data), 300):
+        kept += framer.feed(data[position:position + 300])
+    # The frames are read after the buffer has been refilled many times
+    assert [bytes(f) for f in kept] == sample_frames
@@ -0,0 +1,153 @@
+"""
+Tests of the reconnection of a lost link by the Gateway, utils.gateway
+
+"""
+
+import fcntl
+import os
+import struct
+import termios
+import time
+
+import pytest
+import serial
+import serial.tools.list_ports
+
+import utils.serialwrapper
+from tests.test_serialwrapper import FakePortInfo
+from utils.gateway import Gateway
+from utils.sensors import Sigmundr
+from utils.serialwrapper import SerialWrapper
+
+
+class UnpluggedPort:
+    """ Serial port of a device that can be unplugged, the bytes are written in a pipe
+
+    """
+
+    # True while the device is plugged
+    plugged = True
+    # Port open, to write the bytes sent by the device
+    current = None
+
+    def __init__(self):
+        self.port = None
+        self.baudrate = 9600
+        self.timeout = None
+        self.is_open = False
+
+    def open(self):
+        if not UnpluggedPort.plugged:
+            raise serial.SerialException(2, "No such file or directory")
+        self.read_fd, self.write_fd = os.pipe()
+        self.is_open = True
+        UnpluggedPort.current = self
+
+    def close(self):
+        if self.is_open:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+            self.is_open = False
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    def write(self, data):
+        return len(data)
+
+    def fileno(self):
+        return self.read_fd
+
+    @property
+    def in_waiting(self):
+        if not UnpluggedPort.plugged:
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        return struct.unpack('i', fcntl.ioctl(self.read_fd, termios.FIONREAD, bytes(4)))[0]
+
+    def readinto(self, view):
+        data = os.read(self.read_fd, len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    @classmethod
+    def send(cls, data):
+        os.write(cls.current.write_fd, data)
+
+    @classmethod
+    def unplug(cls):
+        cls.plugged = False
+        # Wake up the reader thread, which then fails to read
+        os.write(cls.current.write_fd, b'\x00')
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def device(monkeypatch, tmp_path):
+    """ Replace the serial ports, returns the times when the ports are listed
+
+    """
+    listed = []
+    UnpluggedPort.plugged = True
+
+    def comports():
+        listed.append(time.monotonic())
+        return [FakePortInfo('/dev/ttyUSB0', '0')] if UnpluggedPort.plugged else []
+
+    monkeypatch.setattr(serial, 'Serial', UnpluggedPort)
+    monkeypatch.setattr(serial.tools.list_ports, 'comports', comports)
+    monkeypatch.setattr(utils.serialwrapper, 'PORT_CACHE_PATH', str(tmp_path / 'ports.json'))
+    return listed
+
+
+def test_reconnect(device, sample_frames, tmp_path):
+    link = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    # The device was found before
+    link.ser.port = '/dev/ttyUSB0'
+    link.is_device_found = True
+    telemetry = Gateway(link, Sigmundr(), str(tmp_path))
+    rtc = telemetry.sensors.sensors['rtc'].raw_data['Time']
+    frames = [f for f in sample_frames[:20] if len(f) == 96]
+
+    telemetry.start_read()
+    wait_for(lambda: telemetry.get_state()[0] == "OPEN")
+    # The link is lost in the middle of a frame
+    UnpluggedPort.send(b''.join(f + b'\r\n' for f in frames[:5]) + frames[5][:10])
+    wait_for(lambda: len(rtc) == 5)
+    UnpluggedPort.unplug()
+    wait_for(lambda: telemetry.get_state()[0] == "RECONNECTING")
+    del device[:]
+    time.sleep(1.6)
+
+    UnpluggedPort.plugged = True
+    wait_for(lambda: telemetry.get_state()[0] == "OPEN")
+    # The incomplete frame is dropped: the next frames are received
+    UnpluggedPort.send(b''.join(f + b'\r\n' for f in frames[5:10]))
+    wait_for(lambda: len(rtc) == 10)
+    telemetry.stop_read()
+    telemetry.thread.join(5)
+
+    # The delay between two tries is doubled
+    delays = [b - a for a, b in zip(device, device[1:4])]
+    assert len(delays) == 3
+    for delay, next_delay in zip(delays, delays[1:]):
+        assert next_delay == pytest.approx(2 * delay, rel=0.3)
+
+    [gap] = telemetry.gaps
+    assert gap['partial_bytes'] == 10
+    assert gap['seconds'] >= 1.6
+    with open(telemetry.gaps_path) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "start,seconds,partial_bytes"
+    assert lines[1] == "{},{:.3f},10".format(gap['start'], gap['seconds'])
+
+    with open(telemetry.log_path, 'rb') as file:
+        assert file.read() == b''.join(f + b'\r\n' for f in frames[:10])
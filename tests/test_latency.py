@@ -0,0 +1,71 @@
+"""
+Tests of the latency of the commands, utils.latency
+
+"""
+
+import pytest
+
+from utils.latency import LatencyTracker
+
+
+class Lamp:
+    """ Vehicle with a lamp switched by the commands b'on' and b'off'
+
+    """
+
+    def __init__(self):
+        self.is_on = False
+
+    def command_effect(self, command):
+        if command not in (b'on', b'off'):
+            return None, None
+        expected = command == b'on'
+        return 'LAMP', lambda vehicle: vehicle.is_on == expected
+
+
+def test_latency_of_applied_command():
+    lamp = Lamp()
+    tracker = LatencyTracker(lamp)
+    tracker.sent(b'on', host_time=10.)
+    # Frames received before the command was written do not count
+    lamp.is_on = True
+    tracker.update(9.9)
+    tracker.update(10.2)
+    tracker.update(10.5)
+    statistics = tracker.get_statistics()['LAMP']
+    assert statistics['count'] == 1
+    assert statistics['max'] == pytest.approx(0.2)
+    assert statistics['timeouts'] == 0
+
+
+def test_newer_command_supersedes_pending_one():
+    lamp = Lamp()
+    tracker = LatencyTracker(lamp)
+    tracker.sent(b'on', host_time=1.)
+    tracker.sent(b'off', host_time=2.)
+    tracker.update(2.5)
+    assert list(tracker.latencies['LAMP']) == [pytest.approx(0.5)]
+    assert tracker.pending == []
+
+
+def test_timeout_and_unknown_commands():
+    tracker = LatencyTracker(Lamp(), timeout=1.)
+    tracker.sent(b'ping', host_time=0.)
+    tracker.sent(b'on', host_time=0.)
+    tracker.update(0.5)
+    tracker.update(1.5)
+    assert tracker.get_statistics() == {
+        'LAMP': {'count': 0, 'p50': None, 'p95': None, 'max': None, 'timeouts': 1}}
+    tracker.reset()
+    assert tracker.get_statistics() == {}
+
+
+def test_window():
+    lamp = Lamp()
+    lamp.is_on = True
+    tracker = LatencyTracker(lamp, window=3)
+    for i in range(5):
+        tracker.sent(b'on', host_time=float(i))
+        tracker.update(i + 0.1*i)
+    assert list(tracker.latencies['LAMP']) == pytest.approx([0.2, 0.3, 0.4])
+    assert tracker.get_statistics()['LAMP']['p50'] == pytest.approx(0.3)
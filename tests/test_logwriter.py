@@ -0,0 +1,114 @@
+"""
+Tests of the writer of the logs of a Gateway, utils.logwriter
+
+"""
+
+import os
+import time
+
+from utils.frameindex import read_index
+from utils.logwriter import LogWriter
+from utils.sensors import Sigmundr
+
+
+def wait_for(condition, timeout=5.):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def new_writer(tmp_path, **kwargs):
+    return LogWriter(str(tmp_path / 'flight.log'), str(tmp_path / 'flight.idx'), Sigmundr(),
+                     fsync=False, **kwargs)
+
+
+def test_log_and_index(sample_frames, tmp_path):
+    frames = sample_frames[:50]
+    writer = new_writer(tmp_path)
+    writer.open()
+    for start in range(0, len(frames), 7):
+        writer.write(frames[start:start + 7], time.monotonic())
+    writer.close()
+    assert writer.nb_written == len(frames)
+
+    with open(writer.log_path, 'rb') as file:
+        data = file.read()
+    assert data == b''.join(frame + b'\r\n' for frame in frames)
+    records = read_index(writer.index_path)
+    assert len(records) == len(frames)
+    for record, frame in zip(records, frames):
+        start = int(record['offset'])
+        assert data[start:start + int(record['length'])] == frame
+
+
+def test_append_to_existing_log(sample_frames, tmp_path):
+    for frames in (sample_frames[:5], sample_frames[5:10]):
+        writer = new_writer(tmp_path)
+        writer.open()
+        writer.write(frames, time.monotonic())
+        writer.close()
+
+    records = read_index(writer.index_path)
+    assert len(records) == 10
+    with open(writer.log_path, 'rb') as file:
+        data = file.read()
+    start = int(records['offset'][7])
+    assert data[start:start + int(records['length'][7])] == sample_frames[7]
+
+
+def test_no_files_without_frames(tmp_path):
+    writer = new_writer(tmp_path)
+    writer.open()
+    writer.write([], time.monotonic())
+    writer.close()
+    assert not os.path.exists(writer.log_path)
+    assert not os.path.exists(writer.index_path)
+
+
+def test_flush_policy(sample_frames, tmp_path):
+    writer = new_writer(tmp_path, flush_interval=60., flush_frames=10)
+    writer.open()
+    writer.write(sample_frames[:5], time.monotonic())
+    time.sleep(0.1)
+    # Neither enough frames nor too old
+    assert writer.nb_flushes == 0
+    assert writer.get_lag() > 0
+    writer.write(sample_frames[5:10], time.monotonic())
+    wait_for(lambda: writer.nb_flushes == 1)
+    assert writer.get_lag() == 0.
+
+    # A critical write and flush() are flushed at once
+    writer.write(sample_frames[10:11], time.monotonic(), critical=True)
+    wait_for(lambda: writer.nb_flushes == 2)
+    writer.write(sample_frames[11:12], time.monotonic())
+    writer.flush()
+    wait_for(lambda: writer.nb_flushes == 3)
+    writer.close()
+
+
+def test_flush_interval(sample_frames, tmp_path):
+    writer = new_writer(tmp_path, flush_interval=0.05)
+    writer.open()
+    writer.write(sample_frames[:1], time.monotonic())
+    wait_for(lambda: writer.nb_flushes == 1)
+    assert writer.max_lag >= 0.05
+    writer.close()
+
+
+def test_session_is_synced_on_critical_flushes(sample_frames, tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, 'fsync', synced.append)
+    writer = LogWriter(str(tmp_path / 'flight.log'), str(tmp_path / 'flight.idx'), Sigmundr(),
+                       flush_interval=60., flush_frames=10,
+                       session_path=str(tmp_path / 'flight.session'))
+    writer.open()
+    writer.write(sample_frames[:10], time.monotonic())
+    wait_for(lambda: writer.nb_flushes == 1)
+    session = writer.session.fileno()
+    assert len(synced) == 2 and session not in synced
+    writer.flush()
+    wait_for(lambda: writer.nb_flushes == 2)
+    assert synced[2:] == [writer.log.fileno(), writer.index.fileno(), session]
+    writer.close()
+    assert synced[-1] == session
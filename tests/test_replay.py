@@ -0,0 +1,65 @@
+"""
+Tests of the replay of log files, utils.replay
+
+"""
+
+import numpy as np
+import pytest
+
+from tests.conftest import SAMPLE_LOG
+from utils.replay import LogReplay
+from utils.sensors import Sigmundr
+
+
+def rtc_frame(hour, minute, second):
+    """ Frame 0x01 of Sigmundr with only its RTC set
+
+    """
+    frame = bytearray(96)
+    frame[0] = 0x01
+    frame[4:8] = bytes([hour, minute, second, 0])
+    return bytes(frame)
+
+
+def test_sample_log(sample_frames, tmp_path):
+    replay = LogReplay(SAMPLE_LOG, Sigmundr(), chunk_size=4096,
+                       index_path=str(tmp_path / 'none.idx'))
+    assert replay.index_until(10) >= 10
+    assert not replay.is_indexed
+    assert replay.index_until(len(sample_frames) + 1) == len(sample_frames)
+    assert replay.is_indexed
+    assert [bytes(f) for f in replay.get_frames(0, len(replay))] == sample_frames
+    assert replay.times[0] == 0.
+
+    # Frames up to a time
+    times = np.array(replay.times)
+    count = replay.index_until_time(10.)
+    assert count == np.searchsorted(times, 10., side='right')
+    replay.close()
+
+
+def test_rtc_unwrapped_at_midnight(tmp_path):
+    frames = [rtc_frame(23, 59, s) for s in range(50, 60)]
+    frames += [rtc_frame(0, 0, s) for s in range(0, 10)]
+    # Garbage between the frames is skipped
+    frames.insert(12, b'\x07' + bytes(95))
+    path = tmp_path / 'midnight.log'
+    path.write_bytes(b''.join(frame + b'\r\n' for frame in frames))
+
+    # Small chunks, the unwrap continues from one chunk to the next
+    replay = LogReplay(str(path), Sigmundr(), chunk_size=300)
+    replay.index_until(len(frames))
+    assert replay.is_indexed
+    assert len(replay) == len(frames) - 1
+    assert list(replay.times) == pytest.approx(list(range(20)))
+    replay.close()
+
+
+def test_empty_log(tmp_path):
+    path = tmp_path / 'empty.log'
+    path.write_bytes(b'')
+    replay = LogReplay(str(path), Sigmundr())
+    assert replay.is_indexed
+    assert replay.index_more() == 0
+    assert len(replay) == 0
+    replay.close()
@@ -0,0 +1,101 @@
+"""
+Tests of the clock of the replays, utils.replay.ReplayClock, and of the replay of a file
+by a SerialWrapper
+
+"""
+
+import pytest
+
+import utils.replay
+from tests.conftest import SAMPLE_LOG
+from utils.replay import LogReplay, ReplayClock
+from utils.sensors import Sigmundr
+from utils.serialwrapper import SerialWrapper
+
+
+class FakeTime:
+    """ Replaces the time module of utils.replay, the time only moves with sleep()
+
+    """
+
+    def __init__(self):
+        self.now = 1000.
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock_time(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(utils.replay, 'time', fake)
+    return fake
+
+
+def test_speed(clock_time):
+    clock = ReplayClock(speed=2)
+    clock_time.sleep(3)
+    assert clock.now() == pytest.approx(6.)
+    assert clock.delay(10.) == pytest.approx(2.)
+    clock.set_speed(0.5)
+    clock_time.sleep(2)
+    assert clock.now() == pytest.approx(7.)
+    with pytest.raises(ValueError):
+        clock.set_speed(1000)
+
+
+def test_pause_and_seek(clock_time):
+    clock = ReplayClock()
+    clock_time.sleep(1)
+    clock.pause()
+    clock_time.sleep(5)
+    assert clock.now() == pytest.approx(1.)
+    assert clock.delay(2.) == float('inf')
+    clock.seek(30.)
+    assert clock.now() == pytest.approx(30.)
+    clock.resume()
+    clock_time.sleep(1)
+    assert clock.now() == pytest.approx(31.)
+
+
+def test_fast(clock_time):
+    clock = ReplayClock()
+    clock.set_fast(True)
+    clock_time.sleep(10)
+    # The reader of the frames moves the clock
+    assert clock.now() == 0.
+    assert clock.delay(100.) == 0.
+    clock.seek(50.)
+    clock.set_fast(False)
+    clock_time.sleep(1)
+    assert clock.now() == pytest.approx(51.)
+
+
+def read_replay(serial):
+    frames = []
+    while not serial.failed:
+        frames += [bytes(frame) for frame in serial.readlines()]
+    return frames
+
+
+def test_fast_replay_of_a_file(sample_frames):
+    serial = SerialWrapper(115200, "Replay", filepath=SAMPLE_LOG, sensors=Sigmundr())
+    assert serial.open_link()
+    serial.clock.set_fast(True)
+    assert read_replay(serial) == sample_frames
+
+
+def test_seek_replay(sample_frames):
+    times = LogReplay(SAMPLE_LOG, Sigmundr())
+    times.index_until(len(sample_frames))
+    first = next(i for i, t in enumerate(times.times) if t >= 10.)
+    times.close()
+
+    serial = SerialWrapper(115200, "Replay", filepath=SAMPLE_LOG, sensors=Sigmundr())
+    assert serial.open_link()
+    serial.clock.set_fast(True)
+    serial.seek_replay(10.)
+    assert read_replay(serial) == sample_frames[first:]
@@ -0,0 +1,53 @@
+"""
+Tests of the registry of frame layouts, utils.schemas
+
+"""
+
+import pytest
+
+from utils.schemas import VehicleSchema, get_schema, register_schema
+from utils.sensors import BMP280, RTC, Vehicle
+
+
+def new_schema(name='Test', frames=None):
+    return VehicleSchema(
+        name=name,
+        sensors={
+            'rtc': {'class': RTC, 'start': 1, 'is_rtc': True},
+            'bmp': {'class': BMP280, 'start': 5},
+        },
+        frames=frames or {(0x01, 13): ['rtc', 'bmp']},
+    )
+
+
+def test_unknown_sensor():
+    with pytest.raises(ValueError):
+        new_schema(frames={(0x01, 13): ['rtc', 'imu']})
+
+
+def test_frame_id_for_all_frames_or_none():
+    with pytest.raises(ValueError):
+        new_schema(frames={(0x01, 13): ['rtc'], (None, 9): ['rtc']})
+    assert not new_schema(frames={(None, 13): ['rtc', 'bmp']}).has_frame_id
+
+
+def test_registry():
+    schema = register_schema(new_schema('Registry test'))
+    assert get_schema('Registry test') is schema
+    with pytest.raises(ValueError):
+        get_schema('Not registered')
+
+
+def test_vehicle_from_schema():
+    vehicle = Vehicle(new_schema())
+    assert set(vehicle.sensors) == {'rtc', 'bmp'}
+    assert vehicle.get_decoder(bytes([0x01]) + bytes(12)) is not None
+    assert vehicle.get_decoder(bytes([0x02]) + bytes(12)) is None
+    assert vehicle.get_decoder(bytes([0x01]) + bytes(20)) is None
+
+
+def test_sigmundr_frames():
+    vehicle = Vehicle(get_schema('Sigmundr'))
+    for frame_id in (0x01, 0x02):
+        for length in (96, 136):
+            assert vehicle.get_decoder(bytes([frame_id]) + bytes(length - 1)) is not None
@@ -0,0 +1,146 @@
+"""
+Tests of the update of the sensors of a vehicle, utils.sensors
+
+"""
+
+import datetime
+import struct
+
+import numpy as np
+import pytest
+
+from utils.schemas import VehicleSchema
+from utils.sensors import BMP280, RTC, RTC_PERIOD, Sigmundr, Vehicle
+
+
+def rtc_frame(hour, minute, second, fraction=0, frame_id=0x01, length=96, values=None):
+    """ Frame of Sigmundr with its RTC set, `fraction` in 1/256 s
+
+    Parameters
+    ----------
+    values: dict
+        (optional) {position in the frame: byte}, the other bytes are 0
+
+    """
+    frame = bytearray(length)
+    frame[0] = frame_id
+    frame[4:8] = bytes([hour, minute, second, fraction])
+    for position, value in (values or {}).items():
+        frame[position] = value
+    return bytes(frame)
+
+
+def test_time_stamps_across_midnight():
+    vehicle = Sigmundr()
+    clocks = [(23, 59, 58, 0), (23, 59, 59, 128), (0, 0, 0, 0), (0, 0, 1, 64), (0, 0, 2, 0)]
+    host_times = [100. + i*0.5 for i in range(len(clocks))]
+    for clock, host_time in zip(clocks, host_times):
+        vehicle.update_sensors(rtc_frame(*clock), host_time)
+
+    times = vehicle.rtc.raw_data['Time'].values()
+    assert times.dtype == np.float64
+    np.testing.assert_allclose(times - (RTC_PERIOD - 2), [0., 1.5, 2., 3.25, 4.])
+    assert (np.diff(times) > 0).all()
+    np.testing.assert_allclose(vehicle.rtc.raw_data['Host_time'].values(), host_times)
+
+    # The other sensors are time stamped with the RTC of their frame
+    np.testing.assert_allclose(vehicle.timer.raw_data['Time'].values(), times)
+    np.testing.assert_allclose(vehicle.timer.raw_data['Seconds_since_start'].values(),
+                               [0., 1.5, 2., 3.25, 4.])
+    assert vehicle.timer.get_time() == datetime.time(0, 0, 2)
+    assert vehicle.timer.get_time(1) == datetime.time(23, 59, 59, 500000)
+
+
+def test_status_flags():
+    vehicle = Sigmundr()
+    status = vehicle.status
+    values = {
+        1: status.mask('LIFTOFF') | status.mask('APOGEE'),  # STATUS_1
+        2: status.mask('PARACHUTE_TRIGGER'),  # STATUS_2
+        3: vehicle.errmsg.mask('ERR_WRITE_SD') | vehicle.errmsg.mask('ERR_READ_IMU'),
+        132: 0b10101,  # Fix of the GPS
+    }
+    vehicle.update_sensors(rtc_frame(12, 0, 0, frame_id=0x02, length=136, values=values), 1.)
+
+    assert status.data['STATUS_1'] == 0b110
+    flags = {flag: status.data[flag] for flag in status.flags}
+    assert flags == {'LIFTOFF': 1, 'APOGEE': 1, 'PARACHUTE_IGNITING': 0,
+                     'PARACHUTE_ARDUINO_ARMING': 0, 'PARACHUTE_ARMING': 0, 'PARACHUTE_TRIGGER': 1}
+    errors = {flag: vehicle.errmsg.data[flag] for flag in vehicle.errmsg.flags}
+    assert errors == {'ERR_LOOP_TIME': 0, 'ERR_WRITE_SD': 1, 'ERR_SYNC_SD': 0, 'ERR_SEND_TM': 0,
+                      'ERR_READ_IMU': 1}
+    # The raw histories have the flags too
+    assert status.raw_data['LIFTOFF'][-1] == 1
+    assert status.raw_data['PARACHUTE_IGNITING'][-1] == 0
+    assert vehicle.errmsg.raw_data['ERR_READ_IMU'][-1] == 1
+
+    # Flags of several bits are shifted
+    gps = vehicle.gps
+    assert gps.data['Fix_Validity'][-1] == 1
+    assert gps.data['Fix_Quality'][-1] == 2
+    assert gps.data['Fix_Status'][-1] == 2
+
+
+def test_update_sensors_many_matches_update_sensors(sample_frames):
+    one_by_one = Sigmundr()
+    many = Sigmundr()
+    host_time = 100.
+    for frame in sample_frames:
+        one_by_one.update_sensors(frame, host_time)
+    for start in range(0, len(sample_frames), 250):
+        many.update_sensors_many(sample_frames[start:start + 250], host_time)
+
+    assert len(one_by_one.sensors[one_by_one.clock].raw_data['Time']) > 0
+    for name, sensor in one_by_one.sensors.items():
+        other = many.sensors[name]
+        for field, channel in sensor.raw_data.items():
+            np.testing.assert_allclose(other.raw_data[field].values(), channel.values(),
+                                       err_msg="{} {}".format(name, field))
+
+
+def test_decode_batch_matches_update_sensors():
+    # Two samples of the BMP280 per frame, acquired at 10 Hz
+    vehicle = Vehicle(VehicleSchema(
+        name='Sampled',
+        sensors={
+            'rtc': {'class': RTC, 'start': 1, 'is_rtc': True},
+            'bmp': {'class': BMP280, 'start': 5, 'nb_samples': 2, 'sample_rate': 10},
+        },
+        frames={(0x01, 21): ['rtc', 'bmp']},
+    ))
+    clocks = [(23, 59, 57), (23, 59, 58), (23, 59, 59), (0, 0, 0), (0, 0, 1)]
+    frames = [bytes([0x01, *clock, 0]) + bytes(16) for clock in clocks]
+    for frame in frames:
+        vehicle.update_sensors(frame, 100.)
+
+    values = vehicle.decode_batch(frames)
+    for name, sensor in vehicle.sensors.items():
+        np.testing.assert_allclose(values[name]['Seconds_since_start'],
+                                   sensor.raw_data['Seconds_since_start'].values(), err_msg=name)
+    np.testing.assert_allclose(values['bmp']['Seconds_since_start'][:4], [-0.3, -0.2, 0.7, 0.8])
+
+
+def test_set_reference_recomputes_the_history():
+    vehicle = Sigmundr()
+    # (latitude, longitude) in NMEA format, pressure in Pa. The last frame is the reference
+    samples = [((4631., 630.), 101325.), ((4630., 630.), 100000.)]
+    for second, ((latitude, longitude), pressure) in enumerate(samples):
+        data = struct.pack('<ii', 2000, int(pressure*256)) + bytes(20) \
+            + struct.pack('<ff', latitude, longitude)
+        frame = rtc_frame(12, 0, second, frame_id=0x02, length=136,
+                          values={72 + i: byte for i, byte in enumerate(data)})
+        vehicle.update_sensors(frame, 1.)
+
+    gps, bmp = vehicle.gps, vehicle.bmp2
+    # No value before the reference is set, and no sample but the received ones
+    assert list(gps.data['Distance'][:]) == [0., 0.]
+    assert list(bmp.data['Altitude'][:]) == [0., 0.]
+    np.testing.assert_allclose(gps.data['Latitude'][:], [46.516667, 46.5], rtol=1e-6)
+
+    vehicle.set_reference()
+    # One minute of latitude to the north of the reference
+    np.testing.assert_allclose(gps.data['Distance'][:], [6372800*np.radians(1/60), 0.], atol=1e-3)
+    assert gps.data['Bearing'][0] == pytest.approx(0.)
+    assert bmp.data['Altitude'][-1] == 0.
+    assert bmp.data['Altitude'][0] == pytest.approx(bmp.altitude(20., 101325., 100000.))
+    assert bmp.data['Altitude'][0] < 0.
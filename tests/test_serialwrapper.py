@@ -0,0 +1,336 @@
+"""
+Tests of SerialWrapper, on fake serial ports
+
+"""
+
+import fcntl
+import os
+import struct
+import termios
+import threading
+import time
+
+import pytest
+import serial
+import serial.tools.list_ports
+
+import utils.serialwrapper
+from utils.framing import Framer
+from utils.gateway import Gateway
+from utils.sensors import Sigmundr
+from utils.serialwrapper import SerialWrapper
+
+
+class PipePort:
+    """ Open serial port replaced by a pipe, the bytes are written at the other end
+
+    """
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self.port = "pipe"
+        self.is_open = True
+
+    def fileno(self):
+        return self.read_fd
+
+    @property
+    def in_waiting(self):
+        return struct.unpack('i', fcntl.ioctl(self.read_fd, termios.FIONREAD, bytes(4)))[0]
+
+    def readinto(self, view):
+        data = os.read(self.read_fd, len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def send(self, data, size=4096):
+        """ Write bytes in chunks from another thread, as a device would
+
+        """
+        def write():
+            for position in range(0, len(data), size):
+                os.write(self.write_fd, data[position:position + size])
+        thread = threading.Thread(target=write)
+        thread.start()
+        return thread
+
+    def close(self):
+        if self.is_open:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+            self.is_open = False
+
+
+class FakePortInfo:
+    """ Port listed by serial.tools.list_ports.comports()
+
+    """
+
+    def __init__(self, device, serial_number):
+        self.device = device
+        self.description = "USB Serial ({})".format(device)
+        self.vid = 0x1A86
+        self.pid = 0x7523
+        self.serial_number = serial_number
+        self.location = None
+
+
+class FakeSerial:
+    """ Serial port that answers the bonjour of the gateway connected to it
+
+    """
+
+    # {port name: bonjour string of the gateway connected}, None if nothing answers
+    gateways = {}
+    probed = []
+
+    def __init__(self):
+        self.port = None
+        self.baudrate = 9600
+        self.timeout = None
+        self.is_open = False
+        self.answer = b''
+
+    def open(self):
+        self.is_open = True
+        FakeSerial.probed.append(self.port)
+
+    def close(self):
+        self.is_open = False
+
+    def reset_input_buffer(self):
+        pass
+
+    def reset_output_buffer(self):
+        pass
+
+    def write(self, data):
+        bonjour = self.gateways.get(self.port)
+        if data == b'&gB0' and bonjour is not None:
+            self.answer = bonjour.encode('utf-8') + b'\r\n'
+        return len(data)
+
+    def readline(self):
+        answer, self.answer = self.answer, b''
+        if not answer:
+            time.sleep(self.timeout)
+        return answer
+
+
+class FakeRFD900(FakeSerial):
+    """ Serial port of an RFD900 radio: it answers "+++" with "OK" only after 1 s without
+    data before and after it
+
+    """
+
+    def open(self):
+        super().open()
+        self.last_write = time.monotonic()
+        self.command_time = None
+
+    def write(self, data):
+        now = time.monotonic()
+        if data == b'+++' and self.port in self.gateways and now - self.last_write >= 1:
+            self.command_time = now
+        self.last_write = now
+
+    def __answer(self):
+        if self.command_time is not None and time.monotonic() - self.command_time >= 1:
+            return b'OK\r\n'
+        return b''
+
+    @property
+    def in_waiting(self):
+        return len(self.__answer())
+
+    def read(self, size=1):
+        return self.__answer()[:size]
+
+
+@pytest.fixture
+def ports(monkeypatch, tmp_path):
+    """ Replace the serial ports, returns the list of the ports listed
+
+    """
+    listed = []
+    FakeSerial.gateways = {}
+    FakeSerial.probed = []
+    monkeypatch.setattr(serial, 'Serial', FakeSerial)
+    monkeypatch.setattr(serial.tools.list_ports, 'comports', lambda: list(listed))
+    monkeypatch.setattr(utils.serialwrapper, 'PORT_CACHE_PATH', str(tmp_path / 'ports.json'))
+    return listed
+
+
+def test_reader_thread(sample_frames):
+    serial = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    serial.framer = Framer.from_schema(Sigmundr().schema)
+    serial.ser = port = PipePort()
+    serial.start_reader()
+    sender = port.send(b''.join(frame + b'\r\n' for frame in sample_frames))
+
+    frames = []
+    host_times = []
+    while len(frames) < len(sample_frames):
+        reads = serial.read_frames(timeout=5)
+        assert reads
+        for host_time, read in reads:
+            host_times.append(host_time)
+            frames += [bytes(frame) for frame in read]
+    sender.join()
+    serial.stop_reader()
+    port.close()
+
+    assert frames == sample_frames
+    assert host_times == sorted(host_times)
+    assert serial.nb_dropped == 0
+
+
+def test_find_devices_in_parallel(ports):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(4)]
+    FakeSerial.gateways = {'/dev/ttyUSB1': 'LAUNCHPAD', '/dev/ttyUSB3': 'TELEMETRY'}
+    telemetry = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    launchpad = SerialWrapper(115200, "Launchpad", bonjour='LAUNCHPAD')
+    missing = SerialWrapper(115200, "Missing", bonjour='MISSING')
+
+    start = time.monotonic()
+    found = SerialWrapper.find_devices(telemetry, launchpad, missing)
+    assert found == [True, True, False]
+    assert telemetry.ser.port == '/dev/ttyUSB3'
+    assert launchpad.ser.port == '/dev/ttyUSB1'
+    assert telemetry.ser.is_open and launchpad.ser.is_open
+    # The ports are probed at the same time: the search lasts about one probe
+    assert time.monotonic() - start < 2*utils.serialwrapper.PROBE_TIMEOUT
+
+
+def test_rfd900_is_given_the_guard_time(ports, monkeypatch):
+    monkeypatch.setattr(serial, 'Serial', FakeRFD900)
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(2)]
+    FakeSerial.gateways = {'/dev/ttyUSB1': 'RFD900'}
+    radio = SerialWrapper(57600, "Telemetry", rfd900=True)
+    assert SerialWrapper.find_devices(radio) == [True]
+    assert radio.ser.port == '/dev/ttyUSB1'
+    radio.close_serial()
+
+    # The port found is probed first with a shorter timeout, but the same guard time
+    FakeSerial.probed = []
+    radio = SerialWrapper(57600, "Telemetry", rfd900=True)
+    assert SerialWrapper.find_devices(radio) == [True]
+    assert FakeSerial.probed == ['/dev/ttyUSB1']
+
+
+def test_cached_port_is_probed_first(ports):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(3)]
+    FakeSerial.gateways = {'/dev/ttyUSB2': 'TELEMETRY'}
+    assert SerialWrapper.find_devices(SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY'))
+
+    # The adapter is plugged again and gets another name
+    ports[2] = FakePortInfo('/dev/ttyUSB7', '2')
+    FakeSerial.gateways = {'/dev/ttyUSB7': 'TELEMETRY'}
+    FakeSerial.probed = []
+    telemetry = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    assert SerialWrapper.find_devices(telemetry)
+    assert telemetry.ser.port == '/dev/ttyUSB7'
+    assert FakeSerial.probed == ['/dev/ttyUSB7']
+
+
+def test_gateway_opens_the_link_in_background(ports, tmp_path):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(3)]
+    telemetry = Gateway(SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY'), Sigmundr(),
+                        str(tmp_path))
+    start = time.monotonic()
+    telemetry.start_read()
+    # The search goes on in the reading thread
+    assert time.monotonic() - start < 0.5
+    time.sleep(0.2)
+    assert telemetry.get_state() == ("TESTING", ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2'])
+
+    deadline = time.monotonic() + 5
+    while telemetry.get_state()[0] in ("SEARCHING", "TESTING") and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert telemetry.get_state() == ("FAILED", [])
+    telemetry.stop_read()
+
+
+def test_searches_started_together_are_queued(ports, monkeypatch):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(4)]
+    FakeSerial.gateways = {'/dev/ttyUSB1': 'LAUNCHPAD', '/dev/ttyUSB3': 'TELEMETRY'}
+    running = []
+    overlaps = []
+    find_devices = SerialWrapper.find_devices
+
+    def find_alone(*wrappers):
+        running.append(wrappers)
+        if len(running) > 1:
+            overlaps.append(wrappers)
+        try:
+            return find_devices(*wrappers)
+        finally:
+            running.remove(wrappers)
+
+    monkeypatch.setattr(SerialWrapper, 'find_devices', staticmethod(find_alone))
+    telemetry = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    launchpad = SerialWrapper(115200, "Launchpad", bonjour='LAUNCHPAD')
+    threads = [threading.Thread(target=w.open_link) for w in (telemetry, launchpad)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert telemetry.ser.port == '/dev/ttyUSB3'
+    assert launchpad.ser.port == '/dev/ttyUSB1'
+    # The ports are never probed by two searches at once
+    assert overlaps == []
+
+
+def test_full_search_when_cached_port_does_not_answer(ports):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(3)]
+    FakeSerial.gateways = {'/dev/ttyUSB0': 'TELEMETRY'}
+    assert SerialWrapper.find_devices(SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY'))
+
+    # Another device is now plugged in the adapter of the last time
+    FakeSerial.gateways = {'/dev/ttyUSB1': 'TELEMETRY'}
+    FakeSerial.probed = []
+    telemetry = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    assert SerialWrapper.find_devices(telemetry)
+    assert telemetry.ser.port == '/dev/ttyUSB1'
+    assert FakeSerial.probed[0] == '/dev/ttyUSB0'
+
+
+def test_cancel_search(ports):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(3)]
+    telemetry = SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY')
+    stop = threading.Event()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(telemetry.open_link(stop=stop)))
+    thread.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    stop.set()
+    thread.join(5)
+    # The probes give up at once instead of waiting for an answer
+    assert time.monotonic() - start < 0.5
+    assert result == [False]
+    assert telemetry.state == "CLOSED"
+    assert not telemetry.is_device_found
+
+
+def test_stop_read_cancels_search_of_gateway(ports, tmp_path):
+    ports += [FakePortInfo('/dev/ttyUSB{}'.format(i), str(i)) for i in range(3)]
+    telemetry = Gateway(SerialWrapper(115200, "Telemetry", bonjour='TELEMETRY'), Sigmundr(),
+                        str(tmp_path))
+    telemetry.start_read()
+    time.sleep(0.2)
+    telemetry.stop_read()
+    telemetry.thread.join(1)
+    assert not telemetry.thread.is_alive()
+    assert telemetry.serial.state == "CLOSED"
+
+    # The link can be opened again at once
+    FakeSerial.gateways = {'/dev/ttyUSB1': 'TELEMETRY'}
+    telemetry.start_read()
+    thread = telemetry.thread
+    telemetry.stop_read()
+    telemetry.start_read()
+    assert not thread.is_alive()
+    telemetry.stop_read()
+    telemetry.thread.join(5)
@@ -0,0 +1,98 @@
+"""
+Tests of the session files, utils.session
+
+"""
+
+import pytest
+
+from tests.conftest import SAMPLE_LOG
+from utils.gateway import Gateway
+from utils.logwriter import LogWriter
+from utils.sensors import Sigmundr
+from utils.serialwrapper import SerialWrapper
+from utils.session import (SessionReplay, is_session, iter_records, new_header, pack_records,
+                           read_header, write_header)
+
+
+def write_session(path, groups):
+    """ Write a session with the LogWriter, `groups` is [(host time, [frame, ]), ]
+
+    """
+    writer = LogWriter(str(path.with_suffix('.log')), str(path.with_suffix('.idx')), Sigmundr(),
+                       fsync=False, session_path=str(path), name="Telemetry")
+    writer.open()
+    for host_time, frames in groups:
+        writer.write(frames, host_time)
+    writer.close()
+
+
+def test_records(sample_frames, tmp_path):
+    path = tmp_path / 'flight.session'
+    groups = [(10. + i, sample_frames[i*5:(i + 1)*5]) for i in range(4)]
+    write_session(path, groups)
+
+    assert is_session(str(path))
+    assert not is_session(str(path.with_suffix('.log')))
+    header, _ = read_header(path.read_bytes())
+    assert header['gateway'] == "Telemetry"
+    assert header['vehicle'] == 'Sigmundr'
+    assert header['schema_version'] == Sigmundr().schema.version
+
+    expected = [(host_time, frame) for host_time, frames in groups for frame in frames]
+    assert [(t, bytes(f)) for t, f in iter_records(str(path))] == expected
+
+
+def test_replay_ignores_incomplete_record(sample_frames, tmp_path):
+    path = tmp_path / 'flight.session'
+    write_session(path, [(5., sample_frames[:3]), (5.5, sample_frames[3:6])])
+    # The recording stopped while a record was written
+    with open(path, 'ab') as file:
+        file.write(pack_records(sample_frames[6:7], 6.)[:-10])
+
+    replay = SessionReplay(str(path), Sigmundr(), chunk_size=100)
+    assert replay.index_until(100) == 6
+    assert replay.is_indexed
+    assert list(replay.times) == [0.] * 3 + [0.5] * 3
+    assert [bytes(f) for f in replay.get_frames(0, 6)] == sample_frames[:6]
+    assert len(list(iter_records(str(path)))) == 6
+    replay.close()
+
+
+def test_not_a_session(tmp_path):
+    with pytest.raises(ValueError):
+        read_header(b'GCSESS00' + bytes(8))
+    path = tmp_path / 'flight.session'
+    with open(path, 'wb') as file:
+        write_header(file, new_header("Telemetry", Sigmundr()))
+    with pytest.raises(ValueError):
+        read_header(path.read_bytes()[:-1])
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        SessionReplay(str(path), Sigmundr())
+
+
+def test_replay_of_a_session(sample_frames, tmp_path):
+    path = tmp_path / 'flight.session'
+    write_session(path, [(1., sample_frames[:100]), (2., sample_frames[100:200])])
+    serial = SerialWrapper(115200, "Replay", filepath=str(path), sensors=Sigmundr())
+    assert serial.open_link()
+    serial.clock.set_fast(True)
+    frames = []
+    while not serial.failed:
+        frames += [bytes(frame) for frame in serial.readlines()]
+    assert frames == sample_frames[:200]
+
+
+@pytest.mark.parametrize('record_session', [False, True])
+def test_session_of_gateway_is_optional(tmp_path, record_session):
+    serial = SerialWrapper(115200, "Telemetry", filepath=SAMPLE_LOG, sensors=Sigmundr())
+    gateway = Gateway(serial, Sigmundr(), str(tmp_path), record_session=record_session)
+    assert (gateway.session_path is not None) == record_session
+    assert gateway.writer.session_path == gateway.session_path
+
+
+def test_session_of_gateway_is_recorded_by_default(tmp_path):
+    serial = SerialWrapper(115200, "Telemetry", filepath=SAMPLE_LOG, sensors=Sigmundr())
+    gateway = Gateway(serial, Sigmundr(), str(tmp_path))
+    assert gateway.session_path is not None
+    assert gateway.writer.session_path == gateway.session_path
@@ -1,4 +1,12 @@
+from utils.asyncgateway import AsyncGateway
+from utils.commandqueue import CommandQueue
 from utils.dummyserialwrapper import DummySerialWrapper
+from utils.frameindex import build_index, read_index
 from utils.gateway import Gateway
-from utils.sensors import LaunchpadControl, Sigmundr
+from utils.latency import LatencyTracker
+from utils.logwriter import LogWriter
+from utils.replay import LogReplay, ReplayClock
+from utils.schemas import VehicleSchema, get_schema, register_schema
+from utils.sensors import LaunchpadControl, Sigmundr, Vehicle
 from utils.serialwrapper import SerialWrapper
+from utils.session import SessionReplay, iter_records
@@ -0,0 +1,231 @@
+"""
+Class to read data from a Gateway device with asyncio and save it on storage
+
+"""
+
+import asyncio
+import datetime
+import time
+from os import mkdir
+from os.path import isdir, join
+
+from utils.frameindex import get_index_path
+from utils.framing import Framer
+from utils.logwriter import LogWriter
+
+# Maximum number of reads waiting for the consumers of frames()
+QUEUE_SIZE = 1024
+
+
+class AsyncGateway:
+    """ Class to read data received from a Gateway device with asyncio
+
+    Same as Gateway, but the serial port is watched by the event loop with add_reader()
+    instead of a reading thread: a single event loop can serve many links. The frames are
+    saved in a file by a LogWriter and decoded as soon as they are received, they can also
+    be read with `async for`
+
+    This needs a selector event loop and a serial port with a file descriptor (POSIX).
+    Reading from a file is not supported
+
+    Parameters
+    ----------
+    serial : SerialWrapper instance
+        SerialWrapper instance used to read data from the Gateway device
+    sensors : Sensors instance
+        Sensors instance used to process the received data
+    path : path-like object
+        path to the directory to store received data
+    record_session : bool
+        (optional) False to not save the frames in a session file, see Gateway
+
+    Attributes
+    ----------
+    is_reading : bool
+        True if the instance is currently reading data from serial link
+    nb_dropped : int
+        number of frames dropped because the consumers of frames() were too slow
+    closing : asyncio Future
+        close of a writer in progress in the default executor, None if there is none.
+        start_read() waits for it
+
+    Examples
+    --------
+    >>> serial = SerialWrapper(baudrate=57600, name="Telemetry", rfd900=True)
+    >>> sensors = Sensors(imu="Test")
+    >>> telemetry = AsyncGateway(serial=serial, sensors=sensors, path="./data")
+    >>> await telemetry.start_read()
+    >>> await telemetry.send_command('do something')
+    >>> async for frame in telemetry.frames():
+    ...     print(frame)
+    ...
+    >>> telemetry.stop_read() # This ends the loops on frames()
+
+    """
+
+    def __init__(self, serial, sensors, path, record_session=True):
+        self.serial = serial
+        self.sensors = sensors
+        self.path = path
+        self.record_session = record_session
+        # This is the same as the serial for consistency
+        self.name = self.serial.name
+        # Frames are binary, they are found from the lengths given by the schema of the vehicle
+        self.serial.framer = Framer.from_schema(self.sensors.schema)
+
+        self.is_reading = False
+        self.nb_dropped = 0
+        self.loop = None
+        self.fd = None
+        self.queue = None
+        self.writer = None
+        self.closing = None
+
+        # Create the folder to store the files if it does not already exist
+        if not isdir(self.path):
+            mkdir(self.path)
+
+        self.reset()
+
+    def reset(self):
+        self.date_created = datetime.datetime.now().replace(microsecond=0).isoformat()
+
+        self.log_file = "{}_{}.log".format(
+            self.date_created.replace(":", "-"),
+            self.name)
+        self.log_path = join(self.path, self.log_file)
+        self.index_path = get_index_path(self.log_path)
+        # None when no session file is recorded
+        self.session_path = None
+        if self.record_session:
+            self.session_path = join(self.path, "{}_{}.session".format(
+                self.date_created.replace(":", "-"),
+                self.name))
+        # The frames already received stay in the previous files
+        is_writing = self.writer is not None and self.writer.is_running
+        if is_writing:
+            self.__close_writer()
+        self.writer = LogWriter(self.log_path, self.index_path, self.sensors,
+                                session_path=self.session_path, name=self.name)
+        if is_writing:
+            self.writer.open()
+
+    def __close_writer(self):
+        """ Close the writer, in the default executor if the event loop is running
+
+        Closing the writer waits for its thread and for the disk: this must not block the
+        event loop, which may serve other links
+
+        """
+        writer = self.writer
+        if self.loop is not None and self.loop.is_running():
+            self.closing = self.loop.run_in_executor(None, writer.close)
+        else:
+            writer.close()
+
+    def __on_readable(self):
+        """ Read the frames received, called by the event loop when the port is readable
+
+        """
+        lines = self.serial.readlines()
+        if self.serial.failed:
+            self.stop_read()
+            return
+        if not lines:
+            return
+        host_time = time.monotonic()
+
+        # The frames are views of the buffer of the framer, they are copied for the writer
+        # and the consumers of frames(), which run later
+        frames = [bytes(l) for l in lines]
+        self.writer.write(frames, host_time)
+        try:
+            self.sensors.update_sensors_many(lines, host_time)
+        except:
+            pass
+
+        if self.queue.full():
+            _, dropped = self.queue.get_nowait()
+            self.nb_dropped += len(dropped)
+        self.queue.put_nowait((host_time, frames))
+
+    async def send_command(self, command, *args, **kwargs):
+        """ Send a command via serial link
+
+        The write is done in the default executor to not block the event loop
+
+        Parameters
+        ----------
+        command : str
+            data to send as a string
+
+        """
+        if self.serial.get_status():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: self.serial.write(command, *args, **kwargs))
+
+    async def start_read(self):
+        """ Start reading and saving data from Gateway device
+
+        The link is opened in the default executor, then the port is watched by the running
+        event loop until stop_read() is called
+
+        Returns
+        -------
+        bool
+            True if the link is opened
+
+        """
+        if self.is_reading:
+            return True
+
+        self.loop = asyncio.get_running_loop()
+        if not await self.loop.run_in_executor(None, self.serial.open_link):
+            return False
+
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.fd = self.serial.ser.fileno()
+        if self.closing is not None:
+            # The writer can not be opened again before its thread has stopped
+            await self.closing
+            self.closing = None
+        self.writer.open()
+        self.loop.add_reader(self.fd, self.__on_readable)
+        self.is_reading = True
+
+        return True
+
+    def stop_read(self):
+        """" Call this method to stop watching the serial port and close it
+
+        Call start_read() to start the reading again
+
+        """
+        if self.is_reading:
+            self.is_reading = False
+            self.loop.remove_reader(self.fd)
+            # Wake up the consumers of frames()
+            if self.queue.full():
+                _, dropped = self.queue.get_nowait()
+                self.nb_dropped += len(dropped)
+            self.queue.put_nowait(None)
+            # The frames left in memory are saved off the event loop
+            self.__close_writer()
+        self.serial.close_serial()
+
+    async def frames(self):
+        """ Iterate over the frames received until stop_read() is called
+
+        Yields
+        ------
+        frame: bytes
+            frame received, without its trailer
+
+        """
+        while self.is_reading or (self.queue is not None and not self.queue.empty()):
+            item = await self.queue.get()
+            if item is None:
+                break
+            _, frames = item
+            for frame in frames:
+                yield frame
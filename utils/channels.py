@@ -0,0 +1,308 @@
+"""
+Classes to store the history of the sensors' values
+
+Each channel is backed by a preallocated NumPy array so the memory used by a channel is
+bounded and known in advance. When a channel is full, the oldest values are dropped
+
+Values computed from other channels (eg. an altitude computed from a pressure) are not
+stored: a derived channel computes them with NumPy from its source channels when they are
+read
+
+"""
+
+import numpy as np
+
+
+# Number of samples kept by default in each channel
+# About 30 minutes of telemetry at 18 Hz
+DEFAULT_CAPACITY = 2**15
+
+
+class Channel:
+    """ Fixed capacity history of a single value
+
+    The values are stored in an array twice as long as the capacity. New values are
+    written at the cursor and the last `capacity` values are moved back to the beginning
+    of the array when the cursor reaches its end. This way the history is always
+    contiguous and can be returned as a view, without any copy
+
+    A Channel behaves like a list for reading: it supports len(), indexing and slicing.
+    Indexing and slicing return NumPy scalars and views
+
+    Parameters
+    ----------
+    capacity: int
+        maximum number of values kept
+    dtype: numpy dtype
+        (optional) type of the values
+
+    Examples
+    --------
+    >>> c = Channel(capacity=3)
+    >>> for i in range(5):
+    ...     c.append(i)
+    >>> c[:]
+    array([2., 3., 4.])
+    >>> c[-1]
+    4.0
+
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, dtype=np.float64):
+        self.capacity = capacity
+        self.dtype = dtype
+
+        self.buffer = np.zeros(2*self.capacity, dtype=self.dtype)
+        self.end = 0  # Write cursor
+        self.count = 0  # Number of values in the history
+        self.version = 0  # Incremented each time the history changes
+
+    def __compact(self):
+        """ Move the last values to the beginning of the buffer
+
+        """
+        self.buffer[:self.count] = self.buffer[self.end - self.count:self.end]
+        self.end = self.count
+
+    def append(self, value):
+        """ Add a value at the end of the history
+
+        Parameters
+        ----------
+        value: int or float or object
+            value to add
+
+        """
+        if self.end == len(self.buffer):
+            self.__compact()
+
+        self.buffer[self.end] = value
+        self.end += 1
+        self.version += 1
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, values):
+        """ Add many values at the end of the history
+
+        Parameters
+        ----------
+        values: array-like
+            values to add, ordered from oldest to newest
+
+        """
+        values = np.asarray(values)[-self.capacity:]
+        n = len(values)
+
+        if self.end + n > len(self.buffer):
+            self.count = min(self.count, self.capacity - n)
+            self.__compact()
+
+        self.buffer[self.end:self.end + n] = values
+        self.end += n
+        self.version += 1
+        self.count = min(self.count + n, self.capacity)
+
+    def clear(self):
+        """ Remove all the values
+
+        """
+        self.end = 0
+        self.count = 0
+        self.version += 1
+
+    def values(self):
+        """ Return the history as an array
+
+        Returns
+        -------
+        values: numpy array
+            view of the values, ordered from oldest to newest
+
+        """
+        return self.buffer[self.end - self.count:self.end]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.values()[index]
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.values(), dtype=dtype)
+
+
+class DerivedChannel:
+    """ History of a value computed from other channels
+
+    The values are computed with a vectorized function of the values of the source
+    channels, only when they are read. Indexing or slicing only computes the requested
+    values, so reading the last value or a time window of a long history stays cheap. The
+    whole history is cached until a source channel changes or invalidate() is called
+
+    A DerivedChannel behaves like a Channel for reading
+
+    Parameters
+    ----------
+    function: function
+        function of one NumPy array for each source, returning an array of the same length
+    sources: Channel
+        source channels, all of the same length. Derived channels can not be sources
+
+    Examples
+    --------
+    >>> pressure = Channel(capacity=1000)
+    >>> pressure_hpa = DerivedChannel(lambda p: p/100., pressure)
+    >>> pressure.append(101325.)
+    >>> pressure_hpa[-1]
+    1013.25
+
+    """
+
+    def __init__(self, function, *sources):
+        self.function = function
+        self.sources = sources
+
+        self.version = 0  # Incremented by invalidate()
+        self.cache = None
+        self.cache_key = None
+
+    def __key(self):
+        return (self.version, ) + tuple(source.version for source in self.sources)
+
+    def invalidate(self):
+        """ Force the values to be computed again, eg. after a parameter of the function changed
+
+        """
+        self.version += 1
+        self.cache = None
+
+    def clear(self):
+        """ Remove all the values of the source channels
+
+        """
+        for source in self.sources:
+            source.clear()
+
+    def values(self):
+        """ Return the history as an array
+
+        Returns
+        -------
+        values: numpy array
+            values computed from the whole history of the sources, from oldest to newest
+
+        """
+        key = self.__key()
+        if self.cache is None or self.cache_key != key:
+            self.cache = np.asarray(self.function(*[source.values() for source in self.sources]))
+            self.cache_key = key
+        return self.cache
+
+    def __len__(self):
+        return len(self.sources[0])
+
+    def __getitem__(self, index):
+        if self.cache is not None and self.cache_key == self.__key():
+            return self.cache[index]
+        if isinstance(index, slice):
+            return np.asarray(self.function(*[source[index] for source in self.sources]))
+        # 0-d arrays are converted to NumPy scalars, as returned by a Channel
+        return np.asarray(self.function(*[np.asarray(source[index]) for source in self.sources]))[()]
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.values(), dtype=dtype)
+
+
+class ChannelStore:
+    """ Set of channels with the same capacity
+
+    The store behaves like a dictionary {name: Channel}. The flags of the channels that
+    hold packed bitfields can also be read: they are computed from the packed values when
+    they are read and returned as an array
+
+    Parameters
+    ----------
+    names: list
+        names of the channels
+    capacity: int
+        (optional) maximum number of values kept in each channel
+    dtypes: dict
+        (optional) {name: numpy dtype} for the channels that do not hold floats
+    flags: dict
+        (optional) {flag name: (channel name, mask, shift)}
+
+    Examples
+    --------
+    >>> store = ChannelStore(['Time', 'Pressure'], capacity=1000)
+    >>> store['Pressure'].append(101325.)
+    >>> store['Pressure'][-1]
+    101325.0
+
+    """
+
+    def __init__(self, names, capacity=DEFAULT_CAPACITY, dtypes=None, flags=None):
+        self.capacity = capacity
+        self.flags = flags or {}
+        dtypes = dtypes or {}
+
+        self.channels = {
+            name: Channel(self.capacity, dtypes.get(name, np.float64)) for name in names}
+
+    def clear(self):
+        """ Remove all the values of all the channels
+
+        """
+        for channel in self.channels.values():
+            channel.clear()
+
+    def derive(self, name, function, *sources):
+        """ Add a channel computed from other channels of the store
+
+        Parameters
+        ----------
+        name: str
+            name of the new channel
+        function: function
+            vectorized function of the source channels, see DerivedChannel
+        sources: str
+            names of the source channels. They must not be derived channels
+
+        Returns
+        -------
+        channel: DerivedChannel
+            the new channel
+
+        """
+        self.channels[name] = DerivedChannel(function, *[self.channels[source] for source in sources])
+        return self.channels[name]
+
+    def __getitem__(self, name):
+        if name in self.flags and name not in self.channels:
+            channel, mask, shift = self.flags[name]
+            return (self.channels[channel].values() & mask) >> shift
+        return self.channels[name]
+
+    def __contains__(self, name):
+        return name in self.channels or name in self.flags
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def keys(self):
+        return self.channels.keys()
+
+    def values(self):
+        return self.channels.values()
+
+    def items(self):
+        return self.channels.items()
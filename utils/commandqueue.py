@@ -0,0 +1,161 @@
+"""
+Class to send commands through a link in a separate thread
+
+The commands are queued by the GUI and written by a writer thread, so that a slow link never
+stalls the GUI. Commands that supersede each other (eg. successive angles of the same servo)
+are coalesced, urgent commands are sent first and the output is limited to a byte rate
+
+"""
+
+import threading
+import time
+
+# Priorities of the commands, the lowest value is sent first
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+# Bytes per second written by default
+DEFAULT_RATE = 100
+# Bytes that can be written at once after the link has been idle
+DEFAULT_BURST = 16
+
+
+class CommandQueue:
+    """ Queue of commands written in a separate thread
+
+    The pending command with the highest priority is written first, commands with the same
+    priority are written in order. A command queued with the same `key` as a pending command
+    replaces it and keeps its place in the queue
+
+    The output is limited with a token bucket: `burst` bytes can be written at once, then
+    `rate` bytes per second
+
+    Parameters
+    ----------
+    write : function
+        function called by the writer thread with the command and the arguments given
+        to put()
+    rate : float
+        (optional) maximum number of bytes written per second
+    burst : int
+        (optional) maximum number of bytes written at once
+
+    Attributes
+    ----------
+    nb_coalesced : int
+        number of commands replaced by a newer one before being written
+    nb_written : int
+        number of commands written
+
+    Examples
+    --------
+    >>> commands = CommandQueue(serial.write)
+    >>> commands.put(bytes([0x26, 0x63, 0x6A, 90]), key=b'\x26\x63\x6A')
+    >>> commands.put(bytes([0x26, 0x63, 0x6A, 95]), key=b'\x26\x63\x6A')  # Replaces 90
+    >>> commands.put(bytes([0x26, 0x63, 0x61, 0x01]), priority=HIGH)  # Sent first
+
+    """
+
+    def __init__(self, write, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.write = write
+        self.rate = rate
+        self.burst = burst
+
+        self.condition = threading.Condition()
+        self.pending = []  # [[priority, order, key, (command, args, kwargs)], ]
+        self.keys = {}  # {key: entry of `pending`}
+        self.order = 0
+        self.tokens = burst
+        self.time = time.monotonic()
+        self.thread = None
+
+        self.nb_coalesced = 0
+        self.nb_written = 0
+
+    def put(self, command, *args, key=None, priority=NORMAL, **kwargs):
+        """ Queue a command, the writer thread is started if needed
+
+        Parameters
+        ----------
+        command : bytes or str
+            command given to `write`
+        key : hashable object
+            (optional) pending commands with the same key are replaced by this one
+        priority : int
+            (optional) HIGH, NORMAL or LOW
+        args, kwargs :
+            other arguments given to `write`
+
+        """
+        with self.condition:
+            entry = self.keys.get(key) if key is not None else None
+            if entry is not None:
+                # Replace the superseded command, without losing its place
+                entry[0] = min(entry[0], priority)
+                entry[3] = (command, args, kwargs)
+                self.nb_coalesced += 1
+            else:
+                entry = [priority, self.order, key, (command, args, kwargs)]
+                self.order += 1
+                self.pending.append(entry)
+                if key is not None:
+                    self.keys[key] = entry
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.__write_thread, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def clear(self):
+        """ Drop the pending commands
+
+        """
+        with self.condition:
+            self.pending = []
+            self.keys = {}
+
+    def __wait_tokens(self, size):
+        """ Wait until `size` bytes can be written, must be called with the condition held
+
+        """
+        # A command longer than the burst is written when the bucket is full
+        size = min(size, self.burst)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.time) * self.rate)
+            self.time = now
+            if self.tokens >= size:
+                return
+            self.condition.wait((size - self.tokens) / self.rate)
+
+    def __write_thread(self):
+        """ Write the pending commands until the queue is empty
+
+        """
+        while True:
+            with self.condition:
+                if not self.pending:
+                    # The thread is started again by the next put()
+                    self.thread = None
+                    return
+                entry = min(self.pending)
+                command, args, kwargs = entry[3]
+                self.__wait_tokens(len(command))
+
+                # A more urgent command may have been queued while waiting, or the queue
+                # may have been cleared
+                if not self.pending:
+                    continue
+                entry = min(self.pending)
+                command, args, kwargs = entry[3]
+                self.pending.remove(entry)
+                if entry[2] is not None:
+                    del self.keys[entry[2]]
+                self.tokens -= len(command)
+
+            try:
+                self.write(command, *args, **kwargs)
+                self.nb_written += 1
+            except Exception:
+                pass
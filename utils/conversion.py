@@ -0,0 +1,159 @@
+"""
+Class to describe the conversion of the raw values read from a frame
+
+A conversion is made of a bit mask, a shift, a scale, an offset and an optional polynomial
+applied in this order:
+    y = ((raw & mask) >> shift)*scale + offset
+    value = polynomial(y)
+
+The same conversion is used on single values and on NumPy arrays of values. Conversions of
+small integers can also be tabulated in a lookup table
+
+"""
+
+import numpy as np
+
+
+class Conversion:
+    """ Declarative conversion of a raw value
+
+    The conversion is compiled once into a Python function that only does the required
+    operations. Since this function only uses arithmetic operators, it also works on whole
+    NumPy arrays
+
+    Parameters
+    ----------
+    scale: float
+        (optional) factor applied to the raw value
+    offset: float
+        (optional) value added after the scale
+    mask: int
+        (optional) bit mask applied to the raw value before anything else
+    shift: int
+        (optional) right shift applied after the mask
+    polynomial: (float, )
+        (optional) coefficients of a polynomial applied at the end, highest degree first
+        (same order as numpy.polyval)
+
+    Attributes
+    ----------
+    function: function
+        compiled conversion, fast path for single values
+    is_identity: bool
+        True if the conversion returns the raw value unchanged
+    is_integer: bool
+        True if the conversion of an integer is an integer
+
+    Examples
+    --------
+    >>> c = Conversion(scale=1/2048.)  # Accelerometer in g
+    >>> c(1024)
+    0.5
+    >>> c.apply(np.array([1024, 2048]))
+    array([0.5, 1. ])
+    >>> Conversion(mask=0x06, shift=1)(0x04)  # Bits 1 and 2
+    2
+
+    """
+
+    # Lookup tables shared by all the conversions: {(expression, size, signed): numpy array}
+    lookup_tables = {}
+
+    def __init__(self, scale=1, offset=0, mask=None, shift=0, polynomial=None):
+        self.scale = scale
+        self.offset = offset
+        self.mask = mask
+        self.shift = shift
+        self.polynomial = tuple(polynomial) if polynomial else None
+
+        self.is_integer = self.scale == 1 and self.offset == 0 and self.polynomial is None
+        self.is_identity = self.is_integer and self.mask is None and not self.shift
+
+        self.function = eval('lambda x: {}'.format(self.expression('x')))
+
+    def expression(self, x):
+        """ Return the conversion as a Python expression
+
+        Parameters
+        ----------
+        x: str
+            expression of the raw value
+
+        Returns
+        -------
+        expression: str
+            Python expression of the converted value
+
+        """
+        expression = x
+        if self.mask is not None:
+            expression = '({} & {})'.format(expression, self.mask)
+        if self.shift:
+            expression = '({} >> {})'.format(expression, self.shift)
+        if self.scale != 1:
+            expression = '{}*{!r}'.format(expression, self.scale)
+        if self.offset:
+            expression = '({} + {!r})'.format(expression, self.offset)
+
+        if self.polynomial:
+            # Horner's method
+            y = expression
+            expression = repr(self.polynomial[0])
+            for coefficient in self.polynomial[1:]:
+                expression = '({}*{} + {!r})'.format(expression, y, coefficient)
+
+        return expression
+
+    def __call__(self, value):
+        return self.function(value)
+
+    def apply(self, values):
+        """ Convert a whole array of raw values
+
+        Parameters
+        ----------
+        values: array-like
+            raw values
+
+        Returns
+        -------
+        values: numpy array
+            converted values
+
+        """
+        return self.function(np.asarray(values))
+
+    def lookup_table(self, size, signed):
+        """ Return the conversion of every possible raw value of a small integer
+
+        The table is built once and shared by all the conversions with the same
+        expression. It is indexed by the raw value: negative values of signed integers
+        index the table from its end, as Python and NumPy do for negative indices
+
+        Parameters
+        ----------
+        size: int
+            size of the integer in bytes, 1 or 2
+        signed: bool
+            True if the integer is signed
+
+        Returns
+        -------
+        table: numpy array
+            array of 2**(8*size) converted values
+
+        """
+        key = (self.expression('x'), size, signed)
+
+        if key not in self.lookup_tables:
+            raw = np.arange(2**(8*size), dtype=np.int64)
+            if signed:
+                # Values above the maximum are the negative values, in the right order
+                raw[2**(8*size - 1):] -= 2**(8*size)
+            dtype = np.int64 if self.is_integer else np.float64
+            self.lookup_tables[key] = self.apply(raw).astype(dtype)
+
+        return self.lookup_tables[key]
+
+    def __repr__(self):
+        return "Conversion({})".format(self.expression('x'))
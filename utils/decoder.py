@@ -0,0 +1,390 @@
+"""
+Class to decode a whole telemetry frame at once
+
+The layout of the frame is compiled once from the `fields` dictionaries of the sensors into
+a few struct.Struct objects. A frame is then unpacked with one call per struct instead of
+one call per field
+
+The decoding of a single frame is generated as Python source code, with the conversions
+inlined. The generated code is saved in a cache directory and imported from there, so Python
+also caches its bytecode
+
+Many frames of the same length can also be decoded at once with a NumPy structured dtype
+built from the same layout
+
+"""
+
+import hashlib
+import importlib.util
+import os
+import struct
+from os.path import expanduser, join
+
+import numpy as np
+
+
+# Directory where the generated decoders are saved, in the cache directory of the user
+CACHE_DIRECTORY = join(
+    os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or join(expanduser('~'), '.cache'),
+    'ground-control', 'decoders')
+
+
+# struct format characters for each (type, size, signed) combination
+# Byte order is given separately as the first character of the struct format
+FORMAT_CHARACTERS = {
+    ('int', 1, False): 'B',
+    ('int', 1, True): 'b',
+    ('int', 2, False): 'H',
+    ('int', 2, True): 'h',
+    ('int', 4, False): 'I',
+    ('int', 4, True): 'i',
+    ('int', 8, False): 'Q',
+    ('int', 8, True): 'q',
+    ('float', 4, False): 'f',
+    ('float', 4, True): 'f',
+    ('float', 8, False): 'd',
+    ('float', 8, True): 'd',
+}
+
+
+class FrameDecoder:
+    """ Decode all the sensors of a frame with a few precompiled struct.Struct objects
+
+    Every field of every sample of every sensor is a "slot" in the frame. Identical slots
+    (eg. several flags read from the same byte) are unpacked only once. Slots are then
+    distributed between as few structs as possible: one struct can only hold slots that
+    share the same byte order and that do not overlap
+
+    Parameters
+    ----------
+    sensors: dict
+        dictionary {name: GenericSensor instance} of the sensors to decode. The position
+        of the sensors in the frame is given by their `start_position` attribute
+    cache_directory: path-like object
+        (optional) directory where the generated code is saved. The code is only compiled
+        in memory if it is None or if the directory can not be written
+
+    Attributes
+    ----------
+    size: int
+        minimum number of bytes a frame must have to be decoded
+    decode: function
+        decode(frame) unpacks and converts the values of all the sensors of a frame with
+        at least `size` bytes. It returns {sensor name: [[value of each field, ] for each
+        sample]}, fields are in the same order as in the sensor's `fields` dictionary
+    source: str
+        generated Python source code of decode()
+
+    Examples
+    --------
+    >>> decoder = FrameDecoder({'rtc': RTC(4), 'timer': Timer(8)})
+    >>> values = decoder.decode(frame)
+    >>> values['timer']  # One list of field values for each sample
+    [[12.5]]
+
+    """
+
+    def __init__(self, sensors, cache_directory=CACHE_DIRECTORY):
+        self.sensors = sensors
+
+        slots = {}  # {(offset, size, type, byte_order, signed): slot index}
+        layout = {}  # {sensor name: [[(slot index, lookup table, conversion function), ], ]}
+
+        for name, sensor in self.sensors.items():
+            layout[name] = []
+            for i in range(sensor.nb_samples):
+                sample_start = sensor.start_position + i*sensor.sample_size
+                sample = []
+                for field_name, field in sensor.fields.items():
+                    key = self.__slot_key(sample_start + field['start'], field)
+                    index = slots.setdefault(key, len(slots))
+                    # Tabulated fields are converted by indexing their table, without a call
+                    table = sensor.lookup_tables.get(field_name)
+                    if table is not None:
+                        table = memoryview(table)
+                    sample.append((index, table, sensor.converters[field_name]))
+                layout[name].append(sample)
+
+        self.slots = list(slots.keys())
+        self.structs, order = self.__compile(self.slots)
+        self.size = max([offset + size for offset, size, _, _, _ in slots])
+        self.slot_layout = layout  # Used by decode_batch()
+        self.dtypes = {}  # {frame length: numpy dtype}
+
+        # Position of each slot in the concatenation of the unpacked tuples
+        position = {slot: i for i, slot in enumerate(order)}
+        index_to_position = {index: position[key] for key, index in slots.items()}
+
+        self.layout = {
+            name: [[(index_to_position[index], table, convert) for index, table, convert in sample]
+                   for sample in samples]
+            for name, samples in layout.items()}
+
+        self.source, tables = self.__generate()
+        self.decode = self.__load(self.source, cache_directory)(tables)
+
+    def __generate(self):
+        """ Write the Python source code of decode()
+
+        The generated module has a single function build(tables) that returns the decode
+        function. The lookup tables can not be written in the code, they are given to
+        build() instead
+
+        Returns
+        -------
+        source: str
+            source code of the module
+        tables: [memoryview, ]
+            lookup tables used by the code
+
+        """
+        lines = [
+            '# Generated by utils.decoder.FrameDecoder, do not edit',
+            'import struct',
+            '',
+            '',
+            'def build(tables):',
+        ]
+
+        # Values are named after their position in the unpacked tuples
+        tables = []
+        values = []
+        for name, samples in self.layout.items():
+            expressions = []
+            for sample in samples:
+                sample_expressions = []
+                for (i, table, _), field in zip(sample, self.sensors[name].fields.values()):
+                    if table is not None:
+                        sample_expressions.append('t{}[v{}]'.format(len(tables), i))
+                        tables.append(table)
+                    else:
+                        sample_expressions.append(field['conversion'].expression('v{}'.format(i)))
+                expressions.append('[{}]'.format(', '.join(sample_expressions)))
+            values.append('            {!r}: [{}],'.format(name, ', '.join(expressions)))
+
+        for i, s in enumerate(self.structs):
+            lines.append('    unpack_{} = struct.Struct({!r}).unpack_from'.format(i, s.format))
+        if tables:
+            lines.append('    {}, = tables'.format(', '.join('t{}'.format(i) for i in range(len(tables)))))
+
+        lines += ['', '    def decode(frame):']
+        position = 0
+        for i, s in enumerate(self.structs):
+            names = ['v{}'.format(position + j) for j in range(len(s.unpack_from(bytes(s.size))))]
+            position += len(names)
+            lines.append('        {}, = unpack_{}(frame)'.format(', '.join(names), i))
+
+        lines += ['        return {'] + values + ['        }', '', '    return decode', '']
+
+        return '\n'.join(lines), tables
+
+    @staticmethod
+    def __load(source, cache_directory):
+        """ Save the generated code in the cache directory and import it
+
+        Parameters
+        ----------
+        source: str
+            source code of the module
+        cache_directory: path-like object
+            directory of the generated modules, or None
+
+        Returns
+        -------
+        build: function
+            build() function of the module
+
+        """
+        # Identical layouts share the same module
+        name = 'decoder_{}'.format(hashlib.sha1(source.encode('utf-8')).hexdigest()[:16])
+
+        if cache_directory is not None:
+            path = join(cache_directory, name + '.py')
+            try:
+                if FrameDecoder.__read_source(path) != source:
+                    os.makedirs(cache_directory, exist_ok=True)
+                    # Write then rename so that another process never imports a half
+                    # written module
+                    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+                    with open(temporary_path, 'w') as file:
+                        file.write(source)
+                    os.replace(temporary_path, path)
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                return module.build
+            except Exception:
+                # The module is compiled in memory instead
+                pass
+
+        namespace = {}
+        exec(compile(source, '<{}>'.format(name), 'exec'), namespace)
+        return namespace['build']
+
+    @staticmethod
+    def __read_source(path):
+        """ Return the content of a generated module, None if it cannot be read
+
+        """
+        try:
+            with open(path) as file:
+                return file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    @staticmethod
+    def __slot_key(offset, field):
+        """ Build a hashable description of the bytes read for a field
+
+        The byte order of single byte fields is irrelevant so it is normalized to allow
+        them to share a slot with fields declared with the other byte order
+
+        """
+        size = field['size']
+        byte_order = field['byte_order'] if size > 1 else None
+        # Bitfields are read as integers
+        field_type = 'int' if field['type'] == 'bitfield' else field['type']
+        signed = field['signed'] if field_type == 'int' else True
+
+        if (field_type, size, signed) not in FORMAT_CHARACTERS:
+            raise ValueError("Unsupported field: {} of {} bytes".format(field['type'], size))
+
+        return (offset, size, field_type, byte_order, signed)
+
+    @staticmethod
+    def __compile(slots):
+        """ Distribute the slots between struct.Struct objects
+
+        Parameters
+        ----------
+        slots: list
+            list of slot keys
+
+        Returns
+        -------
+        structs: [struct.Struct, ]
+            structs to unpack one after the other
+        order: list
+            slot keys in the order they are returned by the structs
+
+        """
+        groups = []  # [[byte_order, end of the last slot, [slot keys, ]], ]
+
+        for slot in sorted(slots):
+            offset, size, _, byte_order, _ = slot
+            for group in groups:
+                if group[1] <= offset and (byte_order is None or group[0] in (None, byte_order)):
+                    break
+            else:
+                group = [byte_order, 0, []]
+                groups.append(group)
+            if group[0] is None:
+                group[0] = byte_order
+            group[1] = offset + size
+            group[2].append(slot)
+
+        structs = []
+        order = []
+        for byte_order, _, group_slots in groups:
+            fmt = '<' if byte_order == 'little' else '>'
+            position = 0
+            for offset, size, field_type, _, signed in group_slots:
+                if offset > position:
+                    fmt += '{}x'.format(offset - position)
+                fmt += FORMAT_CHARACTERS[(field_type, size, signed)]
+                position = offset + size
+            structs.append(struct.Struct(fmt))
+            order += group_slots
+
+        return structs, order
+
+    def get_dtype(self, length):
+        """ Return the NumPy structured dtype describing a frame
+
+        Each slot is a field of the dtype named after its index. Slots may overlap
+
+        Parameters
+        ----------
+        length: int
+            length of the frames in bytes
+
+        Returns
+        -------
+        dtype: numpy.dtype
+            structured dtype with an item size of `length`
+
+        """
+        if length not in self.dtypes:
+            formats = []
+            for _, size, field_type, byte_order, signed in self.slots:
+                if size == 1:
+                    order = '|'
+                elif byte_order == 'little':
+                    order = '<'
+                else:
+                    order = '>'
+                if field_type == 'float':
+                    kind = 'f'
+                elif signed:
+                    kind = 'i'
+                else:
+                    kind = 'u'
+                formats.append('{}{}{}'.format(order, kind, size))
+
+            self.dtypes[length] = np.dtype({
+                'names': ['s{}'.format(i) for i in range(len(self.slots))],
+                'formats': formats,
+                'offsets': [offset for offset, _, _, _, _ in self.slots],
+                'itemsize': length,
+            })
+
+        return self.dtypes[length]
+
+    def decode_batch(self, frames):
+        """ Unpack and convert the values of all the sensors for many frames at once
+
+        The frames are stacked in a single buffer that is viewed as an array of the
+        structured dtype returned by get_dtype(). The conversion functions are applied on
+        whole columns
+
+        Parameters
+        ----------
+        frames: [bytearray, ]
+            telemetry frames. All frames must have the same length, at least `size` bytes
+
+        Returns
+        -------
+        values: dict
+            {sensor name: {field name: numpy array}}. Samples are ordered from oldest to
+            newest, so arrays have `len(frames)*nb_samples` elements
+
+        """
+        if not frames:
+            return {name: {field: np.array([]) for field in sensor.fields.keys()}
+                    for name, sensor in self.sensors.items()}
+
+        length = len(frames[0])
+        table = np.frombuffer(b''.join(frames), dtype=self.get_dtype(length))
+
+        # Ints are widened to int64 so that the conversion functions cannot overflow
+        columns = []
+        for i, (_, _, field_type, _, _) in enumerate(self.slots):
+            column = table['s{}'.format(i)]
+            columns.append(column.astype(np.float64 if field_type == 'float' else np.int64))
+
+        values = {}
+        for name, sensor in self.sensors.items():
+            # Tabulated fields are converted by indexing their lookup table
+            converters = [
+                sensor.lookup_tables[field].__getitem__ if field in sensor.lookup_tables
+                else sensor.fields[field]['conversion'].function
+                for field in sensor.fields.keys()]
+            samples = [[converters[j](columns[i]) for j, (i, _, _) in enumerate(sample)]
+                       for sample in self.slot_layout[name]]
+            values[name] = {}
+            for j, field in enumerate(sensor.fields.keys()):
+                # Interleave the samples of each frame
+                values[name][field] = np.stack(
+                    [sample[j] for sample in samples], axis=1).ravel()
+
+        return values
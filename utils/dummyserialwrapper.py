@@ -40,6 +40,15 @@ class DummySerialWrapper:
     def write(self, data):
         return True
 
+    def start_reader(self):
+        pass
+
+    def stop_reader(self):
+        pass
+
+    def read_frames(self, timeout=None):
+        return [(time.monotonic(), self.readlines())]
+
     def readline(self):
         # Frame number
         frame = b'\x01'
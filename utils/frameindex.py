@@ -0,0 +1,226 @@
+"""
+Sidecar index of the frames of a log file
+
+A log file written by a Gateway is a stream of frames separated by b'\r\n': finding the
+frames around a given time means scanning the file from the beginning. The Gateway also
+writes an index next to the log, with a fixed-width record for each frame. Tools can then
+map the index and find a time with a binary search
+
+The index starts with `MAGIC`, followed by records of the `RECORD_DTYPE` NumPy dtype:
+    offset: position of the frame in the log file
+    length: length of the frame in bytes, without its trailer
+    frame_id: first byte of the frame, -1 if the vehicle does not send frame IDs
+    obc_time: RTC of the frame in seconds since midnight, NaN if there is none
+    host_time: time.time() when the frame was received, NaN if not known
+
+The index of an existing log is rebuilt by build_index() in a single pass on the file
+
+"""
+
+import mmap
+import os
+from os.path import splitext
+
+import numpy as np
+
+from utils.framing import Framer
+
+# First bytes of an index file
+MAGIC = b'GCFIDX01'
+
+# Layout of a record of the index, little endian without padding
+RECORD_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('length', '<u2'),
+    ('frame_id', '<i2'),
+    ('obc_time', '<f8'),
+    ('host_time', '<f8'),
+])
+
+# Number of bytes of the log file indexed at once by build_index()
+CHUNK_SIZE = 2**20
+
+
+def get_index_path(log_path):
+    """ Return the path of the index of a log file
+
+    Parameters
+    ----------
+    log_path: path-like object
+        path to the log file
+
+    Returns
+    -------
+    index_path: str
+        same path with the extension .idx
+
+    """
+    return splitext(log_path)[0] + '.idx'
+
+
+def build_records(frames, offset, vehicle, host_time=np.nan, trailer_size=2):
+    """ Create the records of frames written one after the other in a log file
+
+    Parameters
+    ----------
+    frames: [bytes-like object, ]
+        frames written, without their trailer
+    offset: int
+        position in the log file of the first frame
+    vehicle: Vehicle instance
+        vehicle that sent the frames, reads their RTC
+    host_time: float
+        (optional) time.time() when the frames were received
+    trailer_size: int
+        (optional) number of bytes written after each frame
+
+    Returns
+    -------
+    records: numpy array
+        record of each frame, of dtype `RECORD_DTYPE`
+
+    """
+    records = np.zeros(len(frames), dtype=RECORD_DTYPE)
+    if not frames:
+        return records
+
+    lengths = np.array([len(frame) for frame in frames])
+    records['length'] = lengths
+    records['offset'] = offset + np.concatenate(([0], np.cumsum(lengths + trailer_size)[:-1]))
+    if vehicle.schema.has_frame_id:
+        records['frame_id'] = [frame[0] for frame in frames]
+    else:
+        records['frame_id'] = -1
+    obc_times = vehicle.get_frame_times(frames)
+    records['obc_time'] = np.nan if obc_times is None else obc_times
+    records['host_time'] = host_time
+
+    return records
+
+
+def append_records(index_path, records):
+    """ Append records at the end of an index, the index is created if needed
+
+    Parameters
+    ----------
+    index_path: path-like object
+        path to the index
+    records: numpy array
+        records of dtype `RECORD_DTYPE`
+
+    """
+    with open(index_path, 'ab') as file:
+        if file.tell() == 0:
+            file.write(MAGIC)
+        file.write(records.tobytes())
+
+
+def read_index(index_path):
+    """ Map an index in memory
+
+    Parameters
+    ----------
+    index_path: path-like object
+        path to the index
+
+    Returns
+    -------
+    records: numpy array
+        read-only records of the index, of dtype `RECORD_DTYPE`. A record being written
+        at the end of the file is ignored
+
+    """
+    with open(index_path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{}: not a frame index".format(index_path))
+        size = os.fstat(file.fileno()).st_size
+
+    count = (size - len(MAGIC)) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(index_path, dtype=RECORD_DTYPE, mode='r', offset=len(MAGIC), shape=(count,))
+
+
+def find_time(records, seconds, field='host_time'):
+    """ Find the first frame at or after a time with a binary search
+
+    Parameters
+    ----------
+    records: numpy array
+        records of an index
+    seconds: float
+        time to look for
+    field: str
+        (optional) 'host_time', or 'obc_time' if the RTC does not wrap at midnight in
+        the log
+
+    Returns
+    -------
+    index: int
+        index of the first record at or after `seconds`, len(records) if there is none
+
+    """
+    return int(np.searchsorted(records[field], seconds, side='left'))
+
+
+def build_index(log_path, vehicle, index_path=None, chunk_size=CHUNK_SIZE):
+    """ Index an existing log file in a single pass
+
+    The log file is memory-mapped and scanned with a Framer chunk by chunk. The reception
+    time of the frames is not known, it is set to NaN
+
+    Parameters
+    ----------
+    log_path: path-like object
+        path to the log file
+    vehicle: Vehicle instance
+        vehicle that sent the frames, gives the schema and reads the RTC of the frames
+    index_path: path-like object
+        (optional) path to the index, replaced if it exists. Default is next to the log
+    chunk_size: int
+        (optional) number of bytes of the log file indexed at once
+
+    Returns
+    -------
+    count: int
+        number of frames indexed
+
+    """
+    if index_path is None:
+        index_path = get_index_path(log_path)
+
+    framer = Framer.from_schema(vehicle.schema)
+    longest = max(max(l) for l in framer.lengths.values())
+    chunk_size = max(chunk_size, 2 * (longest + len(framer.trailer)))
+
+    count = 0
+    with open(log_path, 'rb') as log, open(index_path, 'wb') as index:
+        index.write(MAGIC)
+        size = os.fstat(log.fileno()).st_size
+        if size == 0:
+            return 0
+
+        with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while position < size:
+                end = min(position + chunk_size, size)
+                spans, _, next_position = framer.scan(data, position, end)
+
+                records = np.zeros(len(spans), dtype=RECORD_DTYPE)
+                if spans:
+                    frames = [data[start:stop] for start, stop in spans]
+                    records['offset'] = [start for start, _ in spans]
+                    records['length'] = [stop - start for start, stop in spans]
+                    records['frame_id'] = ([frame[0] for frame in frames]
+                                           if vehicle.schema.has_frame_id else -1)
+                    obc_times = vehicle.get_frame_times(frames)
+                    records['obc_time'] = np.nan if obc_times is None else obc_times
+                    records['host_time'] = np.nan
+                    index.write(records.tobytes())
+                    count += len(spans)
+
+                if end == size:
+                    break
+                position = next_position
+
+    return count
@@ -0,0 +1,311 @@
+"""
+Class to split a binary byte stream into frames
+
+Frames are sent as raw binary followed by b'\r\n'. Since the payload is binary, it can
+also contain b'\r\n' (eg. in a float or a counter): splitting the stream on b'\r\n' breaks
+these frames in pieces that are then dropped
+
+The Framer uses the known length of each type of frame instead: a frame is only accepted
+if it starts with a known frame ID and the trailer is found right after the expected
+number of bytes. When no frame matches, the stream is resynchronized on the next trailer
+
+The bytes are received directly in a preallocated buffer of the Framer and the frames are
+memoryview slices of this buffer: no copy is made between the serial port and the
+consumers of the frames
+
+"""
+
+# Size of the receive buffer by default
+DEFAULT_BUFFER_SIZE = 2**16
+
+
+class Framer:
+    """ Split a byte stream into frames of known lengths
+
+    The stream is read from a frame boundary. At a boundary, the first byte is the frame
+    ID and each length known for this ID is tested, shortest first: the frame is accepted
+    if the trailer follows it. Otherwise the bytes up to the next trailer are discarded and
+    the next boundary is right after it. Each byte is read at most a few times, so the
+    stream is resynchronized in O(bytes) after a corruption
+
+    The received bytes are written in a buffer at the end of the bytes not framed yet,
+    either by feed() or directly with reserve() and commit(). The bytes not framed yet are
+    only moved back to the beginning of the buffer when there is not enough space left at
+    its end. The frames and discarded segments are memoryview slices of the buffer, they are
+    only valid until the next call to feed() or reserve(): copy them to keep them longer
+
+    With `keep_frames`, the bytes returned are never overwritten: when the buffer is full,
+    the bytes not framed yet are moved to a new buffer instead. The frames then stay valid
+    as long as they are referenced, eg. to hand them over to another thread without copies
+
+    Parameters
+    ----------
+    lengths: dict
+        {frame ID: [lengths of the frames in bytes, ]}. The frame ID is the first byte
+        of the frame, use None as the only key if the frames have no ID
+    trailer: bytes
+        (optional) bytes sent after each frame
+    buffer_size: int
+        (optional) initial size of the receive buffer in bytes. The buffer grows if needed
+    keep_frames: bool
+        (optional) True to never overwrite the frames returned
+
+    Attributes
+    ----------
+    nb_frames: int
+        number of frames found
+    nb_recovered: int
+        number of frames found that contain the trailer in their payload. These frames
+        are lost when the stream is split on the trailer
+    nb_lost: int
+        number of non empty segments of the stream that are not a frame
+    nb_discarded_bytes: int
+        number of bytes discarded, trailers included
+    discarded: [memoryview, ]
+        segments discarded by the last call to frames(), without their trailer. A segment
+        received over several calls is returned in several parts
+    is_resynchronizing: bool
+        True while the bytes are discarded up to the next trailer. The bytes received next
+        are not at a frame boundary
+
+    Examples
+    --------
+    >>> framer = Framer({0x01: [4]})
+    >>> [bytes(f) for f in framer.feed(b'\x01\r\n\x00\r\n\x01ab')]
+    [b'\x01\r\n\x00']
+    >>> [bytes(f) for f in framer.feed(b'c\r\n')]
+    [b'\x01abc']
+
+    >>> view = framer.reserve(2048)  # Receive directly in the buffer
+    >>> framer.commit(ser.readinto(view))
+    >>> frames = framer.frames()
+
+    """
+
+    def __init__(self, lengths, trailer=b'\r\n', buffer_size=DEFAULT_BUFFER_SIZE,
+                 keep_frames=False):
+        self.lengths = {frame_id: sorted(set(l)) for frame_id, l in lengths.items()}
+        self.trailer = bytes(trailer)
+        self.has_frame_id = None not in self.lengths
+        self.keep_frames = keep_frames
+
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not framed yet
+        self.end = 0  # End of the received bytes
+        self.discarded = []
+        self.is_resynchronizing = False
+        self.segment_size = 0  # Bytes of the segment being discarded, in previous calls
+        self.reset_statistics()
+
+    @classmethod
+    def from_schema(cls, schema, trailer=b'\r\n', buffer_size=DEFAULT_BUFFER_SIZE):
+        """ Create a Framer for the frames described by a schema
+
+        Parameters
+        ----------
+        schema: VehicleSchema instance
+            layout of the frames of the vehicle
+        trailer: bytes
+            (optional) bytes sent after each frame
+        buffer_size: int
+            (optional) initial size of the receive buffer in bytes
+
+        Returns
+        -------
+        framer: Framer instance
+            framer for the frames of the vehicle
+
+        """
+        lengths = {}
+        for frame_id, length in schema.frames.keys():
+            lengths.setdefault(frame_id, []).append(length)
+        return cls(lengths, trailer, buffer_size)
+
+    def reset_statistics(self):
+        """ Set all the counters to 0
+
+        """
+        self.nb_frames = 0
+        self.nb_recovered = 0
+        self.nb_lost = 0
+        self.nb_discarded_bytes = 0
+
+    def clear(self):
+        """ Drop the incomplete data kept for the next frames
+
+        With `keep_frames`, the next bytes are received in a new buffer: the frames returned
+        stay valid
+
+        """
+        if self.keep_frames and self.end > 0:
+            self.buffer = bytearray(len(self.buffer))
+            self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.is_resynchronizing = False
+        self.segment_size = 0
+
+    def reserve(self, size):
+        """ Return the free space of the buffer after the bytes received
+
+        The frames previously returned are invalidated, unless `keep_frames` is True
+
+        Parameters
+        ----------
+        size: int
+            minimum number of bytes
+
+        Returns
+        -------
+        view: memoryview
+            writable view of at least `size` bytes. Call commit() with the number of
+            bytes written in it
+        """
+        if self.end + size > len(self.buffer):
+            pending = self.end - self.start
+            if pending + size > len(self.buffer) or self.keep_frames:
+                # A new buffer is allocated: the memoryviews exported prevent resizing, and
+                # the frames returned stay in the previous one
+                buffer_size = len(self.buffer)
+                if pending + size > buffer_size:
+                    buffer_size = max(2*buffer_size, pending + size)
+                buffer = bytearray(buffer_size)
+                buffer[:pending] = self.view[self.start:self.end]
+                self.buffer = buffer
+                self.view = memoryview(self.buffer)
+            else:
+                self.view[:pending] = self.buffer[self.start:self.end]
+            self.start = 0
+            self.end = pending
+
+        return self.view[self.end:]
+
+    def commit(self, size):
+        """ Add the bytes written in the view returned by reserve() to the stream
+
+        Parameters
+        ----------
+        size: int
+            number of bytes written
+
+        """
+        self.end += size
+
+    def feed(self, data):
+        """ Add bytes to the stream and return the frames completed
+
+        Incomplete frames are kept for the next call
+
+        Parameters
+        ----------
+        data: bytes-like object
+            bytes received
+
+        Returns
+        -------
+        frames: [memoryview, ]
+            frames found, without their trailer
+        """
+        size = len(data)
+        self.reserve(size)[:size] = data
+        self.commit(size)
+
+        return self.frames()
+
+    def frames(self):
+        """ Return the frames completed by the bytes received
+
+        Returns
+        -------
+        frames: [memoryview, ]
+            frames found, without their trailer
+        """
+        view = self.view
+        spans, discarded, self.start = self.scan(self.buffer, self.start, self.end)
+        self.discarded = [view[start:stop] for start, stop in discarded]
+
+        return [view[start:stop] for start, stop in spans]
+
+    def scan(self, buffer, position, end):
+        """ Find the frames in a part of a buffer, without copying it
+
+        Used by frames() on the receive buffer, it can also index any buffer with find()
+        and item access, eg. a memory-mapped file. The counters are updated. A segment that
+        is not a frame can end in a later call: the calls must scan the same stream in order
+
+        Parameters
+        ----------
+        buffer: bytearray or mmap
+            bytes of the stream
+        position: int
+            first byte to scan, at a boundary between frames unless `is_resynchronizing`
+        end: int
+            end of the bytes to scan
+
+        Returns
+        -------
+        spans: [(int, int), ]
+            start and end of the frames found, without their trailer
+        discarded: [(int, int), ]
+            start and end of the non empty segments that are not a frame, without trailer
+        position: int
+            first byte not framed yet, the scan continues from there when more bytes
+            are available
+        """
+        trailer = self.trailer
+        size = len(trailer)
+
+        spans = []
+        discarded = []
+
+        while position < end:
+            if not self.is_resynchronizing:
+                if self.has_frame_id:
+                    lengths = self.lengths.get(buffer[position], ())
+                else:
+                    lengths = self.lengths[None]
+
+                incomplete = False
+                for length in lengths:
+                    stop = position + length
+                    if stop + size > end:
+                        # Wait for more data before giving up on this length and the next ones
+                        incomplete = True
+                        break
+                    if buffer.find(trailer, stop, stop + size) == stop:
+                        if buffer.find(trailer, position, stop) >= 0:
+                            self.nb_recovered += 1
+                        spans.append((position, stop))
+                        position = stop + size
+                        break
+                else:
+                    # Not a frame: resynchronize after the next trailer
+                    self.is_resynchronizing = True
+
+                if incomplete:
+                    break
+                if not self.is_resynchronizing:
+                    continue
+
+            index = buffer.find(trailer, position, end)
+            # Without a trailer, only keep the last bytes since they can be the beginning of
+            # the trailer. The segment goes on in the next bytes
+            stop = index if index >= 0 else max(position, end - size + 1)
+            if stop > position:
+                discarded.append((position, stop))
+                if self.segment_size == 0:
+                    self.nb_lost += 1
+                self.segment_size += stop - position
+            if index < 0:
+                self.nb_discarded_bytes += stop - position
+                position = stop
+                break
+            self.nb_discarded_bytes += index + size - position
+            position = index + size
+            self.is_resynchronizing = False
+            self.segment_size = 0
+
+        self.nb_frames += len(spans)
+
+        return spans, discarded, position
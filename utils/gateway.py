@@ -5,16 +5,37 @@ Class to read data from a Gateway device and save it on storage
 
 import datetime
 import threading
+import time
 from os import mkdir
 from os.path import isdir, join
 
+from utils.commandqueue import DEFAULT_RATE, NORMAL, CommandQueue
+from utils.frameindex import get_index_path
+from utils.framing import Framer
+from utils.latency import LatencyTracker
+from utils.logwriter import DEFAULT_FLUSH_FRAMES, DEFAULT_FLUSH_INTERVAL, LogWriter
+
+# First delay in seconds before trying to reopen a lost link, doubled after each failure
+RECONNECT_DELAY = 0.1
+# Maximum delay in seconds between two tries to reopen a lost link
+RECONNECT_MAX_DELAY = 5
+# Maximum time in seconds start_read() waits for the previous reading thread to end
+READER_JOIN_TIMEOUT = 1
+
 
 class Gateway:
     """ Class to read data received from a Gateway device
 
     The Gateway device is connected to the computer via a serial connection
 
-    The data read from the Gateway as bytes is saved in a file
+    The data read from the Gateway as bytes is saved in a file by a LogWriter, in a separate
+    thread. The file is flushed to disk every `flush_interval` seconds, every `flush_frames`
+    frames and when the link is lost. The frames are also saved with their reception time in
+    a session file, see utils.session
+
+    When the link is lost while reading, the Gateway waits for the device to be plugged
+    again and reopens it with an exponential backoff. The frames are still saved in the
+    same file and the gap is recorded in a second file, see `gaps`
 
     Parameters
     ----------
@@ -24,11 +45,32 @@ class Gateway:
         Sensors instance used to process the received data
     path : path-like object
         path to the directory to store received data
+    command_rate : float
+        (optional) maximum number of bytes per second of the commands sent
+    flush_interval : float
+        (optional) maximum time in seconds between the reception of a frame and its
+        flush to disk
+    flush_frames : int
+        (optional) maximum number of frames received and not flushed to disk
+    record_session : bool
+        (optional) False to not save the frames in a session file. The session file is
+        synced to disk when the link is lost and at the end, see LogWriter
 
     Attributes
     ----------
     is_reading : bool
         True if the instance is currently reading data from serial link
+    writer : LogWriter instance
+        writer of the log file and its index, see get_write_lag()
+    commands : CommandQueue instance
+        commands waiting to be written by send_command()
+    latency : LatencyTracker instance
+        round-trip latency of the commands, from their writing to the first frame received
+        that reflects them
+    gaps : [dict, ]
+        {'start': ISO date, 'seconds': duration, 'partial_bytes': bytes of the incomplete
+        frame dropped when the link was lost} for each loss of the link. The frames the
+        device sent during the gap are not known. Also saved in the file at `gaps_path`
 
     Examples
     --------
@@ -42,14 +84,26 @@ class Gateway:
 
     """
 
-    def __init__(self, serial, sensors, path):
+    def __init__(self, serial, sensors, path, command_rate=DEFAULT_RATE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, flush_frames=DEFAULT_FLUSH_FRAMES,
+                 record_session=True):
         self.serial = serial
         self.sensors = sensors
         self.path = path
         # This is the same as the serial for consistency
         self.name = self.serial.name
+        # Frames are binary, they are found from the lengths given by the schema of the vehicle
+        self.serial.framer = Framer.from_schema(self.sensors.schema)
 
         self.is_reading = False
+        self.commands = CommandQueue(self.__write_command, rate=command_rate)
+        self.latency = LatencyTracker(self.sensors)
+        self.stopped = threading.Event()
+        self.thread = None  # Reading thread started by start_read()
+        self.is_reconnecting = False
+        self.flush_interval = flush_interval
+        self.flush_frames = flush_frames
+        self.record_session = record_session
 
         # Create the folder to store the files if it does not already exist
         if not isdir(self.path):
@@ -64,57 +118,194 @@ class Gateway:
             self.date_created.replace(":", "-"),
             self.name)
         self.log_path = join(self.path, self.log_file)
+        self.index_path = get_index_path(self.log_path)
+        self.gaps_path = join(self.path, "{}_{}_gaps.csv".format(
+            self.date_created.replace(":", "-"),
+            self.name))
+        # None when no session file is recorded
+        self.session_path = None
+        if self.record_session:
+            self.session_path = join(self.path, "{}_{}.session".format(
+                self.date_created.replace(":", "-"),
+                self.name))
+        self.gaps = []
+        # The reading thread switches to the new writer
+        self.writer = LogWriter(self.log_path, self.index_path, self.sensors,
+                                flush_interval=self.flush_interval,
+                                flush_frames=self.flush_frames,
+                                session_path=self.session_path, name=self.name)
 
-
-    def __write_frame(self, frame):
-        """ Append a line in the file located at `self.log_path`
+    def __write_gap(self, gap):
+        """ Append a gap in the file located at `self.gaps_path`
 
         Parameters
         ----------
-        frame: bytearray()
-            frame to write in the file
+        gap: dict
+            gap to write in the file, see `gaps`
+
+        """
+        with open(self.gaps_path, 'a') as file:
+            if file.tell() == 0:
+                file.write("start,seconds,partial_bytes\n")
+            file.write("{start},{seconds:.3f},{partial_bytes}\n".format(**gap))
+
+    def __reconnect(self):
+        """ Reopen the link after it has been lost
+
+        Wait for the device to be listed by the system again before opening it, the delay
+        between two tries is doubled after each failure. Return when the link is opened or
+        when stop_read() is called
+
+        """
+        start = datetime.datetime.now()
+        start_time = time.monotonic()
+        # The reader thread of the serial has stopped on the error
+        self.serial.stop_reader()
+        # The incomplete frame in the buffer is lost, the bytes received once the link is
+        # reopened must not be appended to it
+        framer = self.serial.framer
+        nb_bytes = 0
+        if framer is not None:
+            nb_bytes = framer.end - framer.start
+            framer.clear()
+        print("{} : link lost, waiting for the device".format(self.name))
+        # The frames received before the loss are saved on disk without waiting
+        self.writer.flush()
+
+        self.is_reconnecting = True
+        delay = RECONNECT_DELAY
+        while not self.stopped.wait(delay):
+            if self.serial.is_device_present() and self.serial.open_link():
+                break
+            delay = min(2 * delay, RECONNECT_MAX_DELAY)
+        else:
+            self.is_reconnecting = False
+            return
+        self.is_reconnecting = False
+
+        gap = {
+            'start': start.isoformat(),
+            'seconds': time.monotonic() - start_time,
+            'partial_bytes': nb_bytes,
+        }
+        self.gaps.append(gap)
+        self.__write_gap(gap)
+        print("{} : link reopened after {:.1f} s".format(self.name, gap['seconds']))
+
+        self.serial.start_reader()
+
+    def __write_command(self, command, *args, **kwargs):
+        """ Write a command queued by send_command(), called by the writer thread
 
         """
-        with open(self.log_path, 'ab+') as file:
-            file.write(frame + b'\r\n')
+        if self.serial.get_status():
+            self.serial.write(command, *args, **kwargs)
+            self.latency.sent(command)
+
+    def get_write_lag(self):
+        """ Return the time in seconds since the oldest frame not saved on disk was received
 
-    def send_command(self, command, *args, **kwargs):
+        """
+        return self.writer.get_lag()
+
+    def send_command(self, command, *args, key=None, priority=NORMAL, **kwargs):
         """ Send a command via serial link
 
+        The command is queued and written by a separate thread, this does not block
+
         Parameters
         ----------
         command : str
             data to send as a string
+        key : hashable object
+            (optional) a pending command with the same key is replaced by this one, eg. to
+            only send the last angle of a servo
+        priority : int
+            (optional) HIGH, NORMAL or LOW from utils.commandqueue
 
         """
         if self.serial.get_status():
-            self.serial.write(command, *args, **kwargs)
+            self.commands.put(command, *args, key=key, priority=priority, **kwargs)
+
+    def get_state(self):
+        """ Return the state of the link, cheap enough to be polled by the widgets
+
+        Returns
+        -------
+        state : str
+            "CLOSED", "SEARCHING", "TESTING", "OPEN", "RECONNECTING" or "FAILED"
+        ports : [str, ]
+            ports being tested, when the state is "TESTING"
+
+        """
+        if self.is_reconnecting:
+            return "RECONNECTING", []
+        state = getattr(self.serial, 'state', None)
+        if state is None:
+            return ("OPEN" if self.serial.get_status() else "CLOSED"), []
+        return state, sorted(self.serial.testing)
 
     def start_read(self):
         """ Start reading and saving data from Gateway device
 
-        Does not stop until stop_read() is called
+        The link is opened in the reading thread: this returns immediately, follow the
+        opening with get_state()
+
+        Does not stop until stop_read() is called. Does nothing if the reading is already
+        started, even if the link is being opened or reopened, or if the reading thread
+        stopped by stop_read() does not end within READER_JOIN_TIMEOUT
 
         """
+        if self.is_reading:
+            return
+        if self.thread is not None and self.thread.is_alive():
+            # The previous reading thread can be searching the device: two searches must not
+            # open the same link
+            self.thread.join(READER_JOIN_TIMEOUT)
+            if self.thread.is_alive():
+                print("{} : previous reading not ended yet".format(self.name))
+                return
+
         def read_tread():
+            # The search for the device can take seconds, it is not done in the GUI thread
+            if self.serial.open_link(stop=self.stopped):
+                if not self.is_reading:
+                    # stop_read() was called during the search
+                    self.serial.close_serial()
+                    return
+                self.serial.start_reader()
+            writer = self.writer
+            writer.open()
             while self.is_reading:
-                if self.serial.failed:
-                    self.is_reading = False
-                else:
-                    lines = self.serial.readlines()
-                    for line in lines:
-                        self.__write_frame(line)
-                        try:
-                            self.sensors.update_sensors(line)
-                        except:
-                            pass
-
-        self.serial.open_link()
+                if writer is not self.writer:
+                    # reset() was called, the next frames are saved in new files
+                    writer.close()
+                    writer = self.writer
+                    writer.open()
+                # The frames are read by the reader thread of the serial, this waits for them
+                reads = self.serial.read_frames(timeout=0.1)
+                if not reads and self.serial.failed:
+                    if self.serial.is_device_found:
+                        # The reader thread of the serial has stopped: reopen the link
+                        self.__reconnect()
+                    else:
+                        self.is_reading = False
+                for host_time, frames in reads:
+                    writer.write(frames, host_time)
+                    # All the frames read at once are decoded together
+                    try:
+                        self.sensors.update_sensors_many(frames, host_time)
+                        self.latency.update(host_time)
+                    except:
+                        pass
+            # The frames left in memory are saved before the thread ends
+            writer.close()
 
         self.is_reading = True
+        self.stopped.clear()
 
-        t = threading.Thread(target=read_tread)
-        t.start()
+        self.thread = threading.Thread(target=read_tread)
+        self.thread.start()
 
     def stop_read(self):
         """" Call this method to terminate serial reading
@@ -123,4 +314,7 @@ class Gateway:
 
         """
         self.is_reading = False
+        self.stopped.set()
+        self.commands.clear()
+        self.serial.stop_reader()
         self.serial.close_serial()
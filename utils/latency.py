@@ -0,0 +1,148 @@
+"""
+Class to measure the time between sending a command and seeing it applied by the vehicle
+
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Number of latencies kept for each type of command
+DEFAULT_WINDOW = 200
+# Time in seconds after which a command that is not applied is given up
+DEFAULT_TIMEOUT = 10.
+
+
+class LatencyTracker:
+    """ Measure the round-trip latency of the commands sent to a vehicle
+
+    Each command written is time stamped. After each update of the sensors, the pending
+    commands are checked with the function given by Vehicle.command_effect(): the latency of
+    a command is the time between its writing and the reception of the first frame that
+    reflects it
+
+    Parameters
+    ----------
+    vehicle : Vehicle instance
+        vehicle the commands are sent to
+    window : int
+        (optional) number of latencies kept for each type of command
+    timeout : float
+        (optional) time in seconds after which a command that is not applied is given up
+
+    Attributes
+    ----------
+    latencies : dict
+        {type of command: deque of the last latencies in seconds}
+    nb_timeouts : dict
+        {type of command: number of commands given up}
+
+    Examples
+    --------
+    >>> tracker = LatencyTracker(LaunchpadControl())
+    >>> tracker.sent(bytes([0x26, 0x63, 0x61, 0x01]))
+    >>> tracker.update(host_time)  # After each update of the sensors
+    >>> tracker.get_statistics()
+    {'OUTPUT1': {'count': 1, 'p50': 0.12, 'p95': 0.12, 'max': 0.12, 'timeouts': 0}}
+
+    """
+
+    def __init__(self, vehicle, window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT):
+        self.vehicle = vehicle
+        self.window = window
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.pending = []  # [(type of command, function, time sent), ]
+        self.latencies = {}
+        self.nb_timeouts = {}
+
+    def sent(self, command, host_time=None):
+        """ Time stamp a command written to the vehicle
+
+        Parameters
+        ----------
+        command : bytes
+            command written
+        host_time : float
+            (optional) time.monotonic() when the command was written. Default is now
+
+        """
+        name, is_applied = self.vehicle.command_effect(command)
+        if name is None:
+            return
+        if host_time is None:
+            host_time = time.monotonic()
+
+        with self.lock:
+            # A newer command of the same type supersedes the pending one
+            self.pending = [p for p in self.pending if p[0] != name]
+            self.pending.append((name, is_applied, host_time))
+
+    def update(self, host_time):
+        """ Check the pending commands against the sensors, after they are updated
+
+        Parameters
+        ----------
+        host_time : float
+            time.monotonic() when the frames used to update the sensors were received
+
+        """
+        with self.lock:
+            pending = []
+            for name, is_applied, sent_time in self.pending:
+                if host_time < sent_time:
+                    # The frames were received before the command was written
+                    pending.append((name, is_applied, sent_time))
+                elif is_applied(self.vehicle):
+                    latencies = self.latencies.setdefault(
+                        name, collections.deque(maxlen=self.window))
+                    latencies.append(host_time - sent_time)
+                elif host_time - sent_time > self.timeout:
+                    self.nb_timeouts[name] = self.nb_timeouts.get(name, 0) + 1
+                else:
+                    pending.append((name, is_applied, sent_time))
+            self.pending = pending
+
+    def get_statistics(self):
+        """ Return the statistics of the latencies of each type of command
+
+        Returns
+        -------
+        statistics : dict
+            {type of command: {'count', 'p50', 'p95', 'max', 'timeouts'}}, latencies in
+            seconds over the last `window` commands of this type
+
+        """
+        with self.lock:
+            names = set(self.latencies.keys()) | set(self.nb_timeouts.keys())
+            latencies = {name: np.array(self.latencies.get(name, ())) for name in names}
+            nb_timeouts = dict(self.nb_timeouts)
+
+        statistics = {}
+        for name in sorted(names):
+            values = latencies[name]
+            if len(values):
+                p50, p95 = np.percentile(values, [50, 95])
+                maximum = values.max()
+            else:
+                p50 = p95 = maximum = None
+            statistics[name] = {
+                'count': len(values),
+                'p50': p50,
+                'p95': p95,
+                'max': maximum,
+                'timeouts': nb_timeouts.get(name, 0),
+            }
+        return statistics
+
+    def reset(self):
+        """ Forget the pending commands and the latencies
+
+        """
+        with self.lock:
+            self.pending = []
+            self.latencies = {}
+            self.nb_timeouts = {}
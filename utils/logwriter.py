@@ -0,0 +1,273 @@
+"""
+Class to save the frames received by a Gateway in a separate thread
+
+The reading thread of a Gateway hands the frames over to a writer thread and goes back to
+the link at once. The writer keeps the log and its index open, writes the frames through the
+buffers of the files and makes them durable on disk according to a flush policy
+
+"""
+
+import collections
+import os
+import threading
+import time
+
+from utils.frameindex import MAGIC, build_records
+from utils.session import new_header, pack_records, write_header
+
+# Maximum time in seconds a frame received stays in memory before being flushed to disk
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Maximum number of frames received kept in memory before being flushed to disk
+DEFAULT_FLUSH_FRAMES = 1000
+# Bytes written after each frame in the log
+TRAILER = b'\r\n'
+
+
+class LogWriter:
+    """ Log file, frame index and session file written in a separate thread
+
+    The files are opened once, with the first frames, and written by a writer thread
+    started by open(). They are flushed and synced to disk when the oldest frame not flushed
+    is older than `flush_interval`, when `flush_frames` frames are not flushed, when a frame
+    is written with `critical=True` or when flush() is called
+
+    The log and its index are synced on every flush. The session file holds the same frames
+    as the log, it is only synced on the critical flushes: with a critical frame, flush()
+    and close()
+
+    Parameters
+    ----------
+    log_path : path-like object
+        path to the log, the frames are appended if it exists
+    index_path : path-like object
+        path to the index of the log, see utils.frameindex
+    vehicle : Vehicle instance
+        vehicle that sent the frames, reads their RTC for the index
+    flush_interval : float
+        (optional) maximum time in seconds between the reception of a frame and its flush
+    flush_frames : int
+        (optional) maximum number of frames received and not flushed
+    fsync : bool
+        (optional) False to only flush the buffers of the files to the system, without
+        waiting for the disk
+    session_path : path-like object
+        (optional) path to a session file where the frames are also saved with their
+        reception time, see utils.session. Not written by default
+    name : str
+        (optional) name of the Gateway, saved in the header of the session file
+
+    Attributes
+    ----------
+    nb_written : int
+        number of frames written in the files
+    nb_flushes : int
+        number of flushes to disk
+    max_lag : float
+        longest time in seconds between the reception of a frame and its flush
+
+    Examples
+    --------
+    >>> writer = LogWriter("./data/flight.log", "./data/flight.idx", Sigmundr())
+    >>> writer.open()
+    >>> writer.write(frames, time.monotonic())
+    >>> writer.get_lag()  # Seconds since the oldest frame not on disk was received
+    >>> writer.close()  # Everything written is flushed
+
+    """
+
+    def __init__(self, log_path, index_path, vehicle, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 flush_frames=DEFAULT_FLUSH_FRAMES, fsync=True, session_path=None, name=""):
+        self.log_path = log_path
+        self.index_path = index_path
+        self.vehicle = vehicle
+        self.flush_interval = flush_interval
+        self.flush_frames = flush_frames
+        self.fsync = fsync
+        self.session_path = session_path
+        self.name = name
+
+        self.condition = threading.Condition()
+        self.pending = collections.deque()  # [(host time, [bytes, ], critical), ]
+        self.is_flush_requested = False
+        self.is_running = False
+        self.thread = None
+        self.log = None
+        self.index = None
+        self.session = None
+        self.offset = 0  # Position of the next frame in the log
+
+        # Frames taken from `pending` but not flushed
+        self.nb_unflushed = 0
+        self.unflushed_time = None  # Reception time of the oldest one
+
+        self.nb_written = 0
+        self.nb_flushes = 0
+        self.max_lag = 0.
+
+    def open(self):
+        """ Start the writer thread, the files are created when the first frames are written
+
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self.__write_thread, daemon=True)
+        self.thread.start()
+
+    def write(self, frames, host_time, critical=False):
+        """ Queue frames to be written, this does not block
+
+        Parameters
+        ----------
+        frames : [bytes, ]
+            frames without their trailer. They must not change afterwards: memoryviews of a
+            reused buffer must be copied
+        host_time : float
+            time.monotonic() when the frames were received
+        critical : bool
+            (optional) True to flush the frames to disk as soon as they are written
+
+        """
+        if not frames and not critical:
+            return
+        with self.condition:
+            self.pending.append((host_time, frames, critical))
+            self.condition.notify()
+
+    def flush(self):
+        """ Ask for the frames queued to be flushed to disk as soon as they are written,
+        eg. on a critical event such as the loss of the link
+
+        """
+        with self.condition:
+            self.is_flush_requested = True
+            self.condition.notify()
+
+    def get_lag(self):
+        """ Return the write lag
+
+        Returns
+        -------
+        lag : float
+            time in seconds since the reception of the oldest frame that is not flushed to
+            disk yet, 0 if all the frames are on disk
+
+        """
+        with self.condition:
+            times = [self.pending[0][0]] if self.pending else []
+            if self.unflushed_time is not None:
+                times.append(self.unflushed_time)
+        if not times:
+            return 0.
+        return max(0., time.monotonic() - min(times))
+
+    def __write_frames(self, frames, host_time):
+        """ Write frames in the buffers of the files
+
+        """
+        if not frames:
+            return
+        if self.log is None:
+            self.log = open(self.log_path, 'ab')
+            self.offset = self.log.tell()
+            self.index = open(self.index_path, 'ab')
+            if self.index.tell() == 0:
+                self.index.write(MAGIC)
+            if self.session_path is not None:
+                self.session = open(self.session_path, 'ab')
+                if self.session.tell() == 0:
+                    write_header(self.session, new_header(self.name, self.vehicle))
+
+        for frame in frames:
+            self.log.write(frame)
+            self.log.write(TRAILER)
+        # The index holds the time of the computer clock, comparable between sessions
+        wall_time = time.time() - time.monotonic() + host_time
+        records = build_records(frames, self.offset, self.vehicle, wall_time, len(TRAILER))
+        self.index.write(records.tobytes())
+        if self.session is not None:
+            self.session.write(pack_records(frames, host_time))
+        self.offset += sum(len(frame) for frame in frames) + len(frames) * len(TRAILER)
+
+        self.nb_written += len(frames)
+        self.nb_unflushed += len(frames)
+
+    def __flush(self, critical):
+        """ Flush the buffers of the files and sync them to disk, the session file only
+        when `critical` is True
+
+        """
+        if self.log is not None:
+            for file in (self.log, self.index, self.session):
+                if file is None:
+                    continue
+                file.flush()
+                # The frames of the session file are already durable in the log
+                if self.fsync and (critical or file is not self.session):
+                    os.fsync(file.fileno())
+
+        if self.unflushed_time is not None:
+            self.max_lag = max(self.max_lag, time.monotonic() - self.unflushed_time)
+        self.nb_flushes += 1
+        with self.condition:
+            self.nb_unflushed = 0
+            self.unflushed_time = None
+
+    def __write_thread(self):
+        """ Write the frames queued until close() is called, then flush the files
+
+        """
+        while True:
+            with self.condition:
+                while self.is_running and not self.pending and not self.is_flush_requested:
+                    if self.unflushed_time is None:
+                        self.condition.wait()
+                    else:
+                        # Wake up when the oldest frame not flushed must be
+                        deadline = self.unflushed_time + self.flush_interval
+                        delay = deadline - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self.condition.wait(delay)
+                items = list(self.pending)
+                self.pending.clear()
+                if items and self.unflushed_time is None:
+                    self.unflushed_time = items[0][0]
+                is_flush_requested = self.is_flush_requested
+                self.is_flush_requested = False
+                is_running = self.is_running
+
+            critical = is_flush_requested or not is_running
+            try:
+                for host_time, frames, is_critical in items:
+                    self.__write_frames(frames, host_time)
+                    critical = critical or is_critical
+
+                is_due = (self.unflushed_time is not None and
+                          time.monotonic() - self.unflushed_time >= self.flush_interval)
+                if critical or is_due or self.nb_unflushed >= self.flush_frames:
+                    self.__flush(critical)
+            except (OSError, ValueError) as e:
+                print("{} : {}".format(self.log_path, e))
+
+            if not is_running:
+                return
+
+    def close(self):
+        """ Write the frames queued, flush the files and close them
+
+        """
+        with self.condition:
+            if not self.is_running:
+                return
+            self.is_running = False
+            self.condition.notify()
+        self.thread.join()
+        self.thread = None
+        if self.log is not None:
+            for file in (self.log, self.index, self.session):
+                if file is not None:
+                    file.close()
+            self.log = None
+            self.index = None
+            self.session = None
@@ -0,0 +1,375 @@
+"""
+Class to read the frames of a log file without loading it in memory
+
+The log file is memory-mapped and the frames are indexed as they are needed: opening a
+file is instant whatever its size, and only the pages of the file around the frames being
+replayed are loaded by the system
+
+The frames due are found with a binary search of the time given by a ReplayClock in the
+time stamps of the frames
+
+"""
+
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from os.path import isfile
+
+import numpy as np
+
+from utils.frameindex import get_index_path, read_index
+from utils.framing import Framer
+from utils.sensors import RTC_PERIOD
+
+# Number of bytes of the file indexed at once
+CHUNK_SIZE = 2**18
+
+
+class LogReplay:
+    """ Frames of a log file written by a Gateway, indexed lazily
+
+    The file is scanned chunk by chunk with a Framer. For each frame found, its position in
+    the file and its time stamp are kept in compact arrays. The time stamp is read from the
+    RTC of the frame only, the other sensors are decoded by the consumer of the frames
+
+    If the log has an index (see utils.frameindex), the frames it holds are loaded from it at
+    once and only the end of the file that is not indexed is scanned. Without RTC, the frames
+    are then time stamped with their reception time
+
+    Parameters
+    ----------
+    path : path-like object
+        path to the log file
+    vehicle : Vehicle instance
+        vehicle that sent the frames, gives the schema and reads the RTC of the frames
+    chunk_size : int
+        (optional) number of bytes of the file indexed at once
+    index_path : path-like object
+        (optional) path to the index of the log. Default is next to the log, it is not used
+        if it does not exist
+
+    Attributes
+    ----------
+    starts : array
+        position in the file of the first byte of each frame indexed
+    stops : array
+        position in the file of the end of each frame indexed, without its trailer
+    times : array
+        time stamp of each frame indexed, in seconds since the first frame. 0 if the
+        vehicle has no RTC and the reception time is not known
+    is_indexed : bool
+        True when the whole file has been indexed
+
+    Examples
+    --------
+    >>> replay = LogReplay("./data/2019-12-04T11-15-39_Telemetry.log", Sigmundr())
+    >>> frames = replay.get_frames(0, replay.index_until_time(10.))  # First 10 s
+    >>> replay.close()
+
+    """
+
+    def __init__(self, path, vehicle, chunk_size=CHUNK_SIZE, index_path=None):
+        self.vehicle = vehicle
+        self.framer = Framer.from_schema(vehicle.schema)
+        # A chunk holds at least one frame
+        longest = max(max(l) for l in self.framer.lengths.values())
+        self.chunk_size = max(chunk_size, 2 * (longest + len(self.framer.trailer)))
+
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.view = memoryview(self.map)
+
+        self.starts = array('q')
+        self.stops = array('q')
+        self.times = array('d')
+        self.position = 0  # First byte not indexed yet
+        self.is_indexed = self.size == 0
+
+        self.first_rtc = None
+        self.last_rtc = None
+        self.rtc_offset = 0.  # Added to the RTC for each wrap at midnight
+
+        if index_path is None:
+            index_path = get_index_path(path)
+        if isfile(index_path):
+            self.__load_index(index_path)
+
+    def __load_index(self, index_path):
+        """ Load the frames of the index of the log
+
+        The index is ignored if it cannot be read or does not match the log
+
+        """
+        try:
+            records = read_index(index_path)
+        except (OSError, ValueError):
+            return
+        if len(records) == 0:
+            return
+        end = int(records['offset'][-1]) + int(records['length'][-1])
+        if end > self.size:
+            return
+
+        starts = records['offset'].astype(np.int64)
+        self.starts = array('q', starts.tobytes())
+        self.stops = array('q', (starts + records['length']).tobytes())
+
+        host_times = np.array(records['host_time'])
+        if self.vehicle.clock is not None:
+            times = self.__unwrap(np.array(records['obc_time']))
+        elif not np.isnan(host_times).any():
+            times = host_times - host_times[0]
+        else:
+            times = np.zeros(len(records))
+        self.times = array('d', times.astype(np.float64).tobytes())
+
+        self.position = min(end + len(self.framer.trailer), self.size)
+        self.is_indexed = self.position >= self.size
+
+    def __len__(self):
+        """ Number of frames indexed so far
+
+        """
+        return len(self.starts)
+
+    def index_more(self):
+        """ Index the next chunk of the file
+
+        Returns
+        -------
+        count : int
+            number of frames indexed
+        """
+        if self.is_indexed:
+            return 0
+
+        end = min(self.position + self.chunk_size, self.size)
+        spans, _, position = self.framer.scan(self.map, self.position, end)
+        if end == self.size:
+            # The bytes left are an incomplete frame
+            self.is_indexed = True
+        self.position = position
+
+        if not spans:
+            return 0
+
+        for start, stop in spans:
+            self.starts.append(start)
+            self.stops.append(stop)
+        self.times.extend(self.__time_stamps([self.view[start:stop] for start, stop in spans]))
+
+        return len(spans)
+
+    def __time_stamps(self, frames):
+        """ Time stamp new frames from their RTC, unwrapped at midnight
+
+        """
+        seconds = self.vehicle.get_frame_times(frames)
+        if seconds is None:
+            # Without RTC, the frames after the ones of the index have the time of the last one
+            return np.full(len(frames), self.times[-1] if self.times else 0.)
+        return self.__unwrap(seconds)
+
+    def __unwrap(self, seconds):
+        """ Convert the RTC of new frames to seconds since the first frame
+
+        """
+        valid = ~np.isnan(seconds)
+        if not valid.any():
+            if self.first_rtc is None:
+                return np.zeros(len(seconds))
+            return np.full(len(seconds), self.last_rtc + self.rtc_offset - self.first_rtc)
+        if self.first_rtc is None:
+            self.first_rtc = seconds[valid][0]
+            self.last_rtc = self.first_rtc
+
+        # The invalid frames get the time of the previous valid one
+        index = np.where(valid, np.arange(len(seconds)) + 1, 0)
+        seconds = np.concatenate(([self.last_rtc], seconds))[np.maximum.accumulate(index)]
+
+        # Unwrap the RTC, continuing from the previous chunk
+        wraps = np.cumsum(np.diff(seconds, prepend=self.last_rtc) < -RTC_PERIOD/2)
+        seconds += self.rtc_offset + wraps*RTC_PERIOD
+        self.rtc_offset += wraps[-1]*RTC_PERIOD
+        self.last_rtc = seconds[-1] - self.rtc_offset
+
+        return seconds - self.first_rtc
+
+    def index_until(self, count):
+        """ Index the file until `count` frames are indexed or the file is fully indexed
+
+        Returns
+        -------
+        count : int
+            number of frames indexed
+        """
+        while len(self.starts) < count and not self.is_indexed:
+            self.index_more()
+        return len(self.starts)
+
+    def index_until_time(self, seconds):
+        """ Index the file until a frame is after `seconds` or the file is fully indexed
+
+        Returns
+        -------
+        count : int
+            number of frames indexed with a time stamp before or at `seconds`
+        """
+        while not self.is_indexed and (not self.times or self.times[-1] <= seconds):
+            self.index_more()
+        return bisect_right(self.times, seconds)
+
+    def get_frame(self, index):
+        """ Return a frame, indexed before
+
+        Returns
+        -------
+        frame : memoryview
+            view of the frame in the file, without its trailer
+        """
+        return self.view[self.starts[index]:self.stops[index]]
+
+    def get_frames(self, start, stop):
+        """ Return the frames from `start` to `stop` excluded, indexed before
+
+        Returns
+        -------
+        frames : [memoryview, ]
+            views of the frames in the file, without their trailer
+        """
+        view = self.view
+        return [view[a:b] for a, b in zip(self.starts[start:stop], self.stops[start:stop])]
+
+    def close(self):
+        """ Close the file
+
+        The views returned by get_frame() must be released before, otherwise the file stays
+        mapped until they are garbage collected
+
+        """
+        try:
+            self.view.release()
+        except BufferError:
+            pass
+        if self.size:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+        self.file.close()
+
+
+class ReplayClock:
+    """ Clock of a replay, that can run faster or slower than real time
+
+    The replay time runs at `speed` times the computer clock. It can be paused and moved to
+    any time. In fast mode, the replay time does not run by itself: the reader of the frames
+    moves it to the last frame it has released, as fast as it can
+
+    Parameters
+    ----------
+    speed : float
+        (optional) replay seconds per second, between MIN_SPEED and MAX_SPEED
+
+    Examples
+    --------
+    >>> clock = ReplayClock(speed=10)
+    >>> clock.now()  # Replay seconds since the start
+    >>> clock.pause()
+    >>> clock.seek(60.)
+    >>> clock.resume()
+
+    """
+    MIN_SPEED = 0.1
+    MAX_SPEED = 100.
+
+    def __init__(self, speed=1.):
+        self.lock = threading.Lock()
+        self.origin = 0.  # Replay time at `reference`
+        self.reference = time.monotonic()
+        self.speed = 1.
+        self.is_paused = False
+        self.is_fast = False
+        self.set_speed(speed)
+
+    def __rebase(self):
+        """ Move the origin to now, must be called with the lock held
+
+        """
+        now = time.monotonic()
+        if not self.is_paused and not self.is_fast:
+            self.origin += (now - self.reference) * self.speed
+        self.reference = now
+
+    def now(self):
+        """ Return the replay time in seconds
+
+        """
+        with self.lock:
+            if self.is_paused or self.is_fast:
+                return self.origin
+            return self.origin + (time.monotonic() - self.reference) * self.speed
+
+    def delay(self, seconds):
+        """ Return the time to wait before the replay time reaches `seconds`
+
+        Returns
+        -------
+        delay : float
+            seconds of computer time, 0 in fast mode, infinite when paused
+        """
+        with self.lock:
+            if self.is_paused:
+                return float('inf')
+            if self.is_fast:
+                return 0.
+            now = self.origin + (time.monotonic() - self.reference) * self.speed
+            return max(0., (seconds - now) / self.speed)
+
+    def set_speed(self, speed):
+        """ Change the speed of the replay, the replay time is not changed
+
+        """
+        if not self.MIN_SPEED <= speed <= self.MAX_SPEED:
+            raise ValueError("Replay speed must be between {} and {}, got {}".format(
+                self.MIN_SPEED, self.MAX_SPEED, speed))
+        with self.lock:
+            self.__rebase()
+            self.speed = float(speed)
+
+    def set_fast(self, is_fast):
+        """ Replay the frames as fast as possible, or at `speed` again
+
+        """
+        with self.lock:
+            self.__rebase()
+            self.is_fast = bool(is_fast)
+
+    def pause(self):
+        """ Stop the replay time until resume() is called
+
+        """
+        with self.lock:
+            self.__rebase()
+            self.is_paused = True
+
+    def resume(self):
+        """ Let the replay time run again after pause()
+
+        """
+        with self.lock:
+            self.__rebase()
+            self.is_paused = False
+
+    def seek(self, seconds):
+        """ Move the replay time to `seconds`
+
+        """
+        with self.lock:
+            self.reference = time.monotonic()
+            self.origin = float(seconds)
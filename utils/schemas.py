@@ -0,0 +1,127 @@
+"""
+Registry of the frame layouts of the vehicles
+
+A vehicle is described by a VehicleSchema: the sensors it carries, where they are in the
+frames and which sensors are in each type of frame. A new vehicle only needs a schema to
+be decoded by a Vehicle instance (see utils.sensors), no new class is required
+
+"""
+
+from utils.channels import DEFAULT_CAPACITY
+
+
+# Registered schemas {vehicle name: VehicleSchema instance}
+SCHEMAS = {}
+
+
+class VehicleSchema:
+    """ Layout of the frames sent by a vehicle
+
+    Parameters
+    ----------
+    name: str
+        name of the vehicle
+    sensors: dict
+        dictionary with the following structure
+            {'name_of_the_sensor': {
+                'class': #GenericSensor child class,
+                'start': #Position of the first byte of the sensor in the frames,
+                # Any other item is given to the constructor of the class
+                },
+            {'name_of_an_other_sensor'}: {...},
+            }
+    frames: dict
+        {(frame ID, length in bytes): [names of the sensors in the frame, ]}. The frame ID
+        is the first byte of the frame, or None for all the frames if the vehicle does not
+        send it
+    version: int
+        (optional) version of the layout, to increment when the frames change. It is saved
+        in the recorded sessions (see utils.session)
+
+    Examples
+    --------
+    >>> schema = register_schema(VehicleSchema(
+    ...     name='Mjollnir',
+    ...     sensors={
+    ...         'rtc': {'class': RTC, 'start': 1, 'is_rtc': True},
+    ...         'bmp': {'class': BMP280, 'start': 5},
+    ...     },
+    ...     frames={(0x01, 13): ['rtc', 'bmp']},
+    ... ))
+    >>> mjollnir = Vehicle(get_schema('Mjollnir'))
+
+    """
+
+    def __init__(self, name, sensors, frames, version=1):
+        self.name = name
+        self.sensors = sensors
+        self.frames = frames
+        self.version = version
+
+        for (frame_id, length), names in self.frames.items():
+            for name in names:
+                if name not in self.sensors:
+                    raise ValueError("{}: unknown sensor {} in frame ({}, {})".format(
+                        self.name, name, frame_id, length))
+
+        frame_ids = set(frame_id is None for frame_id, _ in self.frames.keys())
+        if len(frame_ids) > 1:
+            raise ValueError("{}: frame ID must be given for all frames or none".format(self.name))
+        self.has_frame_id = frame_ids != {True}
+
+    def build_sensors(self, capacity=DEFAULT_CAPACITY):
+        """ Create the sensors of the vehicle
+
+        Parameters
+        ----------
+        capacity: int
+            (optional) maximum number of samples kept in the history of each sensor
+
+        Returns
+        -------
+        sensors: dict
+            {name: GenericSensor child class instance}
+
+        """
+        sensors = {}
+        for name, description in self.sensors.items():
+            kwargs = {key: value for key, value in description.items() if key not in ('class', 'start')}
+            sensors[name] = description['class'](description['start'], capacity=capacity, **kwargs)
+        return sensors
+
+
+def register_schema(schema):
+    """ Add a schema to the registry
+
+    Parameters
+    ----------
+    schema: VehicleSchema instance
+        schema to register. Replaces any schema registered with the same name
+
+    Returns
+    -------
+    schema: VehicleSchema instance
+        the registered schema
+
+    """
+    SCHEMAS[schema.name] = schema
+    return schema
+
+
+def get_schema(name):
+    """ Return a registered schema
+
+    Parameters
+    ----------
+    name: str
+        name of the vehicle
+
+    Returns
+    -------
+    schema: VehicleSchema instance
+        schema of the vehicle
+
+    """
+    if name not in SCHEMAS:
+        raise ValueError("Unknown vehicle: {}".format(name))
+    return SCHEMAS[name]
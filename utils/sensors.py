@@ -3,15 +3,95 @@
 The class GenericSensor contains all the logic required to extract the sensors' data from
 a bytearray
 
-Write GenericSensor child class for each sensor with a 'field' and 'sample_size' attributes. Add an 'update_data()'
-method that calls the parent's 'update_raw_data()' method to update the sensor's values. It is possible
-to add a specific processing in 'update_data()' if necessary
+Write GenericSensor child class for each sensor with a 'field' and 'sample_size' attributes. The parent's
+'update_data()' and 'update_data_many()' methods update the sensor's values from one or many frames. It is
+possible to add a specific processing of the new values in an 'update_values()' method if necessary
 
 """
 
 import datetime
-import math
 import struct
+import time
+
+import numpy as np
+
+from utils.channels import DEFAULT_CAPACITY, ChannelStore, DerivedChannel
+from utils.conversion import Conversion
+from utils.decoder import FrameDecoder
+from utils.schemas import VehicleSchema, register_schema
+
+
+# The RTC of the OBC is read as a time of the day and wraps every 24 h
+RTC_PERIOD = 24*3600.  # s
+
+
+def rtc_seconds(values):
+    """ Convert the values read from an RTC to seconds since midnight
+
+    Parameters
+    ----------
+    values: dict
+        {'Hour': ..., 'Minute': ..., 'Second': ..., 'Microsecond': ...}, the values can be
+        numbers or numpy arrays
+
+    Returns
+    -------
+    seconds: float or numpy array
+        seconds since midnight
+
+    """
+    return values['Hour']*3600. + values['Minute']*60. + values['Second'] + values['Microsecond']*1e-6
+
+
+def seconds_to_time(seconds):
+    """ Convert a time stamp in seconds to a human readable time
+
+    Parameters
+    ----------
+    seconds: float
+        time stamp in seconds, eg. from the 'Time' channel of a sensor
+
+    Returns
+    -------
+    t: datetime.time object
+        time of the day of the time stamp
+
+    """
+    seconds = float(seconds) % RTC_PERIOD
+    minute, second = divmod(seconds, 60)
+    hour, minute = divmod(int(minute), 60)
+    microsecond = min(int((second - int(second))*1e6), 999999)
+    return datetime.time(hour, minute, int(second), microsecond)
+
+
+class SensorData(dict):
+    """ Dictionary of the last values of a sensor
+
+    The flags of the bitfields are not stored: they are computed from the packed value
+    of their bitfield only when they are read
+
+    Parameters
+    ----------
+    flags: dict
+        {flag name: (bitfield name, mask, shift)}, see GenericSensor.flags
+    values: dict
+        initial values
+
+    """
+
+    def __init__(self, flags, values):
+        super().__init__(values)
+        self.flags = flags
+
+    def __missing__(self, key):
+        if key not in self.flags:
+            raise KeyError(key)
+
+        field, mask, shift = self.flags[key]
+        value = self[field]
+        if value is None:
+            return None
+        return (value & mask) >> shift
 
 
 class GenericSensor:
@@ -26,12 +106,16 @@ class GenericSensor:
             {'Name_of_the_field': {
                 'start': #Position of the first byte in the field,
                 'size': #Size of the field in bytes,
-                'conversion_function': #lamdba fonction to convert the values,
+                'type': #'int', 'float' or 'bitfield',
+                'conversion': #Conversion instance to convert the values,
                 'byte_order': #'big' or 'little,
                 'signed': #True or False,
+                'flags': #Only for bitfields: {'Name_of_the_flag': mask, }
                 },
             {'Name_of_an_other_field'}: {...},
             }
+        A bitfield is an integer read once and stored packed. Its flags are read with
+        the masks
     sample_size: int
         number of bytes in the field
     nb_sample: int
@@ -40,22 +124,110 @@ class GenericSensor:
         (optional) frequency of data acquisition in Hz. Required if nb_samples != 1
     is_rtc: bool
         True if the sensor is a Real Time Clock
+    capacity: int
+        (optional) maximum number of samples kept in the history of each field
 
     """
 
-    def __init__(self, start_position, fields, sample_size, nb_samples=1, sample_rate=0, is_rtc=False):
+    def __init__(self, start_position, fields, sample_size, nb_samples=1, sample_rate=0, is_rtc=False,
+                 capacity=DEFAULT_CAPACITY):
         self.start_position = start_position
         self.fields = fields
         self.sample_size = sample_size  # Byte
         self.nb_samples = nb_samples
         self.sample_rate = sample_rate  # Hz
         self.is_rtc = is_rtc
-
+        self.capacity = capacity
+        # The samples of a frame are acquired before it is sent: delay of each sample in seconds
+        self.sample_delays = np.zeros(self.nb_samples)
+        if self.sample_rate:
+            self.sample_delays = (self.nb_samples - np.arange(self.nb_samples) + 1)/self.sample_rate
+
+        # {flag name: (bitfield name, mask, shift)}
+        self.flags = {}
+        for name, field in self.fields.items():
+            if field['type'] == 'bitfield':
+                for flag, mask in field['flags'].items():
+                    shift = (mask & -mask).bit_length() - 1
+                    self.flags[flag] = (name, mask, shift)
+
+        self.build_converters()
         self.set_default_values()
 
+    def mask(self, flag):
+        """ Return the mask of a flag in its bitfield
+
+        Parameters
+        ----------
+        flag: str
+            name of the flag
+
+        Returns
+        -------
+        mask: int
+            mask of the flag
+
+        """
+        return self.flags[flag][1]
+
+    def seconds_since_start(self, deltas):
+        """ Compute 'Seconds_since_start' of the samples of many frames
+
+        Each sample is dated back from the time of its frame by `sample_delays`, as in
+        update_raw_data()
+
+        Parameters
+        ----------
+        deltas: numpy array
+            time of each frame in seconds since the start of the sensor
+
+        Returns
+        -------
+        seconds: numpy array
+            time of each sample in seconds since the start, `nb_samples` per frame
+
+        """
+        deltas = np.asarray(deltas, dtype=np.float64)
+        return np.repeat(deltas, self.nb_samples) - np.tile(self.sample_delays, len(deltas))
+
+    def build_converters(self):
+        """ Select the fastest way to convert the raw values of each field
+
+        The conversions of 1 and 2 bytes integers are read from lookup tables. The tables
+        are built once and shared by all the sensors, for instance bmp2 and bmp3
+
+        Two dictionaries are set:
+            self.lookup_tables: {field: numpy array} for the tabulated fields
+            self.converters: {field: function converting a single raw value}
+
+        """
+        self.lookup_tables = {}
+        self.converters = {}
+
+        for name, field in self.fields.items():
+            conversion = field['conversion']
+            if field['type'] in ('int', 'bitfield') and field['size'] <= 2 and not conversion.is_identity:
+                table = conversion.lookup_table(field['size'], field['signed'])
+                self.lookup_tables[name] = table
+                # Indexing a memoryview returns Python ints and floats
+                self.converters[name] = memoryview(table).__getitem__
+            else:
+                self.converters[name] = conversion.function
+
     def set_default_values(self):
-        fields = ['Time'] + ['Seconds_since_start'] + list(self.fields.keys())
-        self.raw_data = {key: [] for key in fields}
+        fields = ['Time'] + ['Host_time'] + ['Seconds_since_start'] + list(self.fields.keys())
+
+        dtypes = {}
+        for name, field in self.fields.items():
+            # Integer fields stay integers unless their conversion returns floats
+            if field['type'] in ('int', 'bitfield') and field['conversion'].is_integer:
+                dtypes[name] = np.int64
+
+        self.raw_data = ChannelStore(fields, self.capacity, dtypes, self.flags)
+        # Time of the first sample. Not read from the history, which drops its oldest values
+        self.start_time = None
+        # Added to the RTC time each time it wraps
+        self.rtc_offset = 0.
 
     def _extract_samples(self, frame):
         """ Read a frame and return a view of it with only the relevant bytes
@@ -102,13 +274,13 @@ class GenericSensor:
         start = self.fields[field]['start']
         size = self.fields[field]['size']
         field_type = self.fields[field]['type']
-        convert = self.fields[field]['conversion_function']
+        convert = self.converters[field]
         byte_order = self.fields[field]['byte_order']
         signed = self.fields[field]['signed']
 
         field_bytes = sample[start: start + size]
 
-        if field_type == 'int':
+        if field_type in ('int', 'bitfield'):
             value = int.from_bytes(field_bytes, byte_order, signed=signed)
         elif field_type == 'float':
             if byte_order == 'big':
@@ -120,47 +292,459 @@ class GenericSensor:
 
         return value
 
-    def update_raw_data(self, frame, frame_time=None):
+    def decode(self, frame):
+        """ Extract and convert the values of all the fields of all the samples
+
+        Parameters
+        ----------
+        frame: bytearray
+            telemetry frame
+
+        Returns
+        -------
+        samples: list
+            list with the values of all the fields for each sample
+
+        """
+        return [[self._extract_field_values(sample, field) for field in self.fields.keys()]
+                for sample in self._extract_samples(frame)]
+
+    def get_time(self, index=-1):
+        """ Return the time stamp of a sample in a human readable format
+
+        Parameters
+        ----------
+        index: int
+            (optional) index of the sample in the history. Default is the last one
+
+        Returns
+        -------
+        t: datetime.time object
+            time stamp of the sample
+
+        """
+        return seconds_to_time(self.raw_data['Time'][index])
+
+    def update_raw_data(self, frame, frame_time=None, samples=None, host_time=None):
         """ Read values from the telemetry frame and update the sensor's values
 
         Parameters
         ----------
         frame: bytearray
             telemetry frame
-        frame_time: datetime.time object
-            (optional) timestamp of the frame. Not need when reading the RTC
+        frame_time: float
+            (optional) timestamp of the frame in seconds. Not need when reading the RTC
+        samples: list
+            (optional) values already decoded from the frame, as returned by decode().
+            The frame is not read again if they are given
+        host_time: float
+            (optional) time.monotonic() when the frame was received. Default is now
 
         """
-        samples = self._extract_samples(frame)
+        if samples is None:
+            samples = self.decode(frame)
+        if host_time is None:
+            host_time = time.monotonic()
 
         for i, sample in enumerate(samples):
 
-            for field in self.fields.keys():
-                value = self._extract_field_values(sample, field)
+            for field, value in zip(self.fields.keys(), sample):
                 self.raw_data[field].append(value)
 
             # frame_time is None when updating the RTC values
             if self.is_rtc:
-                hour = self.raw_data['Hour'][-1]
-                minute = self.raw_data['Minute'][-1]
-                second = self.raw_data['Second'][-1]
-                microsecond = int(self.raw_data['Microsecond'][-1])
-                frame_time = datetime.time(hour, minute, second, microsecond)
-
-            if self.raw_data['Time']:
-                start_time = datetime.datetime.combine(datetime.date.today(), self.raw_data['Time'][0])
-                    
-                now = datetime.datetime.combine(datetime.date.today(), frame_time)
-                delta = now - start_time
-                delta = delta.total_seconds()
-            else:
-                delta = 0.
+                frame_time = self.raw_data['Hour'][-1]*3600. + self.raw_data['Minute'][-1]*60. \
+                    + self.raw_data['Second'][-1] + self.raw_data['Microsecond'][-1]*1e-6 \
+                    + self.rtc_offset
+                if len(self.raw_data['Time']) and frame_time < self.raw_data['Time'][-1] - RTC_PERIOD/2:
+                    self.rtc_offset += RTC_PERIOD
+                    frame_time += RTC_PERIOD
+
+            if self.start_time is None:
+                self.start_time = frame_time
+            delta = frame_time - self.start_time
             
             self.raw_data['Time'].append(frame_time)
-            if self.sample_rate:
-                self.raw_data['Seconds_since_start'].append(delta-(self.nb_samples-i+1)/self.sample_rate)
+            self.raw_data['Host_time'].append(host_time)
+            self.raw_data['Seconds_since_start'].append(delta - self.sample_delays[i])
+
+    def update_raw_data_many(self, values, frame_times=None, host_times=None):
+        """ Add the values decoded from many frames to the sensor's history
+
+        Same as calling update_raw_data() for each frame, with the values decoded at once
+
+        Parameters
+        ----------
+        values: dict
+            {field name: numpy array} as returned by FrameDecoder.decode_batch(), with
+            `nb_samples` values per frame
+        frame_times: numpy array
+            (optional) timestamp of each frame in seconds. Not need when reading the RTC
+        host_times: float or numpy array
+            (optional) time.monotonic() when each frame was received. Default is now
+
+        Returns
+        -------
+        frame_times: numpy array
+            timestamp of each frame in seconds
+
+        """
+        count = len(values[next(iter(self.fields))])
+        nb_frames = count // self.nb_samples
+        if host_times is None:
+            host_times = time.monotonic()
+        host_times = np.broadcast_to(np.asarray(host_times, dtype=np.float64), (nb_frames, ))
+
+        for field in self.fields.keys():
+            self.raw_data[field].extend(values[field])
+
+        if self.is_rtc:
+            seconds = rtc_seconds(values)
+            # Unwrap the RTC as in update_raw_data()
+            if len(self.raw_data['Time']):
+                previous = self.raw_data['Time'][-1] - self.rtc_offset
             else:
-                self.raw_data['Seconds_since_start'].append(delta)
+                previous = seconds[0]
+            wraps = np.cumsum(np.diff(seconds, prepend=previous) < -RTC_PERIOD/2)
+            frame_times = seconds + self.rtc_offset + wraps*RTC_PERIOD
+            self.rtc_offset += wraps[-1]*RTC_PERIOD
+        frame_times = np.asarray(frame_times, dtype=np.float64)
+
+        if self.start_time is None:
+            self.start_time = frame_times[0]
+        self.raw_data['Time'].extend(np.repeat(frame_times, self.nb_samples))
+        self.raw_data['Host_time'].extend(np.repeat(host_times, self.nb_samples))
+        self.raw_data['Seconds_since_start'].extend(
+            self.seconds_since_start(frame_times - self.start_time))
+
+        return frame_times
+
+    def update_values(self, count=1):
+        """ Update the values computed from the raw data, eg. the last values in self.data
+
+        Nothing to do by default. Override this method to add a specific processing
+
+        Parameters
+        ----------
+        count: int
+            (optional) number of samples just added to the raw data
+
+        """
+        pass
+
+    def update_data(self, frame, frame_time=None, samples=None, host_time=None):
+        """ Update the sensor's values with a frame
+
+        Parameters are the same as update_raw_data()
+
+        """
+        self.update_raw_data(frame, frame_time, samples, host_time)
+        self.update_values(self.nb_samples)
+
+    def update_data_many(self, values, frame_times=None, host_times=None):
+        """ Update the sensor's values with the values decoded from many frames
+
+        Parameters are the same as update_raw_data_many()
+
+        Returns
+        -------
+        frame_times: numpy array
+            timestamp of each frame in seconds, empty if there are no values
+
+        """
+        count = len(values[next(iter(self.fields))])
+        if count == 0:
+            return np.array([])
+
+        frame_times = self.update_raw_data_many(values, frame_times, host_times)
+        self.update_values(count)
+
+        return frame_times
+
+
+class Vehicle:
+    """ Extract data from the frames of a vehicle described by a schema
+
+    The type of each frame is found from its ID and length with a single dictionary
+    lookup. Each type of frame has its own FrameDecoder. Frames are time stamped with the
+    RTC of the vehicle if it has one, or with the time they are received otherwise
+
+    Parameters
+    ----------
+    schema: VehicleSchema instance
+        layout of the frames of the vehicle
+    capacity: int
+        (optional) maximum number of samples kept in the history of each sensor
+
+    Attributes
+    ----------
+    sensors: dict
+        {name: GenericSensor child class instance}. Each sensor is also an attribute of
+        the instance
+    clock: str
+        name of the RTC sensor, None if the vehicle has no RTC
+
+    Examples
+    --------
+    >>> mjollnir = Vehicle(get_schema('Mjollnir'))
+    >>> mjollnir.update_sensors(frame)
+    >>> mjollnir.bmp.data['Altitude'][-1]
+
+    """
+
+    def __init__(self, schema, capacity=DEFAULT_CAPACITY):
+        self.schema = schema
+        self.sensors = self.schema.build_sensors(capacity)
+        for name, sensor in self.sensors.items():
+            setattr(self, name, sensor)
+
+        clocks = [name for name, sensor in self.sensors.items() if sensor.is_rtc]
+        self.clock = clocks[0] if clocks else None
+        # Decoder of the RTC alone, created when needed by get_frame_times()
+        self.clock_decoder = None
+
+        # {(frame ID, length): FrameDecoder instance}, frames with the same sensors share a decoder
+        self.decoders = {}
+        decoders = {}
+        for key, names in self.schema.frames.items():
+            if self.clock is not None:
+                if self.clock not in names:
+                    raise ValueError("{}: no RTC in frame {}".format(self.schema.name, key))
+                # The RTC comes first to time stamp the others
+                names = [self.clock] + [name for name in names if name != self.clock]
+            names = tuple(names)
+            if names not in decoders:
+                decoders[names] = FrameDecoder({name: self.sensors[name] for name in names})
+            self.decoders[key] = decoders[names]
+
+    def get_decoder(self, frame):
+        """ Return the decoder of a frame
+
+        Parameters
+        ----------
+        frame: bytearray
+            frame received from the vehicle
+
+        Returns
+        -------
+        decoder: FrameDecoder instance
+            decoder of the frame type, None if the frame is not valid
+
+        """
+        if not self.schema.has_frame_id:
+            return self.decoders.get((None, len(frame)))
+        if len(frame) == 0:
+            return None
+        return self.decoders.get((frame[0], len(frame)))
+
+    def update_sensors(self, frame, host_time=None):
+        """ Decode a frame and update the sensors
+
+        Parameters
+        ----------
+        frame: bytearray
+            frame received from the vehicle
+        host_time: float
+            (optional) time.monotonic() when the frame was received. Default is now
+
+        """
+        if host_time is None:
+            host_time = time.monotonic()
+
+        decoder = self.get_decoder(frame)
+        if decoder is None:
+            return
+
+        values = decoder.decode(frame)
+        if self.clock is None:
+            frame_time = host_time
+        else:
+            clock = self.sensors[self.clock]
+            clock.update_data(frame, samples=values[self.clock], host_time=host_time)
+            frame_time = clock.raw_data['Time'][-1]
+
+        for name, sensor in decoder.sensors.items():
+            if name != self.clock:
+                sensor.update_data(frame, frame_time, values[name], host_time)
+
+    def update_sensors_many(self, frames, host_time=None):
+        """ Decode many frames at once and update the sensors
+
+        Same as calling update_sensors() for each frame: the frames are grouped by type and
+        each group is decoded in one go
+
+        Parameters
+        ----------
+        frames: [bytearray, ]
+            frames received from the vehicle, ordered from oldest to newest
+        host_time: float
+            (optional) time.monotonic() when the frames were received. Default is now.
+            Without RTC, all the frames are time stamped with it
+
+        """
+        if host_time is None:
+            host_time = time.monotonic()
+
+        values, in_frames, nb_frames = self.__decode_many(frames)
+        if nb_frames == 0:
+            return
+
+        if self.clock is None:
+            frame_times = np.full(nb_frames, float(host_time))
+        else:
+            frame_times = self.sensors[self.clock].update_data_many(
+                values[self.clock], host_times=host_time)
+
+        for name, sensor in self.sensors.items():
+            if name != self.clock:
+                sensor.update_data_many(values[name], frame_times[in_frames[name]], host_time)
+
+    def __decode_many(self, frames):
+        """ Decode the valid frames, grouped by type
+
+        Returns
+        -------
+        values: dict
+            {sensor name: {field name: numpy array}}, ordered from oldest to newest
+        in_frames: dict
+            {sensor name: numpy array}, True for the valid frames that contain the sensor
+        nb_frames: int
+            number of valid frames
+
+        """
+        groups = {}  # {(frame ID, length): [indices of the valid frames]}
+        valid_frames = []
+        for frame in frames:
+            decoder = self.get_decoder(frame)
+            if decoder is not None:
+                key = (frame[0] if self.schema.has_frame_id else None, len(frame))
+                groups.setdefault(key, []).append(len(valid_frames))
+                valid_frames.append(frame)
+        nb_frames = len(valid_frames)
+
+        indices = {name: [] for name in self.sensors.keys()}  # Frame index of each sample
+        group_values = {name: [] for name in self.sensors.keys()}
+        for key, group in groups.items():
+            decoder = self.decoders[key]
+            decoded = decoder.decode_batch([valid_frames[i] for i in group])
+            for name, sensor in decoder.sensors.items():
+                indices[name].append(np.repeat(group, sensor.nb_samples))
+                group_values[name].append(decoded[name])
+
+        values = {}
+        in_frames = {}
+        for name, sensor in self.sensors.items():
+            in_frames[name] = np.zeros(nb_frames, dtype=bool)
+            if not indices[name]:
+                values[name] = {field: np.array([]) for field in sensor.fields.keys()}
+                continue
+            # Put the samples of the different groups back in the order of the frames
+            index = np.concatenate(indices[name])
+            order = np.argsort(index, kind='stable')
+            in_frames[name][index] = True
+            values[name] = {
+                field: np.concatenate([v[field] for v in group_values[name]])[order]
+                for field in sensor.fields.keys()}
+
+        return values, in_frames, nb_frames
+
+    def decode_batch(self, frames):
+        """ Decode many frames at once without updating the sensors
+
+        Invalid frames are ignored
+
+        Parameters
+        ----------
+        frames: [bytearray, ]
+            frames received from the vehicle
+
+        Returns
+        -------
+        values: dict
+            {sensor name: {field name: numpy array}}. If the vehicle has an RTC,
+            'Seconds_since_start' is added to each sensor, computed from the RTC of the
+            frames the sensor is in
+
+        """
+        values, in_frames, nb_frames = self.__decode_many(frames)
+        if self.clock is None:
+            return values
+
+        seconds = rtc_seconds(values[self.clock])
+        # Unwrap the RTC as in update_raw_data()
+        wraps = np.cumsum(np.diff(seconds) < -RTC_PERIOD/2)
+        seconds[1:] += wraps*RTC_PERIOD
+
+        # As in update_raw_data(), the origin is the first frame of each sensor
+        for name, sensor_values in values.items():
+            frame_seconds = seconds[in_frames[name]]
+            if len(frame_seconds):
+                frame_seconds = frame_seconds - frame_seconds[0]
+            sensor = self.sensors[name]
+            sensor_values['Seconds_since_start'] = sensor.seconds_since_start(frame_seconds)
+
+        return values
+
+    def get_frame_times(self, frames):
+        """ Read the RTC of many frames at once, without decoding the other sensors
+
+        Parameters
+        ----------
+        frames: [bytearray, ]
+            frames received from the vehicle
+
+        Returns
+        -------
+        seconds: numpy array
+            RTC of each frame in seconds since midnight, not unwrapped. NaN for the invalid
+            frames. None if the vehicle has no RTC
+
+        """
+        if self.clock is None:
+            return None
+        if self.clock_decoder is None:
+            self.clock_decoder = FrameDecoder({self.clock: self.sensors[self.clock]})
+
+        # The RTC is at the same position in all the frames, they are only grouped by length
+        groups = {}
+        for i, frame in enumerate(frames):
+            if self.get_decoder(frame) is not None:
+                groups.setdefault(len(frame), []).append(i)
+
+        seconds = np.full(len(frames), np.nan)
+        for group in groups.values():
+            values = self.clock_decoder.decode_batch([frames[i] for i in group])
+            seconds[group] = rtc_seconds(values[self.clock])
+
+        return seconds
+
+    def reset(self):
+        for sensor in self.sensors.values():
+            sensor.reset()
+
+    def set_reference(self):
+        for sensor in self.sensors.values():
+            if hasattr(sensor, 'set_reference'):
+                sensor.set_reference()
+
+    def command_effect(self, command):
+        """ Describe how a command sent to the vehicle shows in the frames it sends back
+
+        Parameters
+        ----------
+        command: bytes
+            command sent to the vehicle
+
+        Returns
+        -------
+        name: str
+            type of the command, None if the effect of the command is not known
+        is_applied: function
+            function called with the Vehicle instance after each update, returns True once
+            the command is reflected by the sensors. None if the type is not known
+
+        """
+        return None, None
 
 
 # ############################### #
@@ -172,19 +756,29 @@ class Status(GenericSensor):
     fields = {
         'STATUS_1': {
             'start': 0,
-            'size': 2,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 0xFF00) >> 8,
+            'size': 1,  # Byte
+            'type': 'bitfield',
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
+            'flags': {
+                'LIFTOFF': 1<<1,
+                'APOGEE': 1<<2,
+                'PARACHUTE_IGNITING': 1<<3,
+                'PARACHUTE_ARDUINO_ARMING': 1<<4,
+            },
         },
         'STATUS_2': {
-            'start': 0,
-            'size': 2,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 0x00FF) >> 0,
+            'start': 1,
+            'size': 1,  # Byte
+            'type': 'bitfield',
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
+            'flags': {
+                'PARACHUTE_ARMING': 1<<2,
+                'PARACHUTE_TRIGGER': 1<<7,
+            },
         }
     }
     sample_size = 2
@@ -195,56 +789,30 @@ class Status(GenericSensor):
         self.reset()
     
     def reset(self):
-        self.data = {field: 0 for field in self.fields.keys()}
+        self.data = SensorData(self.flags, {field: 0 for field in self.fields.keys()})
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
 
 
 class ErrMsg(GenericSensor):
     fields = {
-        'ERR_LOOP_TIME': {
-            'start': 0,
-            'size': 1,
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<0) >> 0,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'ERR_WRITE_SD': {
+        'ERR_MSG': {
             'start': 0,
             'size': 1,
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<1) >> 1,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'ERR_SYNC_SD': {
-            'start': 0,
-            'size': 1,
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<2) >> 2,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'ERR_SEND_TM': {
-            'start': 0,
-            'size': 1,
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<3) >> 3,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'ERR_READ_IMU': {
-            'start': 0,
-            'size': 1,
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<4) >> 4,
+            'type': 'bitfield',
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
+            'flags': {
+                'ERR_LOOP_TIME': 1<<0,
+                'ERR_WRITE_SD': 1<<1,
+                'ERR_SYNC_SD': 1<<2,
+                'ERR_SEND_TM': 1<<3,
+                'ERR_READ_IMU': 1<<4,
+            },
         },
     }
     sample_size = 1
@@ -255,11 +823,10 @@ class ErrMsg(GenericSensor):
         self.reset()
     
     def reset(self):
-        self.data = {field: None for field in self.fields.keys()}
+        self.data = SensorData(self.flags, {field: None for field in self.fields.keys()})
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
 
@@ -273,7 +840,7 @@ class RTC(GenericSensor):
             'start': 0,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,  # h
+            'conversion': Conversion(),  # h
             'byte_order': 'big',
             'signed': False,
         },
@@ -281,7 +848,7 @@ class RTC(GenericSensor):
             'start': 1,
             'size': 1,
             'type': 'int',
-            'conversion_function': lambda x: x,  # min
+            'conversion': Conversion(),  # min
             'byte_order': 'big',
             'signed': False,
         },
@@ -289,7 +856,7 @@ class RTC(GenericSensor):
             'start': 2,
             'size': 1,
             'type': 'int',
-            'conversion_function': lambda x: x,  # s
+            'conversion': Conversion(),  # s
             'byte_order': 'big',
             'signed': False,
         },
@@ -297,7 +864,7 @@ class RTC(GenericSensor):
             'start': 3,
             'size': 1,
             'type': 'int',
-            'conversion_function': lambda x: x*1000*1000/256.,  # ms
+            'conversion': Conversion(scale=1000*1000/256.),  # ms
             'byte_order': 'big',
             'signed': False,
         },
@@ -311,7 +878,7 @@ class RTC(GenericSensor):
     
     def reset(self):
         self.data = {
-            'Time': datetime.time(0, 0, 0, 0),
+            'Time': 0.,
             'Hour': 0,
             'Minute': 0,
             'Second': 0,
@@ -319,8 +886,7 @@ class RTC(GenericSensor):
         }
         self.set_default_values()
     
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         self.data['Time'] = self.raw_data['Time'][-1]
         self.data['Hour'] = self.raw_data['Hour'][-1]
         self.data['Minute'] = self.raw_data['Minute'][-1]
@@ -337,7 +903,7 @@ class Timer(GenericSensor):
             'start': 0,
             'size': 4,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x*1e-4,  # s
+            'conversion': Conversion(scale=1e-4),  # s
             'byte_order': 'little',
             'signed': False,
         },
@@ -353,8 +919,7 @@ class Timer(GenericSensor):
         self.data = {'Timer': 0}
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         self.data['Timer'] = self.raw_data['Timer'][-1]
 
 
@@ -367,7 +932,7 @@ class Batteries(GenericSensor):
             'start': 0,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x*3.3/4096*4.030,  # Volt
+            'conversion': Conversion(scale=3.3/4096*4.030),  # Volt
             'byte_order': 'little',
             'signed': False,
         },
@@ -375,7 +940,7 @@ class Batteries(GenericSensor):
             'start': 2,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x*3.3/4096*2.786,  # Volt
+            'conversion': Conversion(scale=3.3/4096*2.786),  # Volt
             'byte_order': 'little',
             'signed': False,
         },
@@ -391,8 +956,7 @@ class Batteries(GenericSensor):
         self.data = {field: 0 for field in self.fields.keys()}
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
 
@@ -409,7 +973,7 @@ class ICM20602(GenericSensor):
             'start': 0,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x/2048.,  # g
+            'conversion': Conversion(scale=1/2048.),  # g
             'byte_order': 'big',
             'signed': True,
         },
@@ -417,7 +981,7 @@ class ICM20602(GenericSensor):
             'start': 2,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/2048.,  # g
+            'conversion': Conversion(scale=1/2048.),  # g
             'byte_order': 'big',
             'signed': True,
         },
@@ -425,7 +989,7 @@ class ICM20602(GenericSensor):
             'start': 4,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/2048.,  # g
+            'conversion': Conversion(scale=1/2048.),  # g
             'byte_order': 'big',
             'signed': True,
         },
@@ -433,7 +997,7 @@ class ICM20602(GenericSensor):
             'start': 6,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/326.8 + 25,  # °C
+            'conversion': Conversion(scale=1/326.8, offset=25),  # °C
             'byte_order': 'big',
             'signed': True,
         },
@@ -441,7 +1005,7 @@ class ICM20602(GenericSensor):
             'start': 8,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/32.8,  # dps
+            'conversion': Conversion(scale=1/32.8),  # dps
             'byte_order': 'big',
             'signed': True,
         },
@@ -449,7 +1013,7 @@ class ICM20602(GenericSensor):
             'start': 10,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/32.8,  # dps
+            'conversion': Conversion(scale=1/32.8),  # dps
             'byte_order': 'big',
             'signed': True,
         },
@@ -457,7 +1021,7 @@ class ICM20602(GenericSensor):
             'start': 12,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/32.8,  # dps
+            'conversion': Conversion(scale=1/32.8),  # dps
             'byte_order': 'big',
             'signed': True,
         },
@@ -475,9 +1039,6 @@ class ICM20602(GenericSensor):
         self.is_acc_graph_init = False
         self.is_gyro_graph_init = False
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
-
 
 class BMP280(GenericSensor):
     """ Pressure sensor
@@ -490,7 +1051,7 @@ class BMP280(GenericSensor):
             'start': 0,
             'size': 4,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x/100.,  # °C
+            'conversion': Conversion(scale=1/100.),  # °C
             'byte_order': 'little',
             'signed': True,
         },
@@ -498,7 +1059,7 @@ class BMP280(GenericSensor):
             'start': 4,
             'size': 4,
             'type': 'int',
-            'conversion_function': lambda x: x/256.,  # Pa
+            'conversion': Conversion(scale=1/256.),  # Pa
             'byte_order': 'little',
             'signed': True,
         },
@@ -511,39 +1072,49 @@ class BMP280(GenericSensor):
         self.reset()
     
     def reset(self):
-        self.data = {}
-        self.data['Pressure hPa'] = []
-        self.data['Altitude'] = []
         self.set_default_values()
         self.reference_pressure = None
+        # Computed from the raw values when they are read
+        self.data = {}
+        self.data['Pressure hPa'] = DerivedChannel(lambda p: p/100., self.raw_data['Pressure'])
+        self.data['Altitude'] = DerivedChannel(
+            lambda T, p: self.altitude(T, p, self.reference_pressure),
+            self.raw_data['Temperature'], self.raw_data['Pressure'])
         self.is_pressure_graph_init = False
         self.is_altitude_graph_init = False
     
     def set_reference(self):
         if len(self.raw_data['Pressure']) > 1:
             self.reference_pressure = self.raw_data['Pressure'][-1]
+            # The whole history is computed again with the new reference
+            self.data['Altitude'].invalidate()
             print('BMP reference set')
     
     def altitude(self, T, p, p0):
-        # Hypsometric formula
-        if p > 0.:
-            h = ( pow(p0/p, 1/5.257) - 1) * (T + 273.15) / 0.0065
-        else:
-            h = 0
-        return h
+        """ Hypsometric formula
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
-        self.data['Pressure hPa'].append(self.raw_data['Pressure'][-1]/100.)
+        Parameters
+        ----------
+        T: float or numpy array
+            temperature in °C
+        p: float or numpy array
+            pressure in Pa
+        p0: float
+            reference pressure in Pa. The altitude is 0 if it is None
 
-        if self.reference_pressure is None:
-            self.data['Altitude'].append(0)
-        else:
-            T = self.raw_data['Temperature'][-1]
-            p = self.raw_data['Pressure'][-1]
-            p0 = self.reference_pressure
-            h = self.altitude(T, p, p0)
-            self.data['Altitude'].append(h)
+        Returns
+        -------
+        h: numpy array
+            altitude above the reference in m, 0 where the pressure is not positive
+
+        """
+        p = np.asarray(p, dtype=np.float64)
+        if p0 is None:
+            return np.zeros(p.shape)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            h = (np.power(p0/p, 1/5.257) - 1) * (np.asarray(T) + 273.15) / 0.0065
+        return np.where(p > 0., h, 0.)
 
 
 class LIS3MDLTR(GenericSensor):
@@ -555,7 +1126,7 @@ class LIS3MDLTR(GenericSensor):
             'start': 0,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x/6842.,  # Gauss
+            'conversion': Conversion(scale=1/6842.),  # Gauss
             'byte_order': 'big',
             'signed': True,
         },
@@ -563,7 +1134,7 @@ class LIS3MDLTR(GenericSensor):
             'start': 2,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/6842.,  # Gauss
+            'conversion': Conversion(scale=1/6842.),  # Gauss
             'byte_order': 'big',
             'signed': True,
         },
@@ -571,7 +1142,7 @@ class LIS3MDLTR(GenericSensor):
             'start': 4,
             'size': 2,
             'type': 'int',
-            'conversion_function': lambda x: x/6842.,  # Gauss
+            'conversion': Conversion(scale=1/6842.),  # Gauss
             'byte_order': 'big',
             'signed': True,
         },
@@ -587,9 +1158,6 @@ class LIS3MDLTR(GenericSensor):
         self.data = {}
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
-
 
 class ABP(GenericSensor):
     """ Pressure Sensor
@@ -602,7 +1170,9 @@ class ABP(GenericSensor):
             'start': 0,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: (x - 1638.) / (14747. - 1638.) * 5. * 34474.,  # Pa
+            # Transfer function: (x - 1638)/(14747 - 1638)*5 psi
+            'conversion': Conversion(scale=5.*34474./(14747. - 1638.),
+                                     offset=-1638.*5.*34474./(14747. - 1638.)),  # Pa
             'byte_order': 'big',
             'signed': False,
         },
@@ -615,30 +1185,19 @@ class ABP(GenericSensor):
         self.reset()
     
     def reset(self):
-        self.data = {}
-        self.data['Pressure hPa'] = []
-        self.data['Air speed'] = []
         self.set_default_values()
+        # Computed from the raw values when they are read
+        self.data = {}
+        self.data['Pressure hPa'] = DerivedChannel(lambda p: p/100., self.raw_data['Pressure'])
+        self.data['Air speed'] = DerivedChannel(self.flow_velocity, self.raw_data['Pressure'])
         self.is_pressure_graph_init = False
         self.is_speed_graph_init = False
 
     def flow_velocity(self, pressure):
         rho = 1.2754 #  kg/m^3, IUPAC  0°C 100kPa
-        try:
-            if pressure > 0:
-                u = math.sqrt(2*(pressure)/rho)
-            else:
-                u = 0
-        except:
-            u = 0
-        return u
-
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
-        self.data['Pressure hPa'].append(self.raw_data['Pressure'][-1]/100.)
-        pressure = self.raw_data['Pressure'][-1]
-        air_speed = self.flow_velocity(pressure)
-        self.data['Air speed'].append(air_speed)
+        pressure = np.asarray(pressure, dtype=np.float64)
+        # 0 where the pressure is not positive
+        return np.sqrt(np.where(pressure > 0., 2*pressure/rho, 0.))
 
 
 class GPS(GenericSensor):
@@ -652,7 +1211,7 @@ class GPS(GenericSensor):
             'start': 0,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -660,7 +1219,7 @@ class GPS(GenericSensor):
             'start': 4,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -668,7 +1227,7 @@ class GPS(GenericSensor):
             'start': 8,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -676,7 +1235,7 @@ class GPS(GenericSensor):
             'start': 12,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -684,7 +1243,7 @@ class GPS(GenericSensor):
             'start': 16,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -692,7 +1251,7 @@ class GPS(GenericSensor):
             'start': 20,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -700,7 +1259,7 @@ class GPS(GenericSensor):
             'start': 24,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
@@ -708,36 +1267,27 @@ class GPS(GenericSensor):
             'start': 28,
             'size': 4,  # Byte
             'type': 'float',
-            'conversion_function': lambda x: x,
-            'byte_order': 'little',
-            'signed': True,
-        },
-        'Fix_Validity': {
-            'start': 32,
-            'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: x & 1,
+            'conversion': Conversion(),
             'byte_order': 'little',
             'signed': True,
         },
-        'Fix_Quality': {
+        'Fix': {
             'start': 32,
             'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 0x06) >> 1,
+            'type': 'bitfield',
+            'conversion': Conversion(),
             'byte_order': 'little',
-            'signed': True,
-        },
-        'Fix_Status': {
-            'start': 32,
-            'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 0x18) >> 3,
-            'byte_order': 'big',
-            'signed': True,
+            'signed': False,
+            'flags': {
+                'Fix_Validity': 0x01,
+                'Fix_Quality': 0x06,
+                'Fix_Status': 0x18,
+            },
         },
     }
     sample_size = 33
+    # Names of the coordinates in NMEA format in self.data
+    nmea_fields = {'Latitude': 'Latitude_NMEA', 'Longitude': 'Longitude_NMEA'}
 
     def __init__(self, start_position, **kwargs):
         super().__init__(start_position, self.fields, self.sample_size, **kwargs)
@@ -745,23 +1295,78 @@ class GPS(GenericSensor):
         self.reset()
 
     def reset(self):
-        self.data = {field: [0] for field in self.fields.keys()}
-        self.data['Distance'] = [0]
-        self.data['Bearing'] = [0]
-        self.data['Bearing_rad'] = [0]
-        self.reference_coord = None
         self.set_default_values()
+        self.reference_coord = None
+
+        # Computed from the raw values when they are read. The coordinates are received in
+        # NMEA format
+        raw = self.raw_data
+        self.data = {self.nmea_fields.get(field, field): raw[field] for field in self.fields.keys()}
+        for flag, (field, mask, shift) in self.flags.items():
+            self.data[flag] = DerivedChannel(
+                lambda value, mask=mask, shift=shift: (value & mask) >> shift, raw[field])
+
+        self.data['Latitude'] = DerivedChannel(self.decimal_degrees, raw['Latitude'])
+        self.data['Longitude'] = DerivedChannel(self.decimal_degrees, raw['Longitude'])
+        self.data['Distance'] = DerivedChannel(self.distance, raw['Latitude'], raw['Longitude'])
+        self.data['Bearing'] = DerivedChannel(self.compass_bearing, raw['Latitude'], raw['Longitude'])
+        # Used in the polar plot
+        self.data['Bearing_rad'] = DerivedChannel(
+            lambda lat, lon: np.radians(self.compass_bearing(lat, lon)),
+            raw['Latitude'], raw['Longitude'])
         self.is_graph_init = False
     
     def set_reference(self):
-        if len(self.data['Latitude']) > 1 and len(self.data['Longitude']) > 1:
+        if len(self.raw_data['Latitude']) > 0:
             self.reference_coord = (self.data['Latitude'][-1], self.data['Longitude'][-1])
+            # The whole history is computed again with the new reference
+            for field in ('Distance', 'Bearing', 'Bearing_rad'):
+                self.data[field].invalidate()
             print('GPS reference set')
+
+    @staticmethod
+    def decimal_degrees(nmea):
+        """ Convert coordinates from NMEA DDMM.MMMM format to decimal degrees
+
+        Parameters
+        ----------
+        nmea: float or numpy array
+            coordinates in DDMM.MMMM format
+
+        Returns
+        -------
+        dd: numpy array
+            coordinates in decimal degrees, NaN for infinite values
+
+        """
+        nmea = np.asarray(nmea, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            degrees = np.trunc(nmea/100.)
+            return (nmea - degrees*100)/60. + degrees
+
+    def distance(self, latitude, longitude):
+        """ Distance from the reference, 0 if it is not set. Coordinates are in NMEA format
+
+        """
+        latitude = self.decimal_degrees(latitude)
+        if self.reference_coord is None:
+            return np.zeros(latitude.shape)
+        return self.distance_haversine(self.reference_coord, (latitude, self.decimal_degrees(longitude)))
+
+    def compass_bearing(self, latitude, longitude):
+        """ Bearing from the reference, 0 if it is not set. Coordinates are in NMEA format
+
+        """
+        latitude = self.decimal_degrees(latitude)
+        if self.reference_coord is None:
+            return np.zeros(latitude.shape)
+        return self.bearing(self.reference_coord, (latitude, self.decimal_degrees(longitude)))
     
     def distance_haversine(self, coord1, coord2):
         """ Compute the distance between two GPS points
 
-        Coordinates must be in decimal degrees format
+        Coordinates must be in decimal degrees format. They can be numpy arrays to compute
+        many distances at once
 
         Parameters
         ----------
@@ -772,7 +1377,7 @@ class GPS(GenericSensor):
 
         Returns
         -------
-        d : float
+        d : float or numpy array
             distance between the two points
 
         """
@@ -780,15 +1385,15 @@ class GPS(GenericSensor):
         lat1, lon1 = coord1
         lat2, lon2 = coord2
         
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2) 
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
+        phi1 = np.radians(lat1)
+        phi2 = np.radians(lat2) 
+        dphi = np.radians(lat2 - lat1)
+        dlambda = np.radians(lon2 - lon1)
         
-        a = math.sin(dphi/2)**2 + \
-            math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
+        a = np.sin(dphi/2)**2 + \
+            np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
 
-        c = 2*math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        c = 2*np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
         d = R*c
         
@@ -807,130 +1412,81 @@ class GPS(GenericSensor):
             Latitude and longitude must be in decimal degrees
         coord2: (float, float) 
             tuple representing the latitude/longitude for the second point
-            Latitude and longitude must be in decimal degrees
+            Latitude and longitude must be in decimal degrees. They can be numpy arrays
         
         Returns
         -------
-        compass_bearing : float
+        compass_bearing : float or numpy array
             bearing in degrees
 
         """
         lat1, lon1 = coord1
         lat2, lon2 = coord2
 
-        lat1 = math.radians(lat1)
-        lat2 = math.radians(lat2)
+        lat1 = np.radians(lat1)
+        lat2 = np.radians(lat2)
 
-        diffLong = math.radians(lon2 - lon1)
+        diffLong = np.radians(lon2 - lon1)
 
-        x = math.sin(diffLong) * math.cos(lat2)
-        y = math.cos(lat1) * math.sin(lat2) - (math.sin(lat1)
-                * math.cos(lat2) * math.cos(diffLong))
+        x = np.sin(diffLong) * np.cos(lat2)
+        y = np.cos(lat1) * np.sin(lat2) - (np.sin(lat1)
+                * np.cos(lat2) * np.cos(diffLong))
 
-        initial_bearing = math.atan2(x, y)
+        initial_bearing = np.arctan2(x, y)
 
-        # Now we have the initial bearing but math.atan2 return values
+        # Now we have the initial bearing but np.arctan2 return values
         # from -180° to + 180° which is not what we want for a compass bearing
         # The solution is to normalize the initial bearing as shown below
-        initial_bearing = math.degrees(initial_bearing)
+        initial_bearing = np.degrees(initial_bearing)
         compass_bearing = (initial_bearing + 360) % 360
 
         return compass_bearing
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
-
-        for field in self.fields.keys():
-            self.data[field].append(self.raw_data[field][-1])
-        
-        lat = self.data['Latitude'][-1]
-        try:
-            self.data['Latitude'][-1] = (lat-int(lat/100.)*100)/60. + int(lat/100.) # Decimal degrees
-        except:
-            self.data['Latitude'][-1] = float('nan')
-        
-        lon = self.data['Longitude'][-1]
-        try:
-            self.data['Longitude'][-1] = (lon-int(lon/100.)*100)/60. + int(lon/100.) # Decimal degrees
-        except:
-            self.data['Latitude'][-1] = float('nan')
 
-        # Just add 0 if the reference coordinates are not set
-        if self.reference_coord is None:
-            self.data['Distance'].append(0)
-            self.data['Bearing'].append(0)
-            self.data['Bearing_rad'].append(0)
-        else:
-            current_coord = (self.data['Latitude'][-1], self.data['Longitude'][-1])
-
-            distance = self.distance_haversine(self.reference_coord, current_coord)
-            bearing = self.bearing(self.reference_coord, current_coord)
-            
-            self.data['Distance'].append(distance)
-            self.data['Bearing'].append(bearing)
-            # Used in the polar plot
-            self.data['Bearing_rad'].append(math.radians(bearing))
-
-
-class Sigmundr:
+# Sensors present in every frame
+SIGMUNDR_COMMON = ['rtc', 'errmsg', 'status', 'timer', 'batteries', 'imu2', 'bmp2', 'bmp3', 'mag', 'pitot']
+
+SIGMUNDR = register_schema(VehicleSchema(
+    name='Sigmundr',
+    sensors={
+        'status': {'class': Status, 'start': 1},
+        'errmsg': {'class': ErrMsg, 'start': 3},
+        'rtc': {'class': RTC, 'start': 4, 'is_rtc': True},
+        'timer': {'class': Timer, 'start': 8},
+        'batteries': {'class': Batteries, 'start': 12},
+        'imu2': {'class': ICM20602, 'start': 16},
+        'bmp2': {'class': BMP280, 'start': 72},
+        'bmp3': {'class': BMP280, 'start': 80},
+        'mag': {'class': LIS3MDLTR, 'start': 88},
+        'pitot': {'class': ABP, 'start': 92},
+        'gps': {'class': GPS, 'start': 100},
+    },
+    frames={
+        (0x01, 96): SIGMUNDR_COMMON,
+        (0x02, 136): SIGMUNDR_COMMON + ['gps'],
+        # Frames 0x01 with 136 bytes and 0x02 with 96 bytes are decoded as 0x01
+        (0x01, 136): SIGMUNDR_COMMON,
+        (0x02, 96): SIGMUNDR_COMMON,
+    },
+))
+
+
+class Sigmundr(Vehicle):
     """ Extract data from a Telemetry frame received from Sigmundr
 
+    Parameters
+    ----------
+    capacity: int
+        (optional) maximum number of samples kept in the history of each sensor
+
     """
 
-    def __init__(self):
-        self.status = Status(1)
-        self.errmsg = ErrMsg(3)
-        self.rtc = RTC(4, is_rtc=True)
-        self.timer = Timer(8)
-        self.batteries = Batteries(12)
-        self.imu2 = ICM20602(16)
-        self.bmp2 = BMP280(72)
-        self.bmp3 = BMP280(80)
-        self.mag = LIS3MDLTR(88)
-        self.pitot = ABP(92)
-        self.gps = GPS(100)
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        super().__init__(SIGMUNDR, capacity)
 
         self.time_interval = 30 #s
         self.update_plot = True
 
-    def update_sensors(self, frame):
-        if len(frame) > 0:
-            if frame[0] == 0x01 or frame[0] == 0x02:
-                if len(frame) == 96 or len(frame) == 136:
-                    self.rtc.update_data(frame)
-                    frame_time = self.rtc.data['Time']
-                    self.errmsg.update_data(frame, frame_time)
-                    self.status.update_data(frame, frame_time)
-                    self.timer.update_data(frame, frame_time)
-                    self.batteries.update_data(frame, frame_time)
-                    self.imu2.update_data(frame, frame_time)
-                    self.bmp2.update_data(frame, frame_time)
-                    self.bmp3.update_data(frame, frame_time)
-                    self.mag.update_data(frame, frame_time)
-                    self.pitot.update_data(frame, frame_time)
-
-            if frame[0] == 0x02:
-                if len(frame) == 136:
-                    self.gps.update_data(frame, frame_time)
-    
-    def reset(self):
-        self.errmsg.reset()
-        self.status.reset()
-        self.rtc.reset()
-        self.timer.reset()
-        self.batteries.reset()
-        self.imu2.reset()
-        self.bmp2.reset()
-        self.bmp3.reset()
-        self.mag.reset()
-        self.pitot.reset()
-        self.gps.reset()
-    
-    def set_reference(self):
-        self.gps.set_reference()
-        self.bmp2.set_reference()
-        self.bmp3.set_reference()
-
 
 # ######################################## #
 #      Sensors for Launchpad Control       #
@@ -939,43 +1495,25 @@ class Sigmundr:
 
 class LaunchpadStatus(GenericSensor):
     fields = {
-        'IS_OUTPUT1_EN': {
-            'start': 0,
-            'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<1) >> 1,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'IS_OUTPUT2_EN': {
-            'start': 0,
-            'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<2) >> 2,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'IS_OUTPUT3_EN': {
+        'OUTPUTS': {
             'start': 0,
             'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<3) >> 3,
-            'byte_order': 'big',
-            'signed': False,
-        },
-        'IS_OUTPUT4_EN': {
-            'start': 0,
-            'size': 1,  # Byte
-            'type': 'int',
-            'conversion_function': lambda x: (x & 1<<4) >> 4,
+            'type': 'bitfield',
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
+            'flags': {
+                'IS_OUTPUT1_EN': 1<<1,
+                'IS_OUTPUT2_EN': 1<<2,
+                'IS_OUTPUT3_EN': 1<<3,
+                'IS_OUTPUT4_EN': 1<<4,
+            },
         },
         'SERVO1_ANGLE': {
             'start': 1,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
         },
@@ -983,7 +1521,7 @@ class LaunchpadStatus(GenericSensor):
             'start': 2,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
         },
@@ -991,7 +1529,7 @@ class LaunchpadStatus(GenericSensor):
             'start': 3,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': False,
         },
@@ -1004,12 +1542,11 @@ class LaunchpadStatus(GenericSensor):
         self.reset()
     
     def reset(self):
-        self.data = {field: 0 for field in self.fields.keys()}
+        self.data = SensorData(self.flags, {field: 0 for field in self.fields.keys()})
         self.data['IS_TM_ENABLED'] = 1
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
 
@@ -1020,7 +1557,7 @@ class RSSI(GenericSensor):
             'start': 0,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': True,
         },
@@ -1028,7 +1565,7 @@ class RSSI(GenericSensor):
             'start': 1,
             'size': 1,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': True,
         },
@@ -1044,8 +1581,7 @@ class RSSI(GenericSensor):
         self.data = {field: 0 for field in self.fields.keys()}
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
 
@@ -1056,7 +1592,7 @@ class Battery(GenericSensor):
             'start': 0,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': True,
         },
@@ -1064,12 +1600,18 @@ class Battery(GenericSensor):
             'start': 2,
             'size': 2,  # Byte
             'type': 'int',
-            'conversion_function': lambda x: x,
+            'conversion': Conversion(),
             'byte_order': 'big',
             'signed': True,
         },
     }
     sample_size = 4
+    # {name: (raw field, conversion)}
+    calibrations = {
+        # Hardcoded calibration Updated: 20/9-2020
+        'BAT1_VOLTAGE': ('BAT1_RAW', Conversion(polynomial=(2.555e-5, -0.0835, 81.83))),
+        'BAT2_VOLTAGE': ('BAT2_RAW', Conversion(polynomial=(8.885e-6, -0.0316, 34.780))),
+    }
 
     def __init__(self, start_position, **kwargs):
         super().__init__(start_position, self.fields, self.sample_size, **kwargs)
@@ -1082,30 +1624,74 @@ class Battery(GenericSensor):
         self.data['BAT2_VOLTAGE'] = 0
         self.set_default_values()
 
-    def update_data(self, frame, frame_time=None):
-        self.update_raw_data(frame, frame_time)
+    def update_values(self, count=1):
         for field in self.fields.keys():
             self.data[field] = self.raw_data[field][-1]
-        bat1_raw = self.data['BAT1_RAW']
-        self.data['BAT1_VOLTAGE'] = 2.555e-5 * bat1_raw ** 2 - 0.0835 * bat1_raw + 81.83 # Hardcoded calibration Updated: 20/9-2020
-        bat2_raw = self.data['BAT2_RAW']
-        self.data['BAT2_VOLTAGE'] = 8.885e-6 * bat2_raw ** 2 - 0.0316 * bat2_raw + 34.780# Hardcoded calibration Updated: 20/9-2020
+        for name, (field, conversion) in self.calibrations.items():
+            self.data[name] = conversion(self.data[field])
 
 
-class LaunchpadControl:
-    def __init__(self):
-        self.status = LaunchpadStatus(0)
-        self.battery = Battery(4)
-        self.rssi = RSSI(8)
-    
-    def update_sensors(self, frame):
-        if len(frame) == 10:
-            time = datetime.datetime.now().time()
-            self.status.update_data(frame, frame_time=time)
-            self.battery.update_data(frame, frame_time=time)
-            self.rssi.update_data(frame, frame_time=time)
-    
-    def reset(self):
-        self.status.reset()
-        self.battery.reset()
-        self.rssi.reset()
+LAUNCHPAD_CONTROL = register_schema(VehicleSchema(
+    name='LaunchpadControl',
+    sensors={
+        'status': {'class': LaunchpadStatus, 'start': 0},
+        'battery': {'class': Battery, 'start': 4},
+        'rssi': {'class': RSSI, 'start': 8},
+    },
+    frames={
+        # No frame ID
+        (None, 10): ['status', 'battery', 'rssi'],
+    },
+))
+
+
+class LaunchpadControl(Vehicle):
+    """ Extract data from a frame received from the Launchpad Controller
+
+    The Launchpad Controller has no RTC, the frames are time stamped with the time they
+    are received
+
+    Parameters
+    ----------
+    capacity: int
+        (optional) maximum number of samples kept in the history of each sensor
+
+    """
+
+    # Command IDs of the outputs and servos, the commands are [0x26, 0x63, ID, value]
+    output_commands = {0x61: 'OUTPUT1', 0x62: 'OUTPUT2', 0x63: 'OUTPUT3', 0x64: 'OUTPUT4'}
+    servo_commands = {0x6A: 'SERVO1', 0x6B: 'SERVO2', 0x6C: 'SERVO3'}
+    ping_command = 0xFF
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        super().__init__(LAUNCHPAD_CONTROL, capacity)
+
+    def command_effect(self, command):
+        """ Describe how a command shows in the status frames, see Vehicle.command_effect()
+
+        An output command is applied when the IS_OUTPUTn_EN flag has the requested value,
+        a servo command when the angle is reached
+
+        A ping changes nothing in the status frames: it is matched by the first status frame
+        received after it is written, which may have been sent before the ping arrived. Its
+        latency is the wait for the next status frame, bounded by the status period, and
+        not a round trip
+
+        """
+        if len(command) != 4 or command[:2] != b'\x26\x63':
+            return None, None
+        command_id, value = command[2], command[3]
+
+        if command_id in self.output_commands:
+            name = self.output_commands[command_id]
+            flag = 'IS_{}_EN'.format(name)
+            return name, lambda vehicle: bool(vehicle.status.data[flag]) == bool(value)
+        if command_id in self.servo_commands:
+            name = self.servo_commands[command_id]
+            field = '{}_ANGLE'.format(name)
+            return name, lambda vehicle: vehicle.status.data[field] == value
+        if command_id == self.ping_command:
+            # Nothing to match: any status frame
+            return 'PING', lambda vehicle: True
+
+        return None, None
@@ -3,13 +3,47 @@ Class to read and write data from and to a serial connection
 
 """
 
-import datetime
+import json
 import os
+import queue
+import select
+import threading
 import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, expanduser, join
 
 import serial
 import serial.tools.list_ports
 
+from utils.replay import LogReplay, ReplayClock
+from utils.session import SessionReplay, is_session
+
+# Minimum number of bytes reserved in the buffer of the framer for each read
+READ_SIZE = 2048
+# Maximum number of reads waiting in the queue of the reader thread
+QUEUE_SIZE = 1024
+# Maximum time in seconds the reader thread waits for data before checking if it must stop
+READER_TIMEOUT = 0.1
+# Directory of the settings of the user
+CONFIG_DIRECTORY = join(
+    os.environ.get('XDG_CONFIG_HOME') or os.environ.get('APPDATA') or join(expanduser('~'), '.config'),
+    'ground-control')
+# File where the identity of the ports of the devices found is saved
+PORT_CACHE_PATH = join(CONFIG_DIRECTORY, 'ports.json')
+# Maximum time in seconds to wait for the answer of the device when a port is probed
+PROBE_TIMEOUT = 2
+# Same for the port where the device was found the last time, the other ports are probed
+# if it does not answer
+CACHED_PROBE_TIMEOUT = 1
+# Time in seconds without data the RFD900 needs before and after "+++" to enter AT command
+# mode. The probes always wait for it, whatever their timeout
+AT_GUARD_TIME = 1
+# Maximum time in seconds the replay of a file waits before checking its clock again
+REPLAY_TIMEOUT = 0.1
+# Number of frames of a file returned at once when it is replayed as fast as possible
+FAST_REPLAY_SIZE = 1000
+
 
 class SerialWrapper:
     """ Class to read and write data through a serial connection
@@ -28,6 +62,10 @@ class SerialWrapper:
     The priority order for optional parameters is `bonjour` > `rfd900` > `port` > `filepath`
     If more than one of them is given, the one with the highest priority will be used
 
+    The identity of the port where the device is found (VID, PID, serial number and USB
+    location) is saved in `PORT_CACHE_PATH`. The next searches try this port first, and the
+    link is reopened on it even if the name of the port has changed
+
     Parameters
     ----------
     baudrate : int
@@ -41,7 +79,7 @@ class SerialWrapper:
     port : string, optional
         port to open
     filepath : string, optional
-        path to the file to read
+        path to the file to read, a log or a session file (see utils.session)
     sensors : Sensors() instance, optional
         Sensors() instance to compute the time stamps from the file
 
@@ -53,6 +91,22 @@ class SerialWrapper:
         String with the content of the last error
     is_ready : bool
         True if the device is ready to use (ie boot have been completed)
+    state : str
+        state of the link: "CLOSED", "SEARCHING" for the device, "TESTING" the ports in
+        `testing`, "OPEN" or "FAILED". Cheap to poll from another thread
+    testing : set
+        ports being tested to find the device
+    framer : Framer instance
+        Framer used by readlines() to find the frames in the received bytes. If None,
+        the bytes are split on b'\r\n'. It counts the frames recovered and lost
+    frames : Queue instance
+        (host time, [bytes-like object, ]) for each read of the reader thread, see
+        start_reader()
+    nb_dropped : int
+        number of frames dropped by the reader thread because the queue was full
+    clock : ReplayClock instance
+        time of the replay of a file, to change its speed, replay it as fast as possible
+        or pause it
 
     Examples
     --------
@@ -66,6 +120,20 @@ class SerialWrapper:
     >>> line = s.readline()
     >>> s.close_serial()
 
+    >>> s = SerialWrapper(baudrate=57600, name="Telemetry", rfd900=True)
+    >>> s.open_link()
+    >>> s.start_reader()  # Read in a separate thread
+    >>> for host_time, frames in s.read_frames(timeout=1):
+    ...     print(host_time, frames)
+    >>> s.stop_reader()
+    >>> s.close_serial()
+
+    >>> s = SerialWrapper(baudrate=115200, name="Telemetry", filepath="./data/flight.log",
+    ...                   sensors=Sigmundr())
+    >>> s.clock.set_speed(10)  # Replay 10 times faster than real time
+    >>> s.open_link()
+    >>> s.seek_replay(60.)  # Replay from the frames 60 s after the first one
+
     """
     # Substring to look for in serial device description
     # Serial devices with no subtrings from `serial_desc_substrings` in their description will not
@@ -73,12 +141,19 @@ class SerialWrapper:
     # Use lower case
     serial_desc_substrings = ("usb", "ch340", "arduino")
 
+    # Instances waiting for their device to be searched, see __search()
+    search_condition = threading.Condition()
+    search_queue = []
+    is_searching = False
+
     def __init__(self, baudrate, name, bonjour="", rfd900=False, port="", filepath="", sensors=None):
         self.name = name
 
         self.failed = False
         self.error = ""
         self.is_ready = False
+        self.state = "CLOSED"
+        self.testing = set()
 
         if bonjour:
             self.mode = "BONJOUR"
@@ -102,13 +177,24 @@ class SerialWrapper:
         self.ser.baudrate = baudrate
         self.ser.timeout = 0.1
         self.buffer = bytearray()
+        self.framer = None
+
+        self.frames = queue.Queue(QUEUE_SIZE)
+        self.nb_dropped = 0
+        self.reader = None
+        self.is_reader_running = False
 
-        self.time_start_computer = 0
         self.time_start_obc = 0
-        self.lines_from_file = []
+        self.replay = None
         self.current_index = 0
+        # Time of the replay of a file, see seek_replay() to move it
+        self.clock = ReplayClock()
+        self.seek_time = None
 
         self.is_device_found = False
+        self.search_done = threading.Event()
+        # Set to cancel the search of the device, see open_link()
+        self.stop_search = threading.Event()
 
     def __get_safe_devices(self):
         """ Retrieve a list of available devices connected on the computer
@@ -135,105 +221,428 @@ class SerialWrapper:
 
         return safe_devices
 
-    def __auto_find_gateway(self):
-        """ Automatically find the right Gateway device among all the serial devices connected to the computer
+    def __probe_port(self, device, stop, timeout=PROBE_TIMEOUT):
+        """ Check if the device expected by this instance is connected on a port
 
-        `ser.port` is updated when the device is successfully found. It is set to None otherwise
+        The port is opened with its own Serial() instance so that many ports can be probed
+        at the same time. The probe gives up as soon as `stop` or `stop_search` is set
+
+        Parameters
+        ----------
+        device : str
+            port to probe
+        stop : Event instance
+            set when the device has been found on another port
+        timeout : float
+            (optional) maximum time in seconds to wait for the answer of the device. The
+            RFD900 always needs `AT_GUARD_TIME` before and after "+++"
 
         Returns
         -------
-        success : bool
-            True if the device is found
+        ser : Serial instance
+            the port, left open, if the device is found. None otherwise
 
         """
-        # Change the timeout value to 2 seconds and save the old value
-        # The timeout should be long enough to that the Gateway device can reset and send BONJOUR before the reading ends
-        timeout = self.ser.timeout
-        self.ser.timeout = 2
-        self.ser.port = None
+        stops = (stop, self.stop_search)
+        ser = serial.Serial()
+        ser.baudrate = self.ser.baudrate
+        ser.port = device
+        ser.timeout = 0.1
+        self.testing.add(device)
+        self.state = "TESTING"
 
-        found_device = False
+        try:
+            ser.open()
+            ser.reset_input_buffer()
+            ser.reset_output_buffer()
 
-        print("{} : Searching for available serial devices...".format(self.name))
+            if self.mode == "RFD900":
+                # Dirty but the RFD900 needs 1s with no data input before the "+++" to enter AT command mode
+                # In practice the port is unused before we open it so this pause is not really needed
+                # But just to be sure...
+                found = False
+                if not SerialWrapper.__wait_stop(stops, AT_GUARD_TIME):
+                    # Try to enter AT command mode
+                    ser.write('+++'.encode('utf-8'))
+                    # Wait one second and see the "OK" has been sent by the device
+                    is_stopped = SerialWrapper.__wait_stop(stops, AT_GUARD_TIME)
+                    lines = ser.read(ser.in_waiting).split(b'\r\n')
+                    # Exit AT command mode
+                    ser.write('ATO\r'.encode('utf-8'))
+                    found = b'OK' in lines and not is_stopped
+
+            elif self.mode == "BONJOUR":
+                ser.write('&gB0'.encode('utf-8'))
+                # The Gateway device can reset and send BONJOUR within 2 seconds
+                line = bytearray()
+                deadline = time.monotonic() + timeout
+                while (not line.endswith(b'\n') and time.monotonic() < deadline
+                       and not SerialWrapper.__wait_stop(stops)):
+                    line += ser.readline()
+                found = line.decode('utf-8', 'backslashreplace').replace('\r\n', "") == self.bonjour
 
-        # Check only devices that are expected to be Arduinos or alike
-        safe_devices = self.__get_safe_devices()
+            else:
+                found = False
 
-        if safe_devices:
-            print("These devices will be checked : {}".format(
-                ", ".join([p.description for p in safe_devices])))
+        except Exception:
+            found = False
 
-        else:
-            error = "No serial device found"
-            self.__fail_mode(error)
-            return False
+        self.testing.discard(device)
+        if not self.testing and self.state == "TESTING":
+            self.state = "SEARCHING"
 
-        if self.mode == "RFD900":
-            print("Searching for a RFD900 modem")
-            # Insert logic to identify RFD900 module here
-            for d in safe_devices:
-                self.ser.port = d.device
-                print("Testing : {}...".format(self.ser.port))
-
-                if self.__open_serial_port():  # If the connection cannot be oppened, no need to read from it
-                    # Dirty but the RFD900 needs 1s with no data input before the "+++" to enter AT command mode
-                    # In practice the port is unused before we open it so this pause is not really needed
-                    # But just to be sure...
-                    time.sleep(1)
-                    # Try to enter AT command mode
-                    self.write('+++', encode=True)
-                    # Wait one second and see the "OK" has been sent by the device
-                    time.sleep(1)
-                    lines = self.readlines()
-                    # Exit AT command mode
-                    self.write('ATO\r', encode=True)
+        if found:
+            return ser
 
-                    if b'OK' in lines:
-                        found_device = True
-                        break
+        try:
+            ser.close()
+        except Exception:
+            pass
+        return None
 
-                    else:
-                        self.close_serial()
+    @staticmethod
+    def __wait_stop(stops, timeout=0):
+        """ Wait until one of the events is set
 
-        elif self.mode == "BONJOUR":
-            print("Searching for a Gateway using the bonjour string : {}".format(
-                self.bonjour))
+        Parameters
+        ----------
+        stops : (Event, )
+            events to wait for
+        timeout : float
+            (optional) maximum time to wait in seconds
+
+        Returns
+        -------
+        bool
+            True if one of the events is set
+
+        """
+        deadline = time.monotonic() + timeout
+        while not any(stop.is_set() for stop in stops):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            stops[0].wait(min(remaining, 0.05))
+        return True
+
+    @staticmethod
+    def find_devices(*wrappers):
+        """ Find the devices of many SerialWrapper instances in one pass
+
+        All the serial devices are probed at the same time. The devices are probed for each
+        instance in turn, the instances are given the first port that matches and the other
+        probes for the same instance are stopped. The ports are left open
+
+        The port saved in the port cache for an instance is probed alone first, with a shorter
+        timeout. If the device does not answer, eg. because the adapters have been swapped,
+        all the ports are probed
 
-            for d in safe_devices:
-                self.ser.port = d.device
-                print("Testing : {}...".format(self.ser.port))
+        Instances that are not in RFD900 or BONJOUR mode, or whose device is already found,
+        are ignored. The search of an instance is cancelled when its `stop_search` event is
+        set: its probes give up and its port is not opened
 
-                if self.__open_serial_port():  # If the connection cannot be oppened, no need to read from it
-                    self.write('&gB0', encode=True)
-                    line = self.readline(decode=True)
+        Parameters
+        ----------
+        wrappers : SerialWrapper instances
+            instances to find the device of
+
+        Returns
+        -------
+        found : [bool, ]
+            True for each instance whose device is found
+
+        """
+        searching = [w for w in wrappers if isinstance(w, SerialWrapper)
+                     and w.mode in ["RFD900", "BONJOUR"] and not w.is_device_found]
+        for w in list(searching):
+            if w.stop_search.is_set():
+                w.__cancel_search()
+                searching.remove(w)
+        if not searching:
+            return [getattr(w, "is_device_found", False) for w in wrappers]
+
+        for w in searching:
+            w.state = "SEARCHING"
+            print("{} : Searching for available serial devices...".format(w.name))
+
+        # Check only devices that are expected to be Arduinos or alike
+        safe_devices = searching[0].__get_safe_devices()
 
-                    if line == self.bonjour:
-                        found_device = True
-                        break
+        if safe_devices:
+            print("These devices will be checked : {}".format(
+                ", ".join([p.description for p in safe_devices])))
 
-                    else:
-                        self.close_serial()
+        else:
+            for w in searching:
+                w.__fail_mode("No serial device found")
+            return [getattr(w, "is_device_found", False) for w in wrappers]
+
+        ports = {}
+
+        # Try the ports where the devices were found the last time first
+        cache = SerialWrapper.__load_port_cache()
+        for w in list(searching):
+            d = w.__cached_device(safe_devices, cache)
+            if d is None:
+                continue
+            print("{} : Testing last port : {}...".format(w.name, d.device))
+            ser = w.__probe_port(d.device, threading.Event(), timeout=CACHED_PROBE_TIMEOUT)
+            if ser is not None:
+                ports[w] = ser
+                searching.remove(w)
+                safe_devices.remove(d)
+
+        stops = {w: threading.Event() for w in searching}
+        lock = threading.Lock()
+
+        def probe(device):
+            # A port is probed by one instance at a time
+            for w in searching:
+                if stops[w].is_set() or w.stop_search.is_set():
+                    continue
+                print("{} : Testing : {}...".format(w.name, device))
+                ser = w.__probe_port(device, stops[w])
+                if ser is None:
+                    continue
+                with lock:
+                    if not stops[w].is_set():
+                        stops[w].set()
+                        ports[w] = ser
+                        return
+                ser.close()
+
+        if searching and safe_devices:
+            with ThreadPoolExecutor(max_workers=len(safe_devices)) as executor:
+                for d in safe_devices:
+                    executor.submit(probe, d.device)
+
+        for w in wrappers:
+            if w in stops or w in ports:
+                if w.stop_search.is_set():
+                    w.__cancel_search(ports.get(w))
+                    continue
+                w.__use_port(ports.get(w))
+                if w in ports:
+                    w.__save_port(cache)
+
+        return [getattr(w, "is_device_found", False) for w in wrappers]
+
+    def __use_port(self, ser):
+        """ Use the port found by find_devices()
 
-        self.ser.timeout = timeout  # Restore the previous value
+        Parameters
+        ----------
+        ser : Serial instance
+            open port of the device, None if the device is not found
 
-        if found_device:
+        """
+        if ser is not None:
+            ser.timeout = self.ser.timeout
+            self.ser = ser
+            self.buffer = bytearray()
+            if self.framer is not None:
+                self.framer.clear()
             self.__safe_mode()
             self.is_ready = True
             self.is_device_found = True
+            self.state = "OPEN"
             print("{} : Found device on port : {}".format(
                 self.name, self.ser.port))
-            
-            return True
-        
+
         else:
+            self.ser.port = None
             error_msg = "Failed to find device"
             self.__fail_mode(error_msg)
             self.is_ready = False
             self.is_device_found = False
             self.port = None
-            
-            
-            return False
+
+    def __cancel_search(self, ser=None):
+        """ Close the port found by a cancelled search
+
+        Parameters
+        ----------
+        ser : Serial instance
+            (optional) port found by find_devices()
+
+        """
+        if ser is not None:
+            try:
+                ser.close()
+            except Exception:
+                pass
+        self.testing.clear()
+        self.state = "CLOSED"
+        print("{} : search cancelled".format(self.name))
+
+    @staticmethod
+    def __load_port_cache():
+        """ Read the identity of the ports saved in `PORT_CACHE_PATH`
+
+        Returns
+        -------
+        cache : dict
+            {key of the instance: identity of the port}. Empty if the file cannot be read
+
+        """
+        try:
+            with open(PORT_CACHE_PATH, 'r') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    @staticmethod
+    def __port_identity(port_info):
+        """ Return what identifies the USB adapter of a port, whatever the port name
+
+        Parameters
+        ----------
+        port_info : ListPortInfo instance
+            port as returned by serial.tools.list_ports.comports()
+
+        Returns
+        -------
+        identity : dict
+            VID, PID, serial number and USB location of the adapter
+
+        """
+        return {
+            'vid': port_info.vid,
+            'pid': port_info.pid,
+            'serial_number': port_info.serial_number,
+            'location': port_info.location,
+        }
+
+    def __cache_key(self):
+        """ Key of the device of this instance in the port cache
+
+        """
+        return "{}:{}".format(self.mode, self.bonjour)
+
+    def __cached_device(self, devices, cache=None):
+        """ Find the port where the device was found the last time
+
+        Parameters
+        ----------
+        devices : [ListPortInfo, ]
+            ports to look into
+        cache : dict
+            (optional) content of the port cache, read from `PORT_CACHE_PATH` if not given
+
+        Returns
+        -------
+        port_info : ListPortInfo instance
+            port with the same identity as the last time, None if there is none
+
+        """
+        if cache is None:
+            cache = SerialWrapper.__load_port_cache()
+        identity = cache.get(self.__cache_key())
+        if not identity or identity.get('vid') is None:
+            return None
+
+        for d in devices:
+            if SerialWrapper.__port_identity(d) == identity:
+                return d
+        return None
+
+    def __save_port(self, cache=None):
+        """ Save the identity of the current port in `PORT_CACHE_PATH`
+
+        Parameters
+        ----------
+        cache : dict
+            (optional) content of the port cache, read from `PORT_CACHE_PATH` if not given
+
+        """
+        if cache is None:
+            cache = SerialWrapper.__load_port_cache()
+
+        for d in serial.tools.list_ports.comports():
+            if d.device == self.ser.port:
+                cache[self.__cache_key()] = SerialWrapper.__port_identity(d)
+                break
+        else:
+            return
+
+        try:
+            os.makedirs(dirname(PORT_CACHE_PATH), exist_ok=True)
+            # Write then rename so that the file is never left half written
+            path = '{}.{}.tmp'.format(PORT_CACHE_PATH, os.getpid())
+            with open(path, 'w') as file:
+                json.dump(cache, file, indent=4)
+            os.replace(path, PORT_CACHE_PATH)
+        except OSError:
+            pass
+
+    def __auto_find_gateway(self):
+        """ Automatically find the right Gateway device among all the serial devices connected to the computer
+
+        `ser.port` is updated when the device is successfully found. It is set to None otherwise
+
+        Returns
+        -------
+        success : bool
+            True if the device is found
+
+        """
+        if self.mode == "RFD900":
+            print("Searching for a RFD900 modem")
+        elif self.mode == "BONJOUR":
+            print("Searching for a Gateway using the bonjour string : {}".format(
+                self.bonjour))
+
+        return self.__search()
+
+    def __search(self):
+        """ Find the device of this instance with find_devices()
+
+        The instances whose search starts while another search is in progress are queued,
+        then searched together in the next pass: the same port is never probed by two
+        searches at once
+
+        Returns
+        -------
+        success : bool
+            True if the device is found
+
+        """
+        cls = SerialWrapper
+        with cls.search_condition:
+            self.search_done.clear()
+            cls.search_queue.append(self)
+            self.state = "SEARCHING"
+            while cls.is_searching and self in cls.search_queue:
+                if self.stop_search.is_set():
+                    cls.search_queue.remove(self)
+                    self.state = "CLOSED"
+                    return False
+                cls.search_condition.wait(READER_TIMEOUT)
+
+            if self in cls.search_queue:
+                # No search in progress: this thread searches all the instances queued
+                wrappers = list(cls.search_queue)
+                cls.search_queue.clear()
+                cls.is_searching = True
+            else:
+                # This instance is searched by another thread
+                wrappers = None
+
+        if wrappers is None:
+            self.search_done.wait()
+            return self.is_device_found
+
+        try:
+            cls.find_devices(*wrappers)
+        finally:
+            with cls.search_condition:
+                cls.is_searching = False
+                for w in wrappers:
+                    w.search_done.set()
+                cls.search_condition.notify_all()
+
+        return self.is_device_found
 
     def __fail_mode(self, error):
         """ Set the right value to Instance attributes in case a fatal error occured
@@ -248,30 +657,41 @@ class SerialWrapper:
         print(self.error)
         self.failed = True
         self.is_ready = False
+        self.state = "FAILED"
 
-    def __read_serial_buffer(self):
+    def __read_serial_buffer(self, framer=None):
         """ Read the last received bytes from the serial buffer
 
+        All the bytes waiting are read at once. If there is none, wait for the first one
+
+        Parameters
+        ----------
+        framer : Framer instance
+            (optional) the bytes are read directly in the buffer of the framer
+
         Returns
         -------
         error_code : int
             0 if no error occured
         error_msg : string
             python string describing the error if one occured
-        buffer : bytearray
-            bytes read from the serial buffer
+        buffer : bytearray or memoryview
+            bytes read from the serial buffer. View of the buffer of `framer` if given
 
         """
         error_code = 0
         error_msg = ""
         buffer = bytearray()
 
-        # Get the number of bytes in the buffer
-        i = max(1, min(2048, self.ser.in_waiting))
-
         # Read the buffer
         try:
-            buffer = self.ser.read(i)
+            # Get the number of bytes in the buffer
+            i = max(1, self.ser.in_waiting)
+            if framer is None:
+                buffer = self.ser.read(i)
+            else:
+                view = framer.reserve(max(i, READ_SIZE))
+                buffer = view[:self.ser.readinto(view[:i])]
         # This mostly means that the device is disconnected
         except serial.SerialException as e:
             error_code = 1
@@ -288,59 +708,74 @@ class SerialWrapper:
 
         return error_code, error_msg, buffer
 
-    def __read_file_buffer(self):
-        """ Read lines in "real time" from file
+    def __read_file_frames(self):
+        """ Read frames in "real time" from file
 
-        Lines are returned only when their time stamp is equal (roughly) to the time delay since
-        the reading has started
+        Frames are returned when the time given by `clock` reaches their time stamp: this
+        waits for the next frame, at most REPLAY_TIMEOUT so that a pause or a change of speed
+        is taken into account. The frames due are found with a binary search in the time
+        stamps of the file, which is indexed as the time goes
 
         Returns
         -------
-        buffer : bytearray
-            all the relevant lines in a bytearray
+        frames : [memoryview, ]
+            the frames due, views of the memory-mapped file
 
         """
-        time.sleep(0.1) # This reduces the CPU load
+        if self.seek_time is not None:
+            self.__seek_file(self.seek_time)
+
+        replay = self.replay
+        if self.current_index < replay.index_until(self.current_index + 1):
+            delay = self.clock.delay(replay.times[self.current_index])
+            if delay > 0:
+                time.sleep(min(delay, REPLAY_TIMEOUT))
+        elif not replay.is_indexed:
+            time.sleep(REPLAY_TIMEOUT)
+
+        if self.clock.is_fast and not self.clock.is_paused:
+            # The clock follows the frames returned
+            stop = replay.index_until(self.current_index + FAST_REPLAY_SIZE)
+            stop = min(stop, self.current_index + FAST_REPLAY_SIZE)
+            if stop > self.current_index:
+                self.clock.seek(replay.times[stop - 1])
+        else:
+            # Index of the first frame after the replay time
+            stop = replay.index_until_time(self.clock.now())
 
-        if(self.current_index < len(self.lines_from_file)):
-            now = datetime.datetime.now()
-            delta = now - self.time_start_computer
-            
-            count = 0
-            # Time stamps are previously computed using a dummy Sensors() instance
-            for i, e in enumerate(self.sensors.imu2.raw_data['Seconds_since_start'][self.current_index:]):
-                if e < delta.total_seconds():
-                    count += 1
-                else:
-                    break
-            
-            lines = self.lines_from_file[self.current_index:self.current_index+count]
-            self.current_index += count
+        if replay.is_indexed and self.current_index >= len(replay):
+            error_code = 4
+            error_msg = "End of file"
+            frames = []
 
+        else:
+            frames = replay.get_frames(self.current_index, stop)
+            self.current_index = max(self.current_index, stop)
             error_code = 0
             error_msg = ""
-            buffer = b'\r\n' + b'\r\n'.join(lines)
-        
-        else:
-            error_code = 4
-            error_msg = "End of file"
-            buffer = b''
-        
-        return error_code, error_msg, buffer
 
-    def __read_file_line(self):
-        """ Read the next line in the file
+        return error_code, error_msg, frames
+
+    def __seek_file(self, seconds):
+        """ Move the replay of the file to the first frame at or after `seconds`
 
-        Lines are separated by b'\r\n'
+        """
+        self.seek_time = None
+        self.replay.index_until_time(seconds)
+        self.current_index = bisect_left(self.replay.times, seconds)
+        self.clock.seek(seconds)
+
+    def __read_file_line(self):
+        """ Read the next frame in the file
 
         Returns
         -------
-        line : bytearray
-            line from the file as bytes
+        line : bytes
+            frame from the file as bytes
 
         """
-        if self.current_index < len(self.lines_from_file):
-            line = self.lines_from_file[self.current_index]
+        if self.current_index < self.replay.index_until(self.current_index + 1):
+            line = bytes(self.replay.get_frame(self.current_index))
             self.current_index += 1
             error_code = 0
             error_msg = ""
@@ -409,14 +844,19 @@ class SerialWrapper:
         """
         error_msg = ""
         try:
-            self.ser.open()
-            self.ser.reset_input_buffer()
-            self.ser.reset_output_buffer()
+            # The port is left open when the device is found by find_devices()
+            if not self.ser.is_open:
+                self.ser.open()
+                self.ser.reset_input_buffer()
+                self.ser.reset_output_buffer()
             self.failed = False
             self.buffer = bytearray()
+            if self.framer is not None:
+                self.framer.clear()
             self.__safe_mode()
             if self.mode == "RFD900":
                 self.is_ready = True
+            self.state = "OPEN"
             print("{} : serial connection opened ({})".format(
                 self.name, self.ser.port))
             return True
@@ -438,7 +878,13 @@ class SerialWrapper:
                 return False
     
     def __load_file(self):
-        """ Read Telemetry data from a file and store each line in memory
+        """ Open a Telemetry file for replay
+
+        The file is memory-mapped and its frames are indexed as they are needed, so this is
+        instant whatever the size of the file
+
+        The frames of a session file are replayed with the time they were received, the
+        frames of a log file with their RTC
 
         Returns
         -------
@@ -449,14 +895,13 @@ class SerialWrapper:
         error_msg = ""
 
         try:
-            with open(self.filepath, 'rb') as file:
-                file_buffer = file.read()
-            lines = file_buffer.split(b'\r\n')
-            # Remove incomplete lines
-            self.lines_from_file = [l for l in lines if len(l) == 96 or len(l) == 136]  # /!\ Hardcoded lengths for Sigmundr /!\
-            # Feed the Sensors() instance with all lines to compute the time stamps
-            for line in self.lines_from_file:
-                self.sensors.update_sensors(line)
+            if is_session(self.filepath):
+                # The frames are replayed as they were received
+                self.replay = SessionReplay(self.filepath, self.sensors)
+            else:
+                # The time stamps are read from the frames with the Sensors() instance
+                self.replay = LogReplay(self.filepath, self.sensors)
+            self.current_index = 0
         
         except Exception as e:
             error_msg = "{} : {}".format(
@@ -472,9 +917,14 @@ class SerialWrapper:
         
         return success
 
-    def open_link(self):
+    def open_link(self, stop=None):
         """ Open the link to the Gateway
 
+        Parameters
+        ----------
+        stop : Event instance
+            (optional) set it from another thread to cancel the search of the device
+
         Returns
         -------
         bool
@@ -483,7 +933,13 @@ class SerialWrapper:
 
         """
         if self.is_device_found:
-            if self.mode in ["BONJOUR", "RFD900", "PORT"]:
+            if self.mode in ["BONJOUR", "RFD900"]:
+                # The name of the port can change when the device is plugged again
+                d = self.__cached_device(serial.tools.list_ports.comports())
+                if d is not None:
+                    self.ser.port = d.device
+                return self.__open_serial_port()
+            elif self.mode == "PORT":
                 return self.__open_serial_port()
             else:
                 return True
@@ -497,16 +953,56 @@ class SerialWrapper:
                     self.is_device_found = True
 
             elif self.mode in ["RFD900", "BONJOUR"]:
+                self.stop_search = stop if stop is not None else threading.Event()
                 success = self.__auto_find_gateway()  # The port is left open if successful
             
             elif self.mode == "FILE":
                 success = self.__load_file()
                 if success:
                     self.is_ready = True
-                    self.time_start_computer = datetime.datetime.now()
+                    self.state = "OPEN"
+                    self.clock.seek(0)
 
             return success
 
+    def is_device_present(self):
+        """ Return True if the port of the device is listed by the system
+
+        The port is matched by the identity saved when the device was found, so that a
+        device plugged again is recognized even if the name of its port has changed
+
+        Returns
+        -------
+        bool
+            True if the device can be opened again with open_link()
+
+        """
+        if self.mode == "FILE":
+            return True
+
+        devices = serial.tools.list_ports.comports()
+        if self.mode in ["BONJOUR", "RFD900"] and self.__cached_device(devices) is not None:
+            return True
+        return any(d.device == self.ser.port for d in devices)
+
+    def seek_replay(self, seconds):
+        """ Move the replay of a file to a time, in seconds since its first frame
+
+        The frames are then returned from the first one at or after `seconds`. The seek is
+        done by the thread reading the file. Use `clock` to change the speed of the replay
+        or to pause it
+
+        Parameters
+        ----------
+        seconds : float
+            time to replay from, can be before the current time
+
+        """
+        if self.mode != "FILE":
+            return
+        self.seek_time = max(0., float(seconds))
+        self.clock.seek(self.seek_time)
+
     def close_serial(self):
         """ Close the serial connection
 
@@ -524,6 +1020,8 @@ class SerialWrapper:
                     print("{} : serial connection closed ({})".format(
                         self.name, self.ser.port))
                 self.is_ready = False
+                if self.state == "OPEN":
+                    self.state = "CLOSED"
 
     def get_status(self):
         """ Return the state of the serial port
@@ -611,16 +1109,18 @@ class SerialWrapper:
         -------
         lines : [string, ]
             the processed lines read from the serial buffer. Empty if an error occured or
-            if the buffer is empty
+            if the buffer is empty. With a framer, the frames are memoryviews valid until
+            the next call
 
         """
         if self.failed:
             return []
 
         if self.mode in ["RFD900", "BONJOUR"]:
-            error_code, error_msg, buffer = self.__read_serial_buffer()
+            # With a framer, the bytes are read directly in its buffer
+            error_code, error_msg, buffer = self.__read_serial_buffer(self.framer)
         elif self.mode == "FILE":
-            error_code, error_msg, buffer = self.__read_file_buffer()
+            error_code, error_msg, lines = self.__read_file_frames()
 
         if error_code:
             error = "{} : {}".format(self.name, error_msg)
@@ -628,6 +1128,24 @@ class SerialWrapper:
             self.close_serial()
             return []
 
+        if self.mode == "FILE":
+            # The frames are found by the index of the file
+            if decode:
+                lines = [str(l, 'utf-8', 'backslashreplace') for l in lines]
+            return lines
+
+        if self.framer is not None:
+            # Binary frames are found from their known lengths, they are memoryviews of the
+            # buffer of the framer and are only valid until the next call
+            self.framer.commit(len(buffer))
+            lines = self.framer.frames()
+            # The bonjour message is not a frame
+            if any(self.bonjour and l == self.bonjour.encode('utf-8') for l in self.framer.discarded):
+                self.is_ready = True
+            if decode:
+                lines = [str(l, 'utf-8', 'backslashreplace') for l in lines]
+            return lines
+
         self.buffer.extend(buffer)
 
         # Not run if no new data has been retrieved
@@ -645,3 +1163,126 @@ class SerialWrapper:
             return lines
         else:
             return []
+
+    def __wait_serial(self, timeout):
+        """ Wait until bytes are received on the serial port
+
+        On POSIX systems, the file descriptor of the port is watched with select(). Else, the
+        blocking read in readlines() waits for the bytes
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait in seconds
+
+        Returns
+        -------
+        bool
+            True if readlines() should be called
+
+        """
+        if self.mode not in ["RFD900", "BONJOUR"]:
+            return True
+
+        try:
+            fd = self.ser.fileno()
+        # No file descriptor on Windows, or the port is not open: let readlines() handle it
+        except Exception:
+            return True
+
+        try:
+            readable, _, _ = select.select([fd], [], [], timeout)
+        except (OSError, ValueError):
+            return True
+
+        return bool(readable)
+
+    def __read_thread(self):
+        """ Read the frames and push them in the queue until stop_reader() is called
+
+        """
+        while self.is_reader_running and not self.failed:
+            if not self.__wait_serial(READER_TIMEOUT):
+                continue
+
+            lines = self.readlines()
+            if not lines:
+                continue
+            host_time = time.monotonic()
+            # The framer does not overwrite the frames returned (see start_reader()), they
+            # are handed over without copies
+            item = (host_time, lines)
+
+            try:
+                self.frames.put_nowait(item)
+            except queue.Full:
+                # Drop the oldest frames to keep the most recent ones
+                try:
+                    _, dropped = self.frames.get_nowait()
+                    self.nb_dropped += len(dropped)
+                except queue.Empty:
+                    pass
+                self.frames.put_nowait(item)
+
+        self.is_reader_running = False
+
+    def start_reader(self):
+        """ Start reading the link in a separate thread
+
+        The thread waits for the bytes without polling, reads all the bytes received at once
+        and pushes the frames in the `frames` queue. Get them with read_frames()
+
+        The thread stops when stop_reader() is called or when a fatal error occurs
+
+        The frames are memoryviews of the buffers of the framer, which does not overwrite
+        them afterwards: they stay valid after the next reads
+
+        """
+        if self.reader is not None and self.reader.is_alive():
+            return
+        if self.framer is not None:
+            self.framer.keep_frames = True
+
+        self.is_reader_running = True
+        self.reader = threading.Thread(target=self.__read_thread, daemon=True)
+        self.reader.start()
+
+    def stop_reader(self):
+        """ Stop the thread started by start_reader()
+
+        The frames left in the queue can still be read with read_frames()
+
+        """
+        self.is_reader_running = False
+        if self.reader is not None:
+            if self.reader is not threading.current_thread():
+                self.reader.join()
+            self.reader = None
+
+    def read_frames(self, timeout=None):
+        """ Return the frames pushed in the queue by the reader thread
+
+        Parameters
+        ----------
+        timeout : float
+            (optional) maximum time in seconds to wait for the first frames. Default is to
+            wait until frames are received
+
+        Returns
+        -------
+        reads : [(float, [bytes-like object, ]), ]
+            time.monotonic() when the frames were received and the frames, for each read
+            of the reader thread, ordered from oldest to newest. Empty if no frame was
+            received before `timeout`
+
+        """
+        try:
+            reads = [self.frames.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                reads.append(self.frames.get_nowait())
+            except queue.Empty:
+                return reads
@@ -0,0 +1,269 @@
+"""
+Record-oriented file format of the sessions recorded by a Gateway
+
+A log file is a stream of raw frames separated by b'\r\n': the frame boundaries are lost if
+a frame contains these bytes, and the time the frames were received is not saved. A session
+file keeps each frame as received, with its reception time:
+
+    MAGIC
+    header length: unsigned 32-bit integer, little endian
+    header: JSON object encoded in UTF-8, see new_header()
+    records, one for each frame:
+        host time: time.monotonic() when the frame was received, 64-bit float
+        length: length of the frame in bytes, unsigned 32-bit integer
+        frame: raw bytes of the frame
+
+A record being written when the recording stopped is ignored by the readers
+
+"""
+
+import datetime
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from utils.replay import CHUNK_SIZE, LogReplay
+
+# First bytes of a session file
+MAGIC = b'GCSESS01'
+# Length of the header, after MAGIC
+HEADER_LENGTH = struct.Struct('<I')
+# Host time and length of the frame at the start of each record
+RECORD = struct.Struct('<dI')
+
+
+def new_header(gateway, vehicle):
+    """ Create the header of a session starting now
+
+    Parameters
+    ----------
+    gateway: str
+        name of the Gateway recording the session
+    vehicle: Vehicle instance
+        vehicle that sends the frames
+
+    Returns
+    -------
+    header: dict
+        {'gateway', 'vehicle': name of the schema, 'schema_version', 'start_time': ISO date,
+        'wall_time': time.time() and 'host_time': time.monotonic() at the start}. The host
+        time of the records is converted to a date with `wall_time - host_time`
+
+    """
+    return {
+        'gateway': gateway,
+        'vehicle': vehicle.schema.name,
+        'schema_version': vehicle.schema.version,
+        'start_time': datetime.datetime.now().isoformat(),
+        'wall_time': time.time(),
+        'host_time': time.monotonic(),
+    }
+
+
+def write_header(file, header):
+    """ Write the start of a session file
+
+    Parameters
+    ----------
+    file: file object
+        file opened in binary mode, at its start
+    header: dict
+        header of the session, see new_header()
+
+    """
+    data = json.dumps(header).encode('utf-8')
+    file.write(MAGIC)
+    file.write(HEADER_LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def pack_records(frames, host_time):
+    """ Return the records of frames received at once
+
+    Parameters
+    ----------
+    frames: [bytes-like object, ]
+        frames received
+    host_time: float
+        time.monotonic() when the frames were received
+
+    Returns
+    -------
+    data: bytes
+        records to append to a session file
+
+    """
+    data = bytearray()
+    for frame in frames:
+        data += RECORD.pack(host_time, len(frame))
+        data += frame
+    return bytes(data)
+
+
+def read_header(data):
+    """ Read the header of a session
+
+    Parameters
+    ----------
+    data: bytes-like object
+        start of the session file, or the whole file mapped in memory
+
+    Returns
+    -------
+    header: dict
+        header of the session
+    size: int
+        position of the first record in the file
+
+    """
+    start = len(MAGIC) + HEADER_LENGTH.size
+    if len(data) < start or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a session file")
+    length, = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+    if len(data) < start + length:
+        raise ValueError("Incomplete session header")
+    header = json.loads(bytes(data[start:start + length]).decode('utf-8'))
+    return header, start + length
+
+
+def is_session(path):
+    """ Return True if a file is a session file
+
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def iter_records(path):
+    """ Iterate over the records of a session file, without loading it in memory
+
+    Parameters
+    ----------
+    path: path-like object
+        path to the session file
+
+    Yields
+    ------
+    host_time: float
+        time.monotonic() when the frame was received
+    frame: bytes
+        raw bytes of the frame
+
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            raise ValueError("{}: not a session file".format(path))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            _, position = read_header(data)
+            while position + RECORD.size <= size:
+                host_time, length = RECORD.unpack_from(data, position)
+                start = position + RECORD.size
+                if start + length > size:
+                    break
+                yield host_time, data[start:start + length]
+                position = start + length
+
+
+class SessionReplay(LogReplay):
+    """ Frames of a session file, indexed lazily
+
+    Same as LogReplay, but the records are found from their length and the time stamp of a
+    frame is its reception time: the frames are replayed as they were received, without
+    decoding their RTC
+
+    Parameters
+    ----------
+    path : path-like object
+        path to the session file
+    vehicle : Vehicle instance
+        vehicle that sent the frames
+    chunk_size : int
+        (optional) number of bytes of the file indexed at once
+
+    Attributes
+    ----------
+    header : dict
+        header of the session, see new_header()
+    starts : array
+        position in the file of the first byte of each frame indexed
+    stops : array
+        position in the file of the end of each frame indexed
+    times : array
+        reception time of each frame indexed, in seconds since the first frame
+    is_indexed : bool
+        True when the whole file has been indexed
+
+    Examples
+    --------
+    >>> replay = SessionReplay("./data/2019-12-04T11-15-39_Telemetry.session", Sigmundr())
+    >>> frames = replay.get_frames(0, replay.index_until_time(10.))  # First 10 s
+    >>> replay.close()
+
+    """
+
+    def __init__(self, path, vehicle, chunk_size=CHUNK_SIZE):
+        self.vehicle = vehicle
+        self.chunk_size = chunk_size
+
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size == 0:
+            self.file.close()
+            raise ValueError("{}: not a session file".format(path))
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        try:
+            self.header, self.position = read_header(self.map)
+        except ValueError as e:
+            self.close()
+            raise ValueError("{}: {}".format(path, e))
+
+        self.starts = array('q')
+        self.stops = array('q')
+        self.times = array('d')
+        self.is_indexed = self.position >= self.size
+        self.origin = None  # Reception time of the first frame
+
+    def index_more(self):
+        """ Index the next chunk of the file
+
+        Returns
+        -------
+        count : int
+            number of frames indexed
+        """
+        if self.is_indexed:
+            return 0
+
+        data = self.map
+        end = min(self.position + self.chunk_size, self.size)
+        position = self.position
+        count = 0
+        while position < end:
+            start = position + RECORD.size
+            if start > self.size:
+                # The recording stopped while this record was written
+                self.is_indexed = True
+                break
+            host_time, length = RECORD.unpack_from(data, position)
+            if start + length > self.size:
+                self.is_indexed = True
+                break
+            if self.origin is None:
+                self.origin = host_time
+            self.starts.append(start)
+            self.stops.append(start + length)
+            self.times.append(host_time - self.origin)
+            position = start + length
+            count += 1
+
+        self.position = position
+        if position >= self.size:
+            self.is_indexed = True
+
+        return count